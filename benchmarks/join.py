@@ -0,0 +1,47 @@
+"""Per-record cost of the time-catch Join for a growing number of joined
+streams. Every stream is updated in turn, one record per millisecond, with
+a 1 second window, so the oldest states keep expiring.
+
+Run with:
+> python -m benchmarks.join
+"""
+import asyncio
+import time
+
+from collections import OrderedDict
+
+from stream_tools.memory import MemoryRedis
+from stream_tools.memory import MemoryServer
+from stream_tools.stream import StreamQueue
+from stream_tools.tools.join import Join
+
+
+STREAMS = [10, 100, 1_000, 10_000]
+RECORDS = 200_000
+
+
+async def _no_reader(queue: StreamQueue) -> None:
+    pass
+
+
+async def bench(streams: int, records: int = RECORDS) -> float:
+    join = Join(MemoryRedis(MemoryServer()), _no_reader, "time_catch", 1)
+    names = [f"stream_{i}".encode() for i in range(streams)]
+    value = OrderedDict({b"x": b"1.0"})
+    ids = [f"{i}-0".encode() for i in range(records)]
+
+    start = time.perf_counter()
+    for i in range(records):
+        join._time_store_state(names[i % streams], ids[i], value)
+    return (time.perf_counter() - start) / records
+
+
+def main() -> None:
+    loop = asyncio.get_event_loop()
+    print(f"{'streams':>10} {'us/record':>10}")
+    for streams in STREAMS:
+        print(f"{streams:>10} {loop.run_until_complete(bench(streams)) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Per-record cost of the ordered Merge for a growing number of merged
+streams. Every stream is updated in turn with increasing redis ids and the
+records are fed in batches of 100, as they are read from redis.
+
+Run with:
+> python -m benchmarks.merge
+"""
+import asyncio
+import time
+
+from collections import OrderedDict
+
+from stream_tools.memory import MemoryRedis
+from stream_tools.memory import MemoryServer
+from stream_tools.stream import StreamQueue
+from stream_tools.tools.merge import Merge
+
+
+STREAMS = [10, 100, 1_000]
+RECORDS = 200_000
+BATCH = 100
+
+
+async def _no_reader(queue: StreamQueue) -> None:
+    pass
+
+
+async def bench(streams: int, records: int = RECORDS) -> float:
+    names = [f"stream_{i}".encode() for i in range(streams)]
+    merge = Merge(MemoryRedis(MemoryServer()), _no_reader, ordered=True, streams=names)
+    value = OrderedDict({b"x": b"1.0"})
+    batches = [
+        [(names[i % streams], f"{i}-0".encode(), value) for i in range(j, j + BATCH)]
+        for j in range(0, records, BATCH)
+    ]
+
+    start = time.perf_counter()
+    for batch in batches:
+        merge._store(batch)
+        merge._release()
+        merge.pending.clear()
+    return (time.perf_counter() - start) / records
+
+
+def main() -> None:
+    loop = asyncio.get_event_loop()
+    print(f"{'streams':>10} {'us/record':>10}")
+    for streams in STREAMS:
+        print(f"{streams:>10} {loop.run_until_complete(bench(streams)) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
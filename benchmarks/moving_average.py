@@ -0,0 +1,55 @@
+"""Per-update cost of MovingAverageState for growing window sizes, one
+record at a time (update) and in batches of records (update_many).
+
+Run with:
+> python -m benchmarks.moving_average
+"""
+import random
+import time
+
+from collections import OrderedDict
+
+from stream_tools.filters.moving_average import MovingAverageState
+
+
+WINDOWS = [10, 100, 1_000, 10_000, 100_000]
+UPDATES = 200_000
+BATCH = 1_000
+
+
+def bench(window: int, updates: int = UPDATES, batch: int = 0) -> float:
+    state = MovingAverageState({"x": window, "y": window})
+    records = [
+        (
+            b"bench",
+            f"{i}-0".encode(),
+            OrderedDict(
+                {
+                    b"x": str(random.random()).encode(),
+                    b"y": str(random.random()).encode(),
+                }
+            ),
+        )
+        for i in range(1_000)
+    ]
+
+    start = time.perf_counter()
+    if batch:
+        for _ in range(updates // batch):
+            state.update_many(records[:batch])
+    else:
+        for i in range(updates):
+            state.update(records[i % 1_000])
+    return (time.perf_counter() - start) / updates
+
+
+def main() -> None:
+    print(f"{'window':>10} {'us/update':>10} {'us/batched':>10}")
+    for window in WINDOWS:
+        single = bench(window) * 1e6
+        batched = bench(window, batch=BATCH) * 1e6
+        print(f"{window:>10} {single:>10.2f} {batched:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Throughput, latency and memory of the nodes, fed with synthetic records
+through an in-process MemoryPool or a local redis server.
+
+Every node benchmark writes `--records` records with pipelined XADD (in
+rounds of `--batch` records over `--streams` streams) while the node reads
+them with next_batch. For each benchmark it reports:
+- records/sec: the records processed by the node per second, from the first
+  XADD to the last processed record
+- latency: the time from the XADD of a record to the output of the batch
+  that processed it (percentiles in microseconds)
+- peak memory: the peak of the memory allocated during a second run traced
+  with tracemalloc (including the streams of the memory backend)
+
+The results can be saved as JSON and compared with a baseline: a benchmark
+is flagged when its throughput drops, or its p99 latency grows, by more
+than `--tolerance`, and the exit status is then 1.
+
+Run with:
+> python -m benchmarks.suite --backend memory --output results.json
+> python -m benchmarks.suite --backend both --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import aioredis
+import numpy as np
+
+from stream_tools import MemoryPool
+from stream_tools import RedisPool
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools import compile_decoder
+from stream_tools import sanitize_batch
+from stream_tools.bars import SumBar
+from stream_tools.filters import MovingAverage
+
+
+BACKENDS = ["memory", "redis"]
+PERCENTILES = [50, 90, 99]
+
+Result = Dict[str, Any]
+RecordKey = Tuple[bytes, bytes]
+
+
+def _moving_average(stream: Stream, config: argparse.Namespace) -> Any:
+    windows = [(f"f{i}", config.window) for i in range(config.fields)]
+    return MovingAverage(stream, windows)
+
+
+def _sumbar(stream: Stream, config: argparse.Namespace) -> Any:
+    # the values are uniform in [0, 1), so a bar closes about every window records
+    return SumBar(stream, ("f0", config.window / 2))
+
+
+def _join_time_catch(streams: Streams, config: argparse.Namespace) -> Any:
+    return streams.join("time_catch", 1)
+
+
+def _merge(streams: Streams, config: argparse.Namespace) -> Any:
+    return streams.merge()
+
+
+# node benchmarks: the node factory and whether it reads all the streams
+NODES: Dict[str, Tuple[Callable, bool]] = {
+    "moving_average": (_moving_average, False),
+    "sumbar": (_sumbar, False),
+    "join_time_catch": (_join_time_catch, True),
+    "merge": (_merge, True),
+}
+# benchmarks of the functions, run without backend
+FUNCTIONS = ["sanitize", "sanitize_batch"]
+
+
+def _summary(records: int, elapsed: float, latencies: List[float]) -> Result:
+    """The throughput and the latency percentiles of a run
+
+    Args:
+        records (int): the number of processed records
+        elapsed (float): the duration of the run in seconds
+        latencies (List[float]): the latency of each record in seconds
+
+    Returns:
+        Result: the results
+    """
+    values = np.array(latencies) * 1e6
+    latency = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    latency["max"] = float(values.max())
+    return {
+        "records": records,
+        "seconds": elapsed,
+        "records_per_sec": records / elapsed,
+        "latency_us": latency,
+    }
+
+
+def _fields(config: argparse.Namespace) -> List[Dict[str, float]]:
+    """The fields-values of the synthetic records
+
+    Args:
+        config (argparse.Namespace): the benchmark options
+
+    Returns:
+        List[Dict[str, float]]: the fields-values of each record
+    """
+    rng = random.Random(0)
+    return [
+        {f"f{i}": rng.random() for i in range(config.fields)}
+        for _ in range(config.records)
+    ]
+
+
+async def run_node(name: str, backend: str, config: argparse.Namespace) -> Result:
+    """Feed a node with the synthetic records and measure it
+
+    Args:
+        name (str): the node benchmark
+        backend (str): "memory" or "redis"
+        config (argparse.Namespace): the benchmark options
+
+    Returns:
+        Result: the results
+    """
+    make, multi = NODES[name]
+    pool = MemoryPool() if backend == "memory" else RedisPool(config.address)
+    names = [f"bench:{name}:{i}" for i in range(config.streams if multi else 1)]
+    client = await pool.client()
+    await client.delete(*names)
+    records = _fields(config)
+    total = len(records)
+
+    sent: Dict[RecordKey, float] = {}
+    acked: List[RecordKey] = []
+    emitted: List[Tuple[List[RecordKey], float]] = []
+    done = asyncio.Event()
+    finished = [0.0]
+
+    def ack(record: Tuple[bytes, bytes, Any]) -> None:
+        acked.append((record[0], record[1]))
+        if len(acked) == total:
+            finished[0] = time.perf_counter()
+            done.set()
+
+    async def consume(node: Any) -> None:
+        processed = 0
+        while True:
+            await node.next_batch()
+            # the records processed since the last batch are emitted now
+            emitted.append((acked[processed:], time.perf_counter()))
+            processed = len(acked)
+
+    async def produce() -> float:
+        start = time.perf_counter()
+        keys = [name.encode() for name in names]
+        for first in range(0, total, config.batch):
+            pipe = client.pipeline()
+            targets = []
+            for i in range(first, min(first + config.batch, total)):
+                target = i % len(names)
+                targets.append(keys[target])
+                pipe.xadd(names[target], records[i])
+            now = time.perf_counter()
+            ids = await pipe.execute()
+            for key, idx in zip(targets, ids):
+                sent[(key, idx)] = now
+            await asyncio.sleep(0)
+        return start
+
+    if multi:
+        source: Any = Streams(
+            [Stream(n, count=config.count) for n in names], pool=pool
+        )
+    else:
+        source = Stream(names[0], count=config.count, pool=pool)
+    async with source:
+        source.ack = ack
+        node = make(source, config)
+        # the readers start from the entries added after them
+        await asyncio.sleep(0.05)
+        consumer = asyncio.ensure_future(consume(node))
+        start = await produce()
+        await done.wait()
+        await asyncio.sleep(0)
+        consumer.cancel()
+
+    await client.delete(*names)
+    await pool.close()
+    latencies = [
+        emit - sent[key] for keys, emit in emitted for key in keys if key in sent
+    ]
+    return _summary(total, finished[0] - start, latencies)
+
+
+def run_function(name: str, config: argparse.Namespace) -> Result:
+    """Run a sanitize benchmark on the synthetic records
+
+    Args:
+        name (str): the function benchmark
+        config (argparse.Namespace): the benchmark options
+
+    Returns:
+        Result: the results
+    """
+    records = [
+        (b"bench", f"{i}-0".encode(), OrderedDict(
+            (k.encode(), repr(v).encode()) for k, v in fields.items()
+        ))
+        for i, fields in enumerate(_fields(config))
+    ]
+    latencies = []
+    start = time.perf_counter()
+    if name == "sanitize":
+        decoder = compile_decoder({f"f{i}": float for i in range(config.fields)})
+        for record in records:
+            before = time.perf_counter()
+            decoder(record[2])
+            latencies.append(time.perf_counter() - before)
+    else:
+        for first in range(0, len(records), config.batch):
+            before = time.perf_counter()
+            sanitize_batch(records[first:first + config.batch])
+            elapsed = time.perf_counter() - before
+            latencies.extend([elapsed] * len(records[first:first + config.batch]))
+    return _summary(len(records), time.perf_counter() - start, latencies)
+
+
+def _ignore_closed(loop: asyncio.AbstractEventLoop, context: Dict[str, Any]) -> None:
+    # the readers left blocked on the closed connections fail at the end of
+    # every node benchmark
+    if not isinstance(context.get("exception"), aioredis.ConnectionClosedError):
+        loop.default_exception_handler(context)
+
+
+def run(name: str, backend: Optional[str], config: argparse.Namespace) -> Result:
+    """Run a benchmark, then run it again traced to measure its peak memory
+
+    Args:
+        name (str): the benchmark
+        backend (Optional[str]): the backend of the node benchmarks
+        config (argparse.Namespace): the benchmark options
+
+    Returns:
+        Result: the results
+    """
+    def once() -> Result:
+        if backend is None:
+            return run_function(name, config)
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(run_node(name, backend, config))
+
+    result = once()
+    if config.memory:
+        tracemalloc.start()
+        once()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def compare(
+    results: Dict[str, Result], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Compare the results with a baseline run with the same options
+
+    Args:
+        results (Dict[str, Result]): the results of each benchmark
+        baseline (Dict[str, Any]): the saved baseline
+        tolerance (float): the allowed relative change
+
+    Returns:
+        List[str]: the regressions
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        if result["records_per_sec"] < base["records_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {result['records_per_sec']:.0f} records/sec, "
+                f"baseline {base['records_per_sec']:.0f}"
+            )
+        if result["latency_us"]["p99"] > base["latency_us"]["p99"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p99 latency {result['latency_us']['p99']:.0f}us, "
+                f"baseline {base['latency_us']['p99']:.0f}us"
+            )
+    return regressions
+
+
+def _options(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--benchmarks", default=",".join(list(NODES) + FUNCTIONS),
+        help="comma separated benchmarks to run",
+    )
+    parser.add_argument(
+        "--backend", default="memory", choices=BACKENDS + ["both"],
+        help="backend of the node benchmarks",
+    )
+    parser.add_argument("--address", default="redis://localhost")
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--fields", type=int, default=4)
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument(
+        "--batch", type=int, default=100, help="records written with each pipeline"
+    )
+    parser.add_argument(
+        "--count", type=int, default=100, help="entries fetched with each read"
+    )
+    parser.add_argument(
+        "--no-memory", dest="memory", action="store_false",
+        help="skip the traced run measuring the peak memory",
+    )
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+PARAMS = ["records", "streams", "fields", "window", "batch", "count"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    config = _options(argv)
+    backends = BACKENDS if config.backend == "both" else [config.backend]
+    benchmarks = [b.strip() for b in config.benchmarks.split(",") if b.strip()]
+    unknown = [b for b in benchmarks if b not in NODES and b not in FUNCTIONS]
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    asyncio.get_event_loop().set_exception_handler(_ignore_closed)
+    results: Dict[str, Result] = {}
+    print(
+        f"{'benchmark':<28} {'records/s':>11} {'p50 us':>9} {'p90 us':>9}"
+        f" {'p99 us':>9} {'peak MiB':>9}"
+    )
+    for name in benchmarks:
+        for backend in backends if name in NODES else [None]:
+            key = name if backend is None else f"{name}[{backend}]"
+            result = results[key] = run(name, backend, config)
+            latency = result["latency_us"]
+            peak = result.get("peak_memory_bytes")
+            print(
+                f"{key:<28} {result['records_per_sec']:>11.0f}"
+                f" {latency['p50']:>9.1f} {latency['p90']:>9.1f}"
+                f" {latency['p99']:>9.1f}"
+                f" {peak / 2 ** 20 if peak is not None else float('nan'):>9.2f}"
+            )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {p: getattr(config, p) for p in PARAMS},
+        },
+        "results": results,
+    }
+    if config.output:
+        with open(config.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if config.baseline:
+        with open(config.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["params"] != report["meta"]["params"]:
+            print("The baseline was run with other options.", file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline, config.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
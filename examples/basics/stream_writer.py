@@ -0,0 +1,19 @@
+import asyncio
+
+import uvloop  # type: ignore
+
+from stream_tools import Stream
+from stream_tools import StreamWriter
+from stream_tools.filters import MovingAverage
+
+
+async def main() -> None:
+    stream = Stream("stream_1", count=100)
+    writer = StreamWriter("stream_1_ma", maxlen=10000)
+    async with stream, writer:
+        await writer.publish(MovingAverage(stream, ("x", 3)))
+
+
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+loop = asyncio.get_event_loop()
+loop.run_until_complete(main())
@@ -0,0 +1,21 @@
+import asyncio
+
+import uvloop  # type: ignore
+
+from stream_tools import Stream
+from stream_tools.filters import ExponentialSmoothing
+
+
+async def main() -> None:
+    stream = Stream("stream_1")
+    async with stream:
+        smoothing = ExponentialSmoothing(
+            stream, [("x", 0.2), ("y", "time_half_life", 5000)]
+        )
+        async for value in smoothing:
+            print(value)
+
+
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+loop = asyncio.get_event_loop()
+loop.run_until_complete(main())
@@ -0,0 +1,31 @@
+import asyncio
+
+import uvloop  # type: ignore
+
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools.filters import RLSFilter
+
+
+async def main() -> None:
+    stream1 = Stream('test_stream_1')
+    stream2 = Stream('test_stream_2')
+
+    async with Streams([stream1, stream2]) as streams:
+        rls = RLSFilter(
+            streams.join('time_catch', 5),
+            ('test_stream_1', 'val'),
+            ('test_stream_2', 'val'),
+            forgetting=0.99,
+        )
+        while True:
+            for _, _, output in await rls.next_batch():
+                print("===")
+                print(f'a: {output[b"intercept"]}')
+                print(f'b: {output[b"test_stream_1:val"]}')
+                print("===")
+
+
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+loop = asyncio.get_event_loop()
+loop.run_until_complete(main())
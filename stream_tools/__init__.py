@@ -1,10 +1,38 @@
+from .backfill import Backfill
+from .checkpoint import Checkpoint
+from .group import ConsumerGroup
+from .memory import MemoryPool
+from .memory import MemoryServer
+from .metrics import MetricsRegistry
+from .pool import Pool
+from .pool import RedisPool
 from .stream import Stream
 from .streams import Streams
+from .utils.codec import Float64Codec
+from .utils.codec import TextCodec
+from .utils.sanitize import BatchSanitizer
+from .utils.sanitize import compile_decoder
 from .utils.sanitize import sanitize
+from .utils.sanitize import sanitize_batch
+from .writer import StreamWriter
 
 
 __all__ = [
+    'Backfill',
+    'BatchSanitizer',
+    'Checkpoint',
+    'ConsumerGroup',
+    'Float64Codec',
+    'MemoryPool',
+    'MemoryServer',
+    'MetricsRegistry',
+    'Pool',
+    'RedisPool',
     'Stream',
     'Streams',
-    'sanitize'
+    'StreamWriter',
+    'TextCodec',
+    'compile_decoder',
+    'sanitize',
+    'sanitize_batch'
 ]
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import AsyncGenerator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from .client import RedisClient
+from .pool import Pool
+from .stream import Stream
+from .utils.channel import Channel
+from .utils.codec import Codec
+from .utils.ids import Position
+from .utils.ids import next_id
+from .utils.ids import previous_id
+from .utils.ids import to_id
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel[StreamRecord]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel
+
+
+class Backfill(Stream):
+    """Stream reading the history of a redis stream between two positions
+    (ids, timestamps in milliseconds or datetimes), in pages of `page`
+    entries fetched with XRANGE. It can be used wherever a Stream is used:
+    the nodes (e.g. MovingAverage, SumBar) receive a whole page at a time,
+    and in Streams (join, merge) the pages of all the streams are delivered
+    in id order. With `follow` the stream is then read live right after the
+    last entry of the history, so no entry is skipped or repeated.
+    """
+    def __init__(
+        self,
+        stream_name: str,
+        start: Position = b"-",
+        end: Position = b"+",
+        page: int = 10000,
+        follow: bool = False,
+        count: int = 1,
+        block: int = 0,
+        pool: Optional[Pool] = None,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        """Initialize the backfill
+
+        Args:
+            stream_name (str): the name of the redis stream
+            start (Position, optional): the first position of the history.
+                Defaults to b"-" (the first entry).
+            end (Position, optional): the last position of the history.
+                Defaults to b"+" (the last entry).
+            page (int, optional): number of entries fetched with a single
+                XRANGE. Defaults to 10000.
+            follow (bool, optional): read the new entries once the history
+                has been read. Defaults to False.
+            count (int, optional): maximum number of entries fetched with
+                a single live read. Defaults to 1.
+            block (int, optional): how long (in milliseconds) a live read
+                waits for new entries, 0 waits forever. Defaults to 0.
+            pool (Optional[Pool], optional): the pool providing the
+                redis connections, shared with other streams and nodes.
+                Defaults to None (a private pool on redis://localhost).
+            codec (Optional[Codec], optional): the codec of the entries.
+                Defaults to None (TextCodec).
+        """
+        super().__init__(
+            stream_name, count=count, block=block, pool=pool, codec=codec, start=start
+        )
+        self.start: bytes
+        self.end = to_id(end)
+        self.page = max(int(page), 1)
+        self.follow = bool(follow)
+        # first id of the next page, None once the history has been read
+        self.cursor: Optional[bytes] = self.start
+        self.backfilled = 0
+
+    @property
+    def done(self) -> bool:
+        """Check if the whole history has been read
+
+        Returns:
+            bool: True if there are no more pages
+        """
+        return self.cursor is None
+
+    async def read_batch(
+        self, timeout: int = 1
+    ) -> AsyncGenerator[List[StreamRecord], None]:
+        """Function to provide the history of the stream a page at a time
+        and then, with `follow`, the new entries (see Stream.read_batch).
+
+        Args:
+            timeout (int, optional): Timeout in seconds of the live reads.
+                Defaults to 1.
+
+        Yields:
+            Iterator[AsyncGenerator[List[StreamRecord], None]]: generator
+                containing the list of read values
+        """
+        while not self.done and self.running:
+            res = await self._page(self.redis)
+            if res:
+                self.delivered += len(res)
+                yield res
+
+        if self.follow:
+            self.last_id = self.live_id()
+            async for batch in super().read_batch(timeout):
+                yield batch
+
+    async def _read(self, queue: StreamQueue) -> None:
+        """Read the history of the stream and put it in the async queue,
+        one page at a time. The next page is fetched while the previous
+        one is processed, but no more than a page waits in the queue.
+        With `follow` the new entries are then read (see Stream._read).
+
+        Args:
+            queue (StreamQueue): the queue in which to put the read values
+        """
+        while not self.done:
+            res = await self._page(self.redis)
+            if res:
+                self.delivered += len(res)
+                await queue.put_many(res)
+                await queue.drain(self.page)
+
+        if self.follow:
+            self.last_id = self.live_id()
+            await super()._read(queue)
+
+    async def _page(self, redis: RedisClient) -> List[StreamRecord]:
+        """Fetch the next page of the history
+
+        Args:
+            redis (RedisClient): the redis connection
+
+        Returns:
+            List[StreamRecord]: the entries of the page, decoded by the codec
+        """
+        if self.cursor is None:
+            return []
+        res = await redis.xrange(
+            self.stream_name, self.cursor, self.end, count=self.page
+        )
+        name = self.stream_name.encode()
+        records = self.codec.decode_many([(name, idx, value) for idx, value in res])
+
+        if records:
+            self.last_id = records[-1][1]
+            self.backfilled += len(records)
+        if len(records) < self.page:
+            self.cursor = None
+        else:
+            self.cursor = next_id(records[-1][1])
+        return records
+
+    def live_id(self) -> bytes:
+        """The cursor of the live reads following the history: the id of
+        its last entry, or the id preceding the start of an empty history
+
+        Returns:
+            bytes: the redis id
+        """
+        if self.last_id is not None:
+            return self.last_id
+        return previous_id(self.start)
@@ -1,3 +1,4 @@
+from .bar import Bar
 from .sumbar import SumBar
 
-__all__ = ["SumBar"]
+__all__ = ["Bar", "SumBar"]
@@ -0,0 +1,996 @@
+from __future__ import annotations
+
+import time
+
+from abc import ABC
+from abc import abstractmethod
+from array import array
+from collections import OrderedDict
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import Union
+from typing import TYPE_CHECKING
+from math import nan
+
+import numpy as np  # type: ignore
+
+from ..checkpoint import Checkpoint
+from ..checkpoint import pack_bytes
+from ..checkpoint import unpack_bytes
+from ..metrics import MetricsRegistry
+from ..stream import Stream
+from ..utils.channel import Channel
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel[StreamRecord]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel
+
+BarOutput = Tuple[bytes, bytes, Dict[bytes, float]]
+Threshold = Union[
+    Tuple[str, Union[int, float]], List[Tuple[str, Union[int, float]]]
+]
+
+
+class Reducer(ABC):
+    """Base class of the reducers of the bars. A reducer computes the
+    output value of each field from the accumulators of the bar state
+    (sum, number, first and last of the valid values of each field).
+    Reducers needing other accumulators keep them in arrays indexed by
+    the field slot, updated by push (one value) and extend (a block of
+    records).
+    """
+    name = "reducer"
+    # whether push and extend must be called
+    accumulates = False
+
+    def __init__(self, weight: Optional[str] = None) -> None:
+        """Initialize the reducer
+
+        Args:
+            weight (Optional[str], optional): the field used as weight.
+                Defaults to None.
+        """
+        self.weight = weight.encode() if weight is not None else None
+
+    def resize(self, size: int) -> None:
+        """Extend the accumulators to a new number of fields
+
+        Args:
+            size (int): the number of fields
+        """
+
+    def reset(self) -> None:
+        """Empty the accumulators at the start of a new bar
+        """
+
+    def push(self, slot: int, value: float, weight: float) -> None:
+        """Accumulate a new valid value of a field
+
+        Args:
+            slot (int): the slot of the field
+            value (float): the value
+            weight (float): the weight of the record (NaN if missing)
+        """
+
+    def extend(self, block: np.ndarray, weights: Optional[np.ndarray]) -> None:
+        """Accumulate a block of records
+
+        Args:
+            block (np.ndarray): the values of the records, one column for
+                each field slot (NaN if missing)
+            weights (Optional[np.ndarray]): the weights of the records
+        """
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        """Copy the accumulators for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the accumulators
+        """
+        return {}
+
+    def load(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the accumulators from a checkpoint
+
+        Args:
+            arrays (Dict[str, np.ndarray]): the accumulators
+        """
+
+    @abstractmethod
+    def values(self, state: BarState) -> List[float]:
+        """The output value of each field slot
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the values
+        """
+
+
+class SumReducer(Reducer):
+    """Sum of the values of each field"""
+    name = "sum"
+
+    def values(self, state: BarState) -> List[float]:
+        """The sum of the values of each field
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the sum of each field slot
+        """
+        return list(state.totals)
+
+
+class AverageReducer(Reducer):
+    """Average of the values of each field"""
+    name = "average"
+
+    def values(self, state: BarState) -> List[float]:
+        """The average of the values of each field
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the average of each field slot, NaN if the field
+                has no valid value
+        """
+        return [
+            total / count if count else nan
+            for total, count in zip(state.totals, state.counts)
+        ]
+
+
+class LastReducer(Reducer):
+    """Last value of each field"""
+    name = "last"
+
+    def values(self, state: BarState) -> List[float]:
+        """The last value of each field
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the last value of each field slot, NaN if the field
+                has no valid value
+        """
+        return [
+            last if count else nan
+            for last, count in zip(state.lasts, state.counts)
+        ]
+
+
+class AbsoluteDeltaReducer(Reducer):
+    """Difference between the last and the first value of each field"""
+    name = "absolute_delta"
+
+    def values(self, state: BarState) -> List[float]:
+        """The difference between the last and the first value of each
+        field
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the difference of each field slot, NaN if the field
+                has no valid value
+        """
+        return [
+            last - first if count else nan
+            for first, last, count in zip(state.firsts, state.lasts, state.counts)
+        ]
+
+
+class RelativeDeltaReducer(Reducer):
+    """Difference between the last and the first value of each field,
+    relative to the first value"""
+    name = "relative_delta"
+
+    def values(self, state: BarState) -> List[float]:
+        """The difference between the last and the first value of each
+        field, relative to the first value
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the relative difference of each field slot, NaN if
+                the field has no valid value or its first value is 0
+        """
+        return [
+            (last - first) / first if count and first else nan
+            for first, last, count in zip(state.firsts, state.lasts, state.counts)
+        ]
+
+
+class WeightedAverageReducer(Reducer):
+    """Average of the values of each field weighted by the weight field
+    (e.g. volume weighted prices). The output of the weight field is its
+    sum."""
+    name = "weighted_average"
+    accumulates = True
+
+    def __init__(self, weight: Optional[str] = None) -> None:
+        """Initialize the reducer
+
+        Args:
+            weight (Optional[str], optional): the field used as weight.
+                Defaults to None.
+
+        Raises:
+            TypeError: if no weight field is provided
+        """
+        if weight is None:
+            raise TypeError("No weight field provided.")
+        super().__init__(weight)
+        self.weighted = array("d")
+        self.weights = array("d")
+
+    def resize(self, size: int) -> None:
+        """Extend the weighted sums and the weights to a new number of fields
+
+        Args:
+            size (int): the number of fields
+        """
+        missing = array("d", [0.0]) * (size - len(self.weighted))
+        self.weighted.extend(missing)
+        self.weights.extend(missing)
+
+    def reset(self) -> None:
+        """Zero the weighted sums and the weights at the start of a new bar
+        """
+        size = len(self.weighted)
+        self.weighted = array("d", [0.0]) * size
+        self.weights = array("d", [0.0]) * size
+
+    def push(self, slot: int, value: float, weight: float) -> None:
+        """Add a value to the weighted sum of its field, unless the weight is
+        missing
+
+        Args:
+            slot (int): the slot of the field
+            value (float): the value
+            weight (float): the weight of the record (NaN if missing)
+        """
+        if weight == weight:
+            self.weighted[slot] += value * weight
+            self.weights[slot] += weight
+
+    def extend(self, block: np.ndarray, weights: Optional[np.ndarray]) -> None:
+        """Add a block of records to the weighted sums, skipping the missing
+        values and weights
+
+        Args:
+            block (np.ndarray): the values of the records, one column for
+                each field slot (NaN if missing)
+            weights (Optional[np.ndarray]): the weights of the records
+        """
+        # the weights are always given to a reducer with a weight field
+        column: np.ndarray = weights  # type: ignore
+        valid = ~np.isnan(block) & ~np.isnan(column)[:, None]
+        weighted = np.where(valid, block * column[:, None], 0.0).sum(axis=0)
+        total = np.where(valid, column[:, None], 0.0).sum(axis=0)
+        np.frombuffer(self.weighted)[:] += weighted
+        np.frombuffer(self.weights)[:] += total
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        """Copy the weighted sums and the weights for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the "weighted" and "weights" arrays
+        """
+        return {
+            "weighted": np.array(self.weighted, dtype=np.float64),
+            "weights": np.array(self.weights, dtype=np.float64),
+        }
+
+    def load(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the weighted sums and the weights from a checkpoint
+
+        Args:
+            arrays (Dict[str, np.ndarray]): the "weighted" and "weights"
+                arrays
+        """
+        self.weighted = array("d", arrays["weighted"].tobytes())
+        self.weights = array("d", arrays["weights"].tobytes())
+
+    def values(self, state: BarState) -> List[float]:
+        """The weighted average of each field, and the sum of the weight
+        field
+
+        Args:
+            state (BarState): the bar state
+
+        Returns:
+            List[float]: the values of each field slot, NaN if no weighted
+                value
+        """
+        values = [
+            weighted / weights if weights else nan
+            for weighted, weights in zip(self.weighted, self.weights)
+        ]
+        slot = state.slots.get(self.weight)  # type: ignore
+        if slot is not None:
+            values[slot] = state.totals[slot]
+        return values
+
+
+REDUCER_TYPES: List[Type[Reducer]] = [
+    SumReducer,
+    AverageReducer,
+    WeightedAverageReducer,
+    LastReducer,
+    AbsoluteDeltaReducer,
+    RelativeDeltaReducer,
+]
+REDUCERS: Dict[str, Type[Reducer]] = {
+    reducer.name: reducer for reducer in REDUCER_TYPES
+}
+
+
+class Trigger(ABC):
+    """Base class of the rules closing the bars. A rule checks the bar
+    state after each record (check), or finds the first closing record
+    of a block of records (find).
+    """
+    def bind(self, state: BarState) -> None:
+        """Resolve the fields of the rule on the slots of the state. The
+        fields of the rule are always included in the output.
+
+        Args:
+            state (BarState): the bar state
+        """
+
+    @abstractmethod
+    def check(self, state: BarState) -> bool:
+        """Check if the bar must be closed
+
+        Args:
+            state (BarState): the bar state, updated with the last record
+
+        Returns:
+            bool: True if the bar must be closed
+        """
+
+    @abstractmethod
+    def find(self, state: BarState, data: np.ndarray, start: int) -> Optional[int]:
+        """Find the first record closing the bar
+
+        Args:
+            state (BarState): the bar state before the record `start`
+            data (np.ndarray): the values of the records, one column for
+                each field slot (0.0 if missing)
+            start (int): the first record to check
+
+        Returns:
+            Optional[int]: the index of the record closing the bar, None
+                if none of the records closes it
+        """
+
+    @abstractmethod
+    def describe(self) -> str:
+        """Description of the rule, used in the node names
+
+        Returns:
+            str: the description
+        """
+
+
+class ThresholdTrigger(Trigger):
+    """Close the bar when the sum of the values of a field reaches its
+    threshold"""
+    def __init__(self, thresholds: Dict[str, float]) -> None:
+        """Initialize the rule
+
+        Args:
+            thresholds (Dict[str, float]): the threshold of each field
+        """
+        self.thresholds = thresholds
+        self.fields = list(thresholds)
+
+    def bind(self, state: BarState) -> None:
+        """Assign a slot to each field of the thresholds
+
+        Args:
+            state (BarState): the bar state
+        """
+        self.slots = [state.slot(field.encode()) for field in self.fields]
+        self.limits = np.array([float(t) for t in self.thresholds.values()])
+        self.pairs = list(zip(self.slots, self.limits.tolist()))
+
+    def check(self, state: BarState) -> bool:
+        """Check if the sum of a field reached its threshold
+
+        Args:
+            state (BarState): the bar state, updated with the last record
+
+        Returns:
+            bool: True if a threshold is reached
+        """
+        totals = state.totals
+        for slot, limit in self.pairs:
+            if totals[slot] >= limit:
+                return True
+        return False
+
+    def find(self, state: BarState, data: np.ndarray, start: int) -> Optional[int]:
+        """Find the first record for which the sum of a field reaches its
+        threshold
+
+        Args:
+            state (BarState): the bar state before the record `start`
+            data (np.ndarray): the values of the records, one column for
+                each field slot (0.0 if missing)
+            start (int): the first record to check
+
+        Returns:
+            Optional[int]: the index of the record closing the bar, None
+                if none of the records closes it
+        """
+        # the running sums are computed on blocks of growing size, so the
+        # cost is proportional to the length of the bar
+        totals = np.array([state.totals[slot] for slot in self.slots])
+        width = 64
+        while start < len(data):
+            block = data[start:start + width, self.slots]
+            sums = np.cumsum(np.vstack((totals, block)), axis=0)[1:]
+            hits = (sums >= self.limits).any(axis=1)
+            if hits.any():
+                return start + int(hits.argmax())
+            totals = sums[-1]
+            start += width
+            width *= 2
+        return None
+
+    def describe(self) -> str:
+        """The (field, threshold) pairs
+
+        Returns:
+            str: the description
+        """
+        return ", ".join([f"({k}, {v})" for k, v in self.thresholds.items()])
+
+
+class CountTrigger(Trigger):
+    """Close the bar every `count` records"""
+    def __init__(self, count: int) -> None:
+        """Initialize the rule
+
+        Args:
+            count (int): the number of records of each bar
+        """
+        self.count = int(count)
+
+    def check(self, state: BarState) -> bool:
+        """Check if the bar has `count` records
+
+        Args:
+            state (BarState): the bar state, updated with the last record
+
+        Returns:
+            bool: True if the bar is full
+        """
+        return state.records >= self.count
+
+    def find(self, state: BarState, data: np.ndarray, start: int) -> Optional[int]:
+        """Find the record filling the bar
+
+        Args:
+            state (BarState): the bar state before the record `start`
+            data (np.ndarray): the values of the records
+            start (int): the first record to check
+
+        Returns:
+            Optional[int]: the index of the record closing the bar, None
+                if the records do not fill it
+        """
+        end = start + max(self.count - state.records, 1) - 1
+        return end if end < len(data) else None
+
+    def describe(self) -> str:
+        """The number of records of each bar
+
+        Returns:
+            str: the description
+        """
+        return str(self.count)
+
+
+class BarState:
+    """State class of the bars. Each field is assigned a slot in the
+    accumulator arrays the first time it is seen, so a record costs
+    one dict lookup and a few array updates for each of its fields.
+    The batches update the arrays in place through numpy views.
+    The output is computed by the reducer only when a bar is closed.
+    """
+    def __init__(self, reducer: Reducer, trigger: Trigger) -> None:
+        """Initialize the bar state
+
+        Args:
+            reducer (Reducer): the reducer of the fields
+            trigger (Trigger): the rule closing the bars
+        """
+        self.reducer = reducer
+        self.rule = trigger
+        self.trigger = False
+        self.output: Optional[BarOutput] = None
+        self.names: Dict[bytes, bytes] = {}
+
+        self.slots: Dict[bytes, int] = {}
+        self.fields: List[bytes] = []
+        self.totals = array("d")
+        self.counts = array("q")
+        self.firsts = array("d")
+        self.lasts = array("d")
+        self.records = 0
+
+        self.rule.bind(self)
+        self.configured = len(self.fields)
+
+    def slot(self, field: bytes) -> int:
+        """The slot of a field, assigned if it is a new field
+
+        Args:
+            field (bytes): the field name
+
+        Returns:
+            int: the slot of the field
+        """
+        slot = self.slots.get(field)
+        if slot is None:
+            slot = len(self.fields)
+            self.slots[field] = slot
+            self.fields.append(field)
+            self.totals.append(0.0)
+            self.counts.append(0)
+            self.firsts.append(nan)
+            self.lasts.append(nan)
+            self.reducer.resize(slot + 1)
+        return slot
+
+    def empty_state(self) -> None:
+        """Empty the accumulators at the start of a new bar
+        """
+        size = len(self.fields)
+        self.totals = array("d", [0.0]) * size
+        self.counts = array("q", [0]) * size
+        self.records = 0
+        self.reducer.reset()
+
+    def _name(self, name: bytes) -> bytes:
+        """The output name for a source stream
+
+        Args:
+            name (bytes): the source stream name
+
+        Returns:
+            bytes: the output name
+        """
+        try:
+            return self.names[name]
+        except KeyError:
+            new_name = f"{self.reducer.name}({name.decode()})".encode()
+            self.names[name] = new_name
+            return new_name
+
+    def _output(self, name: bytes, idx: bytes) -> BarOutput:
+        """The output of the closed bar: the fields configured by the rule
+        and the fields with values in the bar
+
+        Args:
+            name (bytes): the source stream name
+            idx (bytes): the redis id of the record closing the bar
+
+        Returns:
+            BarOutput: the output name, the redis id and the field values
+        """
+        values = self.reducer.values(self)
+        counts = self.counts
+        configured = self.configured
+        output = {
+            field: values[slot]
+            for slot, field in enumerate(self.fields)
+            if slot < configured or counts[slot]
+        }
+        return self._name(name), idx, output
+
+    def update(self, new_record: StreamRecord) -> None:
+        """Update the bar with a new record. If the record closes the bar,
+        trigger is set and output holds the bar.
+
+        Args:
+            new_record (StreamRecord): the new record
+        """
+        name, idx, new_value = new_record
+
+        if self.trigger:
+            self.empty_state()
+            self.trigger = False
+
+        reducer = self.reducer
+        push = reducer.push if reducer.accumulates else None
+        weight = nan
+        if reducer.weight is not None and reducer.weight in new_value:
+            weight = float(new_value[reducer.weight])
+
+        slots = self.slots
+        totals = self.totals
+        counts = self.counts
+        lasts = self.lasts
+        for k, v in new_value.items():
+            slot = slots.get(k)
+            if slot is None:
+                slot = self.slot(k)
+            value = float(v)
+            if value != value:
+                continue
+            totals[slot] += value
+            if counts[slot]:
+                counts[slot] += 1
+            else:
+                counts[slot] = 1
+                self.firsts[slot] = value
+            lasts[slot] = value
+            if push is not None:
+                push(slot, value, weight)
+        self.records += 1
+
+        if self.rule.check(self):
+            self.trigger = True
+            self.output = self._output(name, idx)
+        else:
+            self.output = None
+
+    def _matrix(self, new_records: List[StreamRecord]) -> np.ndarray:
+        """The values of a batch of records, one column for each field slot
+
+        Args:
+            new_records (List[StreamRecord]): the records
+
+        Returns:
+            np.ndarray: the values (NaN if missing)
+        """
+        slots = self.slots
+        try:
+            columns = [slots[k] for record in new_records for k in record[2]]
+        except KeyError:
+            for record in new_records:
+                for k in record[2]:
+                    if k not in slots:
+                        self.slot(k)
+            columns = [slots[k] for record in new_records for k in record[2]]
+        values = [float(v) for record in new_records for v in record[2].values()]
+        rows = np.repeat(
+            np.arange(len(new_records)), [len(record[2]) for record in new_records]
+        )
+        data = np.full((len(new_records), len(self.fields)), nan)
+        data[rows, columns] = values
+        return data
+
+    def _extend(
+        self,
+        block: np.ndarray,
+        filled: np.ndarray,
+        valid: np.ndarray,
+        weights: Optional[np.ndarray],
+    ) -> None:
+        """Update the accumulators with a block of records
+
+        Args:
+            block (np.ndarray): the values of the records (NaN if missing)
+            filled (np.ndarray): the values of the records (0.0 if missing)
+            valid (np.ndarray): the mask of the valid values
+            weights (Optional[np.ndarray]): the weights of the records
+        """
+        present = valid.any(axis=0)
+        totals = np.frombuffer(self.totals)
+        counts = np.frombuffer(self.counts, dtype=np.int64)
+        firsts = np.frombuffer(self.firsts)
+        lasts = np.frombuffer(self.lasts)
+
+        # the running sums are computed in the same order as update
+        totals[:] = np.cumsum(np.vstack((totals, filled)), axis=0)[-1]
+        first_rows = valid.argmax(axis=0)
+        last_rows = len(block) - 1 - valid[::-1].argmax(axis=0)
+        columns = np.arange(block.shape[1])
+        starting = present & (counts == 0)
+        firsts[starting] = block[first_rows, columns][starting]
+        lasts[present] = block[last_rows, columns][present]
+        counts += valid.sum(axis=0)
+
+        if self.reducer.accumulates:
+            self.reducer.extend(block, weights)
+        self.records += len(block)
+
+    def update_many(self, new_records: List[StreamRecord]) -> List[BarOutput]:
+        """Update the bar with a batch of records. The records are converted
+        to a single matrix, and the accumulators are updated with one
+        vectorized operation for each bar closed in the batch.
+
+        Args:
+            new_records (List[StreamRecord]): the new records, oldest first
+
+        Returns:
+            List[BarOutput]: the bars closed by the records
+        """
+        n = len(new_records)
+        if n == 0:
+            return []
+
+        data = self._matrix(new_records)
+        valid = ~np.isnan(data)
+        filled = np.where(valid, data, 0.0)
+        weights = None
+        if self.reducer.weight is not None:
+            slot = self.slots.get(self.reducer.weight)
+            weights = data[:, slot] if slot is not None else np.full(n, nan)
+
+        outputs = []
+        start = 0
+        while start < n:
+            if self.trigger:
+                self.empty_state()
+                self.trigger = False
+            hit = self.rule.find(self, filled, start)
+            end = n if hit is None else hit + 1
+            self._extend(
+                data[start:end],
+                filled[start:end],
+                valid[start:end],
+                weights[start:end] if weights is not None else None,
+            )
+            if hit is not None:
+                self.trigger = True
+                name, idx, _ = new_records[hit]
+                outputs.append(self._output(name, idx))
+            start = end
+
+        self.output = outputs[-1] if self.trigger else None
+        return outputs
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        """Copy the accumulators of the bar for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the accumulators of each field slot
+        """
+        fields, offsets = pack_bytes(self.fields)
+        arrays = {
+            "fields": fields,
+            "field_offsets": offsets,
+            "totals": np.array(self.totals, dtype=np.float64),
+            "counts": np.array(self.counts, dtype=np.int64),
+            "firsts": np.array(self.firsts, dtype=np.float64),
+            "lasts": np.array(self.lasts, dtype=np.float64),
+            "records": np.array([self.records, int(self.trigger)], dtype=np.int64),
+        }
+        for name, values in self.reducer.dump().items():
+            arrays[f"reducer_{name}"] = values
+        return arrays
+
+    def load(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the accumulators of the bar from a checkpoint
+
+        Args:
+            arrays (Dict[str, np.ndarray]): the arrays of the checkpoint
+
+        Raises:
+            ValueError: in case the checkpoint has different fields
+        """
+        fields = unpack_bytes(arrays["fields"], arrays["field_offsets"])
+        for field in fields:
+            self.slot(field)
+        if self.fields != fields:
+            raise ValueError("Checkpoint not compatible with the bar fields.")
+        self.totals = array("d", arrays["totals"].tobytes())
+        self.counts = array("q", arrays["counts"].tobytes())
+        self.firsts = array("d", arrays["firsts"].tobytes())
+        self.lasts = array("d", arrays["lasts"].tobytes())
+        self.records, trigger = arrays["records"].tolist()
+        self.trigger = bool(trigger)
+        self.reducer.load({
+            name[len("reducer_"):]: values
+            for name, values in arrays.items()
+            if name.startswith("reducer_")
+        })
+
+
+class Bar:
+    """Bar class. Aggregate the records of a stream in bars, reducing
+    the values of each field (sum, average, weighted_average, last,
+    absolute_delta or relative_delta) until the bar is closed by a
+    threshold on the sum of some fields or by a number of records.
+    """
+    def __init__(
+        self,
+        stream: Stream,
+        reducer: Union[str, Reducer],
+        trigger: Union[Threshold, int, Trigger],
+        weight: Optional[str] = None,
+        maxsize: int = 0,
+        overflow: str = "block",
+        checkpoint: Optional[Checkpoint] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        """Initialize the bar and start the reader function
+
+        Args:
+            stream (Stream): the source stream
+            reducer (Union[str, Reducer]): the reducer, one of REDUCERS or
+                a Reducer instance
+            trigger (Union[Threshold, int, Trigger]): the rule closing the
+                bars: a (field, threshold) tuple or a list of them, a number
+                of records, or a Trigger instance
+            weight (Optional[str], optional): the weight field of the
+                weighted_average reducer. Defaults to None.
+            maxsize (int, optional): capacity of the internal queue, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). Defaults to "block".
+            checkpoint (Optional[Checkpoint], optional): save the open bar
+                periodically, and restore it at start, reading right after
+                the last record applied to it. Defaults to None.
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node. Defaults to None.
+
+        Raises:
+            ValueError: in case of unknown reducer
+            TypeError: in case of wrong trigger type
+        """
+        self.stream = stream
+
+        if isinstance(reducer, str):
+            if reducer not in REDUCERS:
+                raise ValueError("Wrong reducer type.")
+            reducer = REDUCERS[reducer](weight)
+        self.reducer = reducer
+
+        if isinstance(trigger, tuple):
+            self.thresholds = {trigger[0]: trigger[1]}
+            trigger = ThresholdTrigger(self.thresholds)
+        elif isinstance(trigger, list):
+            if not all(isinstance(t, tuple) for t in trigger):
+                raise TypeError("Bar thresholds must be (field, threshold) tuples.")
+            self.thresholds = {t[0]: t[1] for t in trigger}
+            trigger = ThresholdTrigger(self.thresholds)
+        elif isinstance(trigger, int) and not isinstance(trigger, bool):
+            trigger = CountTrigger(trigger)
+        elif not isinstance(trigger, Trigger):
+            raise TypeError("Bar trigger must be tuple, list of tuples or int.")
+        self.trigger = trigger
+
+        self.state = BarState(self.reducer, self.trigger)
+        self.checkpoint = checkpoint
+        # redis id of the last record applied to the state
+        self.last_id: Optional[bytes] = None
+
+        self.queue: StreamQueue = Channel(maxsize, overflow)
+        self.pending: Deque[StreamRecord] = deque()
+        self.metrics = None if metrics is None else metrics.register(
+            self.node_name, self.queue, self._queued
+        )
+        if checkpoint is None:
+            self.stream._start(lambda: self.stream._read(self.queue))
+        else:
+            self.stream.checkpoints.append(checkpoint)
+            self.stream._start(self._resume)
+
+    @property
+    def source_name(self) -> str:
+        """The source stream name getter
+
+        Returns:
+            str: the name of the source stream
+        """
+        return self.stream.name
+
+    @property
+    def node_name(self) -> str:
+        """The node name getter
+
+        Returns:
+            str: the node name
+        """
+        args = self.trigger.describe()
+        return f"{self.reducer.name}_bar({self.source_name})[{args}]"
+
+    def __aiter__(self) -> Bar:
+        """Get the bar iterator
+
+        Returns:
+            Bar: the bar instance
+        """
+        return self
+
+    async def __anext__(self) -> Optional[BarOutput]:
+        """Get the values from the queue until a bar is closed
+
+        Returns:
+            Optional[BarOutput]: the closed bar
+        """
+        while True:
+            if not self.pending:
+                self.pending.extend(await self.queue.get_batch())
+
+            started = time.perf_counter()
+            res = self.pending.popleft()
+            self.state.update(res)
+            self.last_id = res[1]
+            self.stream.ack(res)
+            closed = self.state.trigger
+            if self.metrics is not None:
+                self.metrics.observe(1, int(closed), started, res[1])
+
+            if closed:
+                return self.state.output
+
+    async def next_batch(self) -> List[BarOutput]:
+        """Wait for new values and aggregate all of them at once, until
+            at least a bar is closed
+
+        Returns:
+            List[BarOutput]: the closed bars
+        """
+        outputs: List[BarOutput] = []
+        while not outputs:
+            if self.pending:
+                batch = list(self.pending)
+                self.pending.clear()
+            else:
+                batch = await self.queue.get_batch()
+
+            started = time.perf_counter()
+            outputs = self.state.update_many(batch)
+            self.last_id = batch[-1][1]
+            for res in batch:
+                self.stream.ack(res)
+            if self.metrics is not None:
+                self.metrics.observe(len(batch), len(outputs), started, batch[0][1])
+        return outputs
+
+    def _queued(self) -> int:
+        """Number of records waiting to be processed
+
+        Returns:
+            int: the number of records
+        """
+        return self.queue.qsize() + len(self.pending)
+
+    async def _resume(self) -> None:
+        """Restore the state from the checkpoint, if any, start saving the
+            checkpoints and read the stream right after the last record of
+            the checkpoint
+        """
+        checkpoint: Checkpoint = self.checkpoint  # type: ignore
+        arrays = await checkpoint.load(self.stream.client)
+        if arrays is not None:
+            self.state.load(arrays)
+            self.last_id = arrays["last_id"].tobytes() or None
+            if self.last_id is not None:
+                self.stream.last_id = self.last_id
+        checkpoint.start(self.stream.client, self._capture)
+        await self.stream._read(self.queue)
+
+    def _capture(self) -> Dict[str, np.ndarray]:
+        """Copy the state and the id of its last record for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the arrays of the checkpoint
+        """
+        arrays = self.state.dump()
+        arrays["last_id"] = np.frombuffer(self.last_id or b"", dtype=np.uint8)
+        return arrays
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import os
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np  # type: ignore
+
+from .client import RedisClient
+
+
+Arrays = Dict[str, np.ndarray]
+
+logger = logging.getLogger(__name__)
+
+
+def pack_bytes(values: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Store a list of bytes in two arrays: the concatenated bytes and the
+    end offset of each value
+
+    Args:
+        values (List[bytes]): the values
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the bytes and the offsets
+    """
+    data = np.frombuffer(b"".join(values), dtype=np.uint8)
+    offsets = np.cumsum([len(value) for value in values], dtype=np.int64)
+    return data, offsets
+
+
+def unpack_bytes(data: np.ndarray, offsets: np.ndarray) -> List[bytes]:
+    """Get back a list of bytes stored with pack_bytes
+
+    Args:
+        data (np.ndarray): the concatenated bytes
+        offsets (np.ndarray): the end offset of each value
+
+    Returns:
+        List[bytes]: the values
+    """
+    raw = data.tobytes()
+    ends = offsets.tolist()
+    return [raw[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def dumps(arrays: Arrays) -> bytes:
+    """Serialize the arrays of a checkpoint (raw buffers in npz format)
+
+    Args:
+        arrays (Arrays): the arrays
+
+    Returns:
+        bytes: the checkpoint
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)  # type: ignore
+    return buffer.getvalue()
+
+
+def loads(data: bytes) -> Arrays:
+    """Deserialize the arrays of a checkpoint
+
+    Args:
+        data (bytes): the checkpoint
+
+    Returns:
+        Arrays: the arrays
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+class Checkpoint:
+    """Periodic checkpoint of the state of a node together with the id of
+    the last record applied to it, saved to a redis key or to a file.
+    A node with a checkpoint loads it before reading and resumes reading
+    right after the saved id. The state is copied between two records,
+    while serializing and writing it happen out of the event loop (file)
+    or asynchronously (redis).
+    """
+    def __init__(
+        self, name: str, interval: float = 60.0, path: Optional[str] = None
+    ) -> None:
+        """Initialize the checkpoint
+
+        Args:
+            name (str): the redis key of the checkpoint
+            interval (float, optional): time in seconds between two
+                checkpoints. Defaults to 60.0.
+            path (Optional[str], optional): save the checkpoint to this file
+                instead of redis. Defaults to None.
+        """
+        self.name = str(name)
+        self.interval = float(interval)
+        self.path = path
+        self.saved = 0
+        self.saver: Optional[asyncio.Future] = None
+        self.redis: Optional[RedisClient] = None
+        self.capture: Optional[Callable[[], Arrays]] = None
+
+    async def load(self, redis: RedisClient) -> Optional[Arrays]:
+        """Load the last checkpoint
+
+        Args:
+            redis (RedisClient): the redis instance
+
+        Returns:
+            Optional[Arrays]: the arrays of the checkpoint, None if there
+                is no checkpoint
+        """
+        loop = asyncio.get_event_loop()
+        if self.path is not None:
+            data = await loop.run_in_executor(None, self._read_file)
+        else:
+            data = await redis.get(self.name)
+        if not data:
+            return None
+        return await loop.run_in_executor(None, loads, data)
+
+    async def save(self, redis: RedisClient, arrays: Arrays) -> None:
+        """Save a checkpoint
+
+        Args:
+            redis (RedisClient): the redis instance
+            arrays (Arrays): the arrays of the checkpoint, not changed
+                while saving
+        """
+        loop = asyncio.get_event_loop()
+        data = await loop.run_in_executor(None, dumps, arrays)
+        if self.path is not None:
+            await loop.run_in_executor(None, self._write_file, data)
+        else:
+            await redis.set(self.name, data)
+        self.saved += 1
+
+    def start(self, redis: RedisClient, capture: Callable[[], Arrays]) -> None:
+        """Start saving checkpoints periodically
+
+        Args:
+            redis (RedisClient): the redis instance
+            capture (Callable[[], Arrays]): function copying the state
+        """
+        self.redis = redis
+        self.capture = capture
+        self.saver = asyncio.ensure_future(self._save_periodically(redis, capture))
+
+    async def stop(self) -> None:
+        """Stop saving checkpoints periodically and save a last one, so
+        the state reached at shutdown is not lost. It is called by the
+        source stream (Stream, Streams) when its context is exited.
+        """
+        if self.saver is None:
+            return
+        saver, self.saver = self.saver, None
+        saver.cancel()
+        try:
+            await saver
+        except asyncio.CancelledError:
+            pass
+        await self.save(self.redis, self.capture())  # type: ignore
+
+    async def _save_periodically(
+        self, redis: RedisClient, capture: Callable[[], Arrays]
+    ) -> None:
+        """Save a checkpoint every `interval` seconds. A failed save is
+        logged, and the next one is tried anyway.
+
+        Args:
+            redis (RedisClient): the redis instance
+            capture (Callable[[], Arrays]): function copying the state
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save(redis, capture())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Saving the checkpoint %s failed.", self.name)
+
+    def _read_file(self) -> Optional[bytes]:
+        """Read the checkpoint file
+
+        Returns:
+            Optional[bytes]: the checkpoint, None if there is no file
+        """
+        try:
+            with open(self.path, "rb") as f:  # type: ignore
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, data: bytes) -> None:
+        """Write the checkpoint file, replacing the previous one only once
+        the new one is complete
+
+        Args:
+            data (bytes): the checkpoint
+        """
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, self.path)  # type: ignore
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Protocol
+
+    StreamValue = OrderedDict[bytes, bytes]
+else:
+    # the clients are only checked statically
+    Protocol = object
+    StreamValue = OrderedDict
+
+StreamRecord = Tuple[bytes, bytes, StreamValue]
+Entry = Tuple[bytes, StreamValue]
+Key = Union[str, bytes]
+
+
+class RedisPipeline(Protocol):
+    """Pipeline of the commands sent by the writers and the consumer groups
+    """
+    def xadd(
+        self,
+        stream: Key,
+        fields: Mapping[Any, Any],
+        message_id: Key = b"*",
+        max_len: Optional[int] = None,
+        exact_len: bool = False,
+    ) -> Awaitable[bytes]:
+        """Queue a XADD
+
+        Args:
+            stream (Key): the stream name
+            fields (Mapping[Any, Any]): the fields-values of the entry
+            message_id (Key, optional): the id. Defaults to b"*" (generated).
+            max_len (Optional[int], optional): trim the stream to `max_len`
+                entries. Defaults to None (no trim).
+            exact_len (bool, optional): trim the stream exactly.
+                Defaults to False.
+
+        Returns:
+            Awaitable[bytes]: the id of the entry, once executed
+        """
+        ...
+
+    def xack(self, stream: Key, group_name: Key, id: Key, *ids: Key) -> Awaitable[int]:
+        """Queue a XACK
+
+        Args:
+            stream (Key): the stream name
+            group_name (Key): the consumer group
+            id (Key): the id of an entry
+            *ids (Key): the ids of further entries
+
+        Returns:
+            Awaitable[int]: the number of acknowledged entries, once executed
+        """
+        ...
+
+    async def execute(self) -> List[Any]:
+        """Send the queued commands
+
+        Returns:
+            List[Any]: the results of the commands
+        """
+        ...
+
+
+class RedisClient(Protocol):
+    """Client of the redis commands used by streams, nodes and writers.
+    Both the aioredis clients of a RedisPool and the MemoryRedis clients
+    of a MemoryPool implement it.
+    """
+    @property
+    def closed(self) -> bool:
+        """If the client is closed
+
+        Returns:
+            bool: True once the client is closed
+        """
+        ...
+
+    def close(self) -> None:
+        """Close the client
+        """
+        ...
+
+    async def wait_closed(self) -> None:
+        """Wait for the client to be closed
+        """
+        ...
+
+    def pipeline(self) -> RedisPipeline:
+        """Start a pipeline of commands
+
+        Returns:
+            RedisPipeline: the pipeline
+        """
+        ...
+
+    async def get(self, key: Key) -> Optional[bytes]:
+        """GET: the value of a key
+
+        Args:
+            key (Key): the key
+
+        Returns:
+            Optional[bytes]: the value, None if the key does not exist
+        """
+        ...
+
+    async def set(self, key: Key, value: Union[bytes, str, int, float]) -> bool:
+        """SET: set the value of a key
+
+        Args:
+            key (Key): the key
+            value (Union[bytes, str, int, float]): the value
+
+        Returns:
+            bool: True
+        """
+        ...
+
+    async def xadd(
+        self,
+        stream: Key,
+        fields: Mapping[Any, Any],
+        message_id: Key = b"*",
+        max_len: Optional[int] = None,
+        exact_len: bool = False,
+    ) -> bytes:
+        """XADD: append an entry to a stream
+
+        Args:
+            stream (Key): the stream name
+            fields (Mapping[Any, Any]): the fields-values of the entry
+            message_id (Key, optional): the id. Defaults to b"*" (generated).
+            max_len (Optional[int], optional): trim the stream to `max_len`
+                entries. Defaults to None (no trim).
+            exact_len (bool, optional): trim the stream exactly.
+                Defaults to False.
+
+        Returns:
+            bytes: the id of the entry
+        """
+        ...
+
+    async def xrange(
+        self,
+        stream: Key,
+        start: Key = "-",
+        stop: Key = "+",
+        count: Optional[int] = None,
+    ) -> List[Entry]:
+        """XRANGE: the entries between two positions
+
+        Args:
+            stream (Key): the stream name
+            start (Key, optional): the first position. Defaults to "-".
+            stop (Key, optional): the last position. Defaults to "+".
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+
+        Returns:
+            List[Entry]: the ids and the fields-values of the entries
+        """
+        ...
+
+    async def xrevrange(
+        self,
+        stream: Key,
+        start: Key = "+",
+        stop: Key = "-",
+        count: Optional[int] = None,
+    ) -> List[Entry]:
+        """XREVRANGE: the entries between two positions, backwards
+
+        Args:
+            stream (Key): the stream name
+            start (Key, optional): the last position. Defaults to "+".
+            stop (Key, optional): the first position. Defaults to "-".
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+
+        Returns:
+            List[Entry]: the ids and the fields-values of the entries
+        """
+        ...
+
+    async def xread(
+        self,
+        streams: Sequence[Key],
+        timeout: Optional[int] = 0,
+        count: Optional[int] = None,
+        latest_ids: Optional[Sequence[Key]] = None,
+    ) -> List[StreamRecord]:
+        """XREAD: the entries following the given ids
+
+        Args:
+            streams (Sequence[Key]): the stream names
+            timeout (Optional[int], optional): how long (in milliseconds)
+                the read waits for new entries, 0 waits forever, None does
+                not wait. Defaults to 0.
+            count (Optional[int], optional): maximum number of entries of
+                each stream. Defaults to None.
+            latest_ids (Optional[Sequence[Key]], optional): the ids of the
+                streams. Defaults to None (the entries added after the call).
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        ...
+
+    async def xread_group(
+        self,
+        group_name: Key,
+        consumer_name: Key,
+        streams: Sequence[Key],
+        timeout: Optional[int] = 0,
+        count: Optional[int] = None,
+        latest_ids: Optional[Sequence[Key]] = None,
+        no_ack: bool = False,
+    ) -> List[StreamRecord]:
+        """XREADGROUP: the entries of the streams for a consumer of a group
+
+        Args:
+            group_name (Key): the consumer group
+            consumer_name (Key): the consumer
+            streams (Sequence[Key]): the stream names
+            timeout (Optional[int], optional): how long (in milliseconds)
+                the read waits for new entries, 0 waits forever, None does
+                not wait. Defaults to 0.
+            count (Optional[int], optional): maximum number of entries of
+                each stream. Defaults to None.
+            latest_ids (Optional[Sequence[Key]], optional): ">" for the new
+                entries, or the id after which the pending entries of the
+                consumer are read. Defaults to None.
+            no_ack (bool, optional): do not add the entries to the pending
+                ones. Defaults to False.
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        ...
+
+    async def xack(self, stream: Key, group_name: Key, id: Key, *ids: Key) -> int:
+        """XACK: acknowledge entries of a group
+
+        Args:
+            stream (Key): the stream name
+            group_name (Key): the consumer group
+            id (Key): the id of an entry
+            *ids (Key): the ids of further entries
+
+        Returns:
+            int: the number of acknowledged entries
+        """
+        ...
+
+    async def xgroup_create(
+        self,
+        stream: Key,
+        group_name: Key,
+        latest_id: Key = "$",
+        mkstream: bool = False,
+    ) -> bool:
+        """XGROUP CREATE: create a consumer group
+
+        Args:
+            stream (Key): the stream name
+            group_name (Key): the consumer group
+            latest_id (Key, optional): the id of the last entry delivered to
+                the group. Defaults to "$" (the last entry of the stream).
+            mkstream (bool, optional): create the stream if it does not
+                exist. Defaults to False.
+
+        Returns:
+            bool: True
+        """
+        ...
+
+    async def xpending(
+        self,
+        stream: Key,
+        group_name: Key,
+        start: Optional[Key] = None,
+        stop: Optional[Key] = None,
+        count: Optional[int] = None,
+        consumer: Optional[Key] = None,
+    ) -> List[Any]:
+        """XPENDING: the summary of the pending entries of a group, or
+        their details between two ids
+
+        Args:
+            stream (Key): the stream name
+            group_name (Key): the consumer group
+            start (Optional[Key], optional): the first id. Defaults to None
+                (the summary).
+            stop (Optional[Key], optional): the last id. Defaults to None.
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+            consumer (Optional[Key], optional): only the entries of this
+                consumer. Defaults to None.
+
+        Returns:
+            List[Any]: the summary, or the id, consumer, idle time and
+                number of deliveries of the entries
+        """
+        ...
+
+    async def xclaim(
+        self,
+        stream: Key,
+        group_name: Key,
+        consumer_name: Key,
+        min_idle_time: int,
+        id: Key,
+        *ids: Key,
+    ) -> List[Entry]:
+        """XCLAIM: take the ownership of pending entries
+
+        Args:
+            stream (Key): the stream name
+            group_name (Key): the consumer group
+            consumer_name (Key): the new owner
+            min_idle_time (int): claim only the entries idle for at least
+                this time (in milliseconds)
+            id (Key): the id of an entry
+            *ids (Key): the ids of further entries
+
+        Returns:
+            List[Entry]: the claimed entries
+        """
+        ...
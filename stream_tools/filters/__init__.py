@@ -1,3 +1,5 @@
+from .exponential_smoothing import ExponentialSmoothing
 from .moving_average import MovingAverage
+from .rls import RLSFilter
 
-__all__ = ["MovingAverage"]
+__all__ = ["ExponentialSmoothing", "MovingAverage", "RLSFilter"]
@@ -0,0 +1,493 @@
+from __future__ import annotations
+
+import time
+
+from collections import OrderedDict
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+from math import exp
+from math import log
+from math import nan
+
+import numpy as np  # type: ignore
+
+from ..metrics import MetricsRegistry
+from ..stream import Stream
+from ..utils.channel import Channel
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel[StreamRecord]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel
+
+
+SMOOTHING = ["alpha", "half_life", "time_half_life"]
+
+# maximum decay (in log scale) accumulated inside a vectorized chunk, so
+# that the rescaled values never overflow
+CHUNK_DECAY = 50.0
+# maximum decay (in log scale) between two values: older values weigh less
+# than 1e-43 times the new one, so they are already negligible
+MAX_DECAY = 100.0
+
+
+class DecayingAverage:
+    """Exponentially weighted average of the values of a field.
+    The weight of every value decays by a constant factor at each new
+    value, or halves every `half_life` milliseconds of event time (the
+    timestamp of the redis id), so irregular ticks are weighted by their
+    age. Only the decayed sum of the values and of their weights are
+    stored, so the memory is O(1).
+    """
+    __slots__ = ("log_decay", "time_decay", "total", "weight", "last")
+
+    def __init__(
+        self, log_decay: float = 0.0, time_decay: Optional[float] = None
+    ) -> None:
+        """Initialize the average with no values
+
+        Args:
+            log_decay (float, optional): log of the decay factor applied at
+                each new value. Defaults to 0.0.
+            time_decay (Optional[float], optional): log of the decay factor
+                applied for each millisecond of event time. Defaults to None
+                (the decay does not depend on time).
+        """
+        self.log_decay = log_decay
+        self.time_decay = time_decay
+        self.total = 0.0
+        self.weight = 0.0
+        self.last: Optional[int] = None
+
+    def _log_decay(self, timestamp: int) -> float:
+        """The decay (in log scale) from the last value to a new value
+
+        Args:
+            timestamp (int): the event time of the new value in milliseconds
+
+        Returns:
+            float: the log of the decay factor
+        """
+        if self.time_decay is None:
+            return self.log_decay
+        last = self.last
+        if last is None or timestamp <= last:
+            if last is None:
+                self.last = timestamp
+            return 0.0
+        self.last = timestamp
+        return max(self.time_decay * (timestamp - last), -MAX_DECAY)
+
+    def push(self, value: float, timestamp: int) -> None:
+        """Add a new value. NaN values are skipped.
+
+        Args:
+            value (float): the new value
+            timestamp (int): the event time of the value in milliseconds
+        """
+        if value != value:
+            return
+        decay = exp(self._log_decay(timestamp))
+        self.total = self.total * decay + value
+        self.weight = self.weight * decay + 1.0
+
+    def extend(self, new: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+        """Add several values and return the average after each of them,
+        computed with rescaled cumulative sums
+
+        Args:
+            new (np.ndarray): the new values, oldest first (NaN values are
+                skipped)
+            timestamps (np.ndarray): the event times of the new values in
+                milliseconds
+
+        Returns:
+            np.ndarray: the averages after 0, 1, ..., len(new) values have
+                been added (NaN when there are no values yet)
+        """
+        n = len(new)
+        valid = ~np.isnan(new)
+        values = new[valid]
+        if self.time_decay is None:
+            log_decays = np.full(len(values), self.log_decay)
+        else:
+            times = timestamps[valid].astype(np.float64)
+            if len(times):
+                last = times[0] if self.last is None else float(self.last)
+                # out of order timestamps do not decay the average
+                latest = np.maximum.accumulate(np.concatenate(([last], times)))
+                elapsed = np.diff(latest)
+                self.last = int(latest[-1])
+                log_decays = np.maximum(self.time_decay * elapsed, -MAX_DECAY)
+            else:
+                log_decays = times
+
+        totals = np.empty(len(values) + 1)
+        weights = np.empty(len(values) + 1)
+        totals[0] = self.total
+        weights[0] = self.weight
+        decays = np.cumsum(log_decays)
+        start = 0
+        while start < len(values):
+            # inside a chunk the values are rescaled to the decay of the
+            # chunk start, which is bounded by CHUNK_DECAY
+            base = decays[start - 1] if start else 0.0
+            end = int(
+                np.searchsorted(-decays, -(base - CHUNK_DECAY), side="right")
+            )
+            end = min(max(end, start + 1), len(values))
+            chunk = decays[start:end] - base
+            scale = np.exp(-chunk)
+            rescale = np.exp(chunk)
+            totals[start + 1:end + 1] = rescale * (
+                totals[start] + np.cumsum(values[start:end] * scale)
+            )
+            weights[start + 1:end + 1] = rescale * (
+                weights[start] + np.cumsum(scale)
+            )
+            start = end
+
+        self.total = float(totals[-1])
+        self.weight = float(weights[-1])
+
+        # average after each of the values, valid or not
+        positions = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(valid, out=positions[1:])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(weights > 0, totals / weights, nan)
+        return means[positions]
+
+    def mean(self) -> float:
+        """The weighted average of the values
+
+        Returns:
+            float: the average, or NaN if there are no values
+        """
+        if self.weight > 0:
+            return self.total / self.weight
+        return nan
+
+
+def _timestamp(idx: bytes) -> int:
+    """The millisecond timestamp of a redis id
+
+    Args:
+        idx (bytes): the redis id
+
+    Returns:
+        int: the timestamp in milliseconds
+    """
+    return int(idx.split(b"-", 1)[0])
+
+
+class ExponentialSmoothingState:
+    """State class to manage exponential smoothing data and results
+    """
+    def __init__(self, smoothing: Dict[str, Tuple[str, float]]) -> None:
+        """Initialize the Exponential Smoothing State class
+
+        Args:
+            smoothing (Dict[str, Tuple[str, float]]): the kind of smoothing
+                ("alpha", "half_life" in number of values or
+                "time_half_life" in milliseconds of event time) and its
+                value for each field
+
+        Raises:
+            ValueError: in case of unknown smoothing or wrong value
+        """
+        self.smoothing = smoothing
+        self.state = {
+            field.encode(): self._average(kind, value)
+            for field, (kind, value) in self.smoothing.items()
+        }
+        self.timed = any(
+            average.time_decay is not None for average in self.state.values()
+        )
+        self.names: Dict[bytes, bytes] = {}
+
+    @staticmethod
+    def _average(kind: str, value: float) -> DecayingAverage:
+        """Create the average of a field
+
+        Args:
+            kind (str): the kind of smoothing
+            value (float): the smoothing factor or the half-life
+
+        Raises:
+            ValueError: in case of unknown smoothing or wrong value
+
+        Returns:
+            DecayingAverage: the average of the field
+        """
+        if kind not in SMOOTHING:
+            raise ValueError(f"Unknown smoothing {kind}.")
+        if kind == "alpha":
+            if not 0 < value <= 1:
+                raise ValueError("Smoothing factor alpha must be in (0, 1].")
+            if value == 1:
+                return DecayingAverage(-MAX_DECAY)
+            return DecayingAverage(max(log(1 - value), -MAX_DECAY))
+        if not value > 0:
+            raise ValueError("Half-life must be positive.")
+        if kind == "half_life":
+            return DecayingAverage(max(-log(2) / value, -MAX_DECAY))
+        return DecayingAverage(time_decay=-log(2) / value)
+
+    def _name(self, name: bytes) -> bytes:
+        """The output name for a source stream
+
+        Args:
+            name (bytes): the source stream name
+
+        Returns:
+            bytes: the output name
+        """
+        try:
+            return self.names[name]
+        except KeyError:
+            new_name = f"exponential_smoothing({name.decode()})".encode()
+            self.names[name] = new_name
+            return new_name
+
+    def update(
+        self, new_record: Tuple[bytes, bytes, StreamValue]
+    ) -> Tuple[bytes, bytes, Dict[bytes, float]]:
+        """Update the state of the exponential smoothing with a new record
+
+        Args:
+            new_record (Tuple[bytes, bytes, StreamValue]): the new value to
+                smooth
+
+        Returns:
+            Tuple[bytes, bytes, Dict[bytes, float]]: the exponential
+                smoothing result
+        """
+        name, idx, new_value = new_record
+        timestamp = _timestamp(idx) if self.timed else 0
+        state = self.state
+        for field, value in new_value.items():
+            average = state.get(field)
+            if average is not None:
+                average.push(float(value), timestamp)
+
+        # fields with no valid values yet are left out
+        output = {
+            field: average.total / average.weight
+            for field, average in state.items()
+            if average.weight > 0
+        }
+        for f, v in new_value.items():
+            if f not in state:
+                output[f] = float(v)
+
+        self.new_output = output
+        return self._name(name), idx, output
+
+    def update_many(
+        self, new_records: List[Tuple[bytes, bytes, StreamValue]]
+    ) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Update the state of the exponential smoothing with a batch of
+        records (e.g. a backfill), smoothing each field in one vectorized
+        pass. The result is the same as calling update for each record.
+
+        Args:
+            new_records (List[Tuple[bytes, bytes, StreamValue]]): the new
+                values to smooth, oldest first
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the exponential
+                smoothing result after each of the records
+        """
+        n = len(new_records)
+        if n == 0:
+            return []
+        values = [record[2] for record in new_records]
+        if self.timed:
+            timestamps = np.fromiter(
+                (_timestamp(record[1]) for record in new_records),
+                dtype=np.int64,
+                count=n,
+            )
+
+        means = []
+        for field, average in self.state.items():
+            present = np.fromiter(
+                (field in value for value in values), dtype=bool, count=n
+            )
+            new = np.array(
+                [float(value[field]) for value in values if field in value],
+                dtype=np.float64,
+            )
+            times = timestamps[present] if self.timed else new
+            # mean of the field after each record (the average moves only
+            # with the records containing the field)
+            field_means = average.extend(new, times)[np.cumsum(present)]
+            means.append((field, field_means.tolist()))
+
+        outputs = []
+        state = self.state
+        for i, (name, idx, new_value) in enumerate(new_records):
+            output = {}
+            for field, field_means in means:
+                mean = field_means[i]
+                if mean == mean:
+                    output[field] = mean
+            for f, v in new_value.items():
+                if f not in state:
+                    output[f] = float(v)
+            outputs.append((self._name(name), idx, output))
+
+        self.new_output = outputs[-1][2]
+        return outputs
+
+
+class ExponentialSmoothing:
+    """Exponential Smoothing Filter class. Calculate the exponentially
+        weighted moving average of the provided streams, with a different
+        smoothing for each field in the stream. The memory used for each
+        field does not depend on the smoothing.
+    """
+    def __init__(
+        self,
+        stream: Stream,
+        smoothing: Union[
+            Tuple[str, float],
+            Tuple[str, str, float],
+            List[Union[Tuple[str, float], Tuple[str, str, float]]],
+        ],
+        maxsize: int = 0,
+        overflow: str = "block",
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        """Initialize the exponential smoothing filter and start the reader
+        function
+
+        Args:
+            stream (Stream): the source stream
+            smoothing (Union[Tuple[str, float], Tuple[str, str, float],
+                List[Union[Tuple[str, float], Tuple[str, str, float]]]]):
+                smoothing for each field of the provided source stream,
+                either (field, alpha) or (field, kind, value) where kind is
+                "alpha", "half_life" (in number of values) or
+                "time_half_life" (in milliseconds of the redis id timestamp)
+            maxsize (int, optional): capacity of the internal queue, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). Defaults to "block".
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node. Defaults to None.
+
+        Raises:
+            TypeError: in case of wrong smoothing type
+            ValueError: in case of unknown smoothing or wrong value
+        """
+        self.stream = stream
+
+        if isinstance(smoothing, tuple):
+            smoothing = [smoothing]
+        if not isinstance(smoothing, list) or not all(
+            isinstance(s, tuple) and len(s) in (2, 3) for s in smoothing
+        ):
+            raise TypeError(
+                "ExponentialSmoothing smoothing must be tuple or list of tuples."
+            )
+        self.smoothing = {
+            s[0]: ("alpha", s[1]) if len(s) == 2 else (s[1], s[2])
+            for s in smoothing
+        }
+
+        self.state = ExponentialSmoothingState(self.smoothing)
+
+        self.queue: StreamQueue = Channel(maxsize, overflow)
+        self.pending: Deque[StreamRecord] = deque()
+        self.metrics = None if metrics is None else metrics.register(
+            self.node_name, self.queue, self._queued
+        )
+        self.stream._start(lambda: self.stream._read(self.queue))
+
+    @property
+    def source_name(self) -> str:
+        """The source stream name getter
+
+        Returns:
+            str: the name of the source streams
+        """
+        return self.stream.name
+
+    @property
+    def node_name(self) -> str:
+        """The node name getter
+
+        Returns:
+            str: the node name
+        """
+        args = ", ".join(
+            [f"({k}, {kind}, {v})" for k, (kind, v) in self.smoothing.items()]
+        )
+        node_name = f"exponential_smoothing({self.source_name})[{args}]"
+        return node_name
+
+    def __aiter__(self) -> ExponentialSmoothing:
+        """Get the exponential smoothing iterator
+
+        Returns:
+            ExponentialSmoothing: the exponential smoothing instance
+        """
+        return self
+
+    async def __anext__(self) -> Tuple[bytes, bytes, Dict[bytes, float]]:
+        """Get the next value from the queue and update
+            the state of the Exponential Smoothing
+
+        Returns:
+            Tuple[bytes, bytes, Dict[bytes, float]]: the new state of the
+                Exponential Smoothing (provided by the state class)
+        """
+        if not self.pending:
+            self.pending.extend(await self.queue.get_batch())
+        started = time.perf_counter()
+        res = self.pending.popleft()
+        output = self.state.update(res)
+        self.stream.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, res[1])
+        return output
+
+    async def next_batch(self) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Wait for new values and update the state of the Exponential
+            Smoothing with all of them at once
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the states of the
+                Exponential Smoothing after each of the new values
+        """
+        if self.pending:
+            batch = list(self.pending)
+            self.pending.clear()
+        else:
+            batch = await self.queue.get_batch()
+        started = time.perf_counter()
+        outputs = self.state.update_many(batch)
+        for res in batch:
+            self.stream.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(len(batch), len(outputs), started, batch[0][1])
+        return outputs
+
+    def _queued(self) -> int:
+        """Number of records waiting to be processed
+
+        Returns:
+            int: the number of records
+        """
+        return self.queue.qsize() + len(self.pending)
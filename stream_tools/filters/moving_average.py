@@ -1,25 +1,168 @@
 from __future__ import annotations
 
-import asyncio
+import time
 
+from array import array
 from collections import OrderedDict
+from collections import deque
+from typing import Deque
 from typing import Union
 from typing import Dict
 from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import TYPE_CHECKING
 
+from math import isfinite
+from math import nan
+
 import numpy as np  # type: ignore
 
+from ..checkpoint import Checkpoint
+from ..checkpoint import pack_bytes
+from ..checkpoint import unpack_bytes
+from ..metrics import MetricsRegistry
 from ..stream import Stream
+from ..utils.channel import Channel
 
 if TYPE_CHECKING:
     StreamValue = OrderedDict[bytes, bytes]
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue[StreamRecord]
+    StreamQueue = Channel[StreamRecord]
 else:
     StreamValue = OrderedDict
-    StreamQueue = asyncio.Queue
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel
+
+
+class RingWindow:
+    """Window of the last values of a field. The values are stored in a
+    preallocated circular buffer, together with their running sum and the
+    number of valid (not NaN) values, so each update costs O(1).
+    """
+    __slots__ = (
+        "size", "buffer", "values", "position", "total", "valid", "updates", "period"
+    )
+
+    def __init__(self, size: int) -> None:
+        """Initialize the window filled with NaN values
+
+        Args:
+            size (int): the number of values in the window
+        """
+        self.size = int(size)
+        self.buffer = array("d", [nan]) * self.size
+        self.values = np.frombuffer(self.buffer, dtype=np.float64)
+        self.position = 0
+        self.total = 0.0
+        self.valid = 0
+        self.updates = 0
+        self.period = max(self.size, 1024)
+
+    def push(self, value: float) -> None:
+        """Add a new value to the window, replacing the oldest one
+
+        Args:
+            value (float): the new value
+        """
+        position = self.position
+        old = self.buffer[position]
+        self.buffer[position] = value
+        position += 1
+        self.position = position if position < self.size else 0
+
+        if old == old:  # not NaN
+            self.total -= old
+            self.valid -= 1
+        if value == value:
+            self.total += value
+            self.valid += 1
+
+        # the running sum is periodically recomputed to bound the
+        # rounding error, or when it can not be updated (inf values)
+        self.updates += 1
+        if self.updates >= self.period or not isfinite(self.total):
+            self.resum()
+
+    def resum(self) -> None:
+        """Recompute the running sum and the number of valid values
+        """
+        valid = ~np.isnan(self.values)
+        self.total = float(self.values.sum(where=valid))
+        self.valid = int(valid.sum())
+        self.updates = 0
+
+    def mean(self) -> float:
+        """The mean of the valid values of the window
+
+        Returns:
+            float: the mean, or NaN if there are no valid values
+        """
+        if self.valid:
+            return self.total / self.valid
+        return nan
+
+    def extend(self, new: np.ndarray) -> np.ndarray:
+        """Add several values to the window and return the mean of the
+        window after each of them, computed with cumulative sums
+
+        Args:
+            new (np.ndarray): the new values, oldest first
+
+        Returns:
+            np.ndarray: the means after 0, 1, ..., len(new) values have been
+                added (NaN when there are no valid values in the window)
+        """
+        size = self.size
+        n = len(new)
+        # values leaving the window after k pushes are the oldest k values
+        # of the window followed by the new values
+        oldest = self.values[(self.position + np.arange(min(n, size))) % size]
+        removed = np.concatenate((oldest, new[:max(n - size, 0)]))
+
+        new_valid = ~np.isnan(new)
+        removed_valid = ~np.isnan(removed)
+        if not (
+            isfinite(self.total)
+            and np.isfinite(new[new_valid]).all()
+            and np.isfinite(removed[removed_valid]).all()
+        ):
+            means = [self.mean()]
+            for value in new.tolist():
+                self.push(value)
+                means.append(self.mean())
+            return np.array(means)
+
+        # values are centered to limit the rounding error of the sums
+        offset = float(new[new_valid][0]) if new_valid.any() else 0.0
+        added = np.cumsum(np.where(new_valid, new - offset, 0.0))
+        dropped = np.cumsum(np.where(removed_valid, removed - offset, 0.0))
+        added_count = np.cumsum(new_valid)
+        dropped_count = np.cumsum(removed_valid)
+
+        totals = np.empty(n + 1)
+        counts = np.empty(n + 1, dtype=np.int64)
+        totals[0] = self.total
+        counts[0] = self.valid
+        counts[1:] = self.valid + added_count - dropped_count
+        totals[1:] = (
+            self.total + added - dropped
+            + offset * (added_count - dropped_count)
+        )
+
+        # store the last values in the circular buffer
+        kept = min(n, size)
+        start = (self.position + n - kept) % size
+        self.values[(start + np.arange(kept)) % size] = new[n - kept:]
+        self.position = (self.position + n) % size
+        self.total = float(totals[-1])
+        self.valid = int(counts[-1])
+        self.updates += n
+        if self.updates >= self.period:
+            self.resum()
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, nan)
 
 
 class MovingAverageState:
@@ -34,9 +177,10 @@ class MovingAverageState:
         """
         self.windows = windows
         self.state = {
-            field.encode(): np.array([np.nan] * window)
+            field.encode(): RingWindow(window)
             for field, window in self.windows.items()
         }
+        self.names: Dict[bytes, bytes] = {}
 
     def _update(self, new_value: StreamValue) -> Dict[bytes, float]:
         """Calculate the moving average with the new values, store new_values
@@ -50,23 +194,22 @@ class MovingAverageState:
             Dict[bytes, float]: the result of the moving average for each
                 of the fields of the new value provided
         """
+        state = self.state
         for field, value in new_value.items():
-            try:
-                self.state[field][:-1] = self.state[field][1:]
-                self.state[field][-1:] = float(value)
-            except KeyError:
-                pass
-
-        output = {field: np.nanmean(values) for field, values in self.state.items()}
-
-        # remove nan values
-        for f in list(output):
-            if np.isnan(output[f]):
-                del output[f]
+            window = state.get(field)
+            if window is not None:
+                window.push(float(value))
+
+        # fields with no valid values in the window are left out
+        output = {
+            field: window.total / window.valid
+            for field, window in state.items()
+            if window.valid
+        }
 
         # append value of fields not in window
         for f, v in new_value.items():
-            if f not in self.state.keys():
+            if f not in state:
                 output[f] = float(v)
 
         return output
@@ -87,10 +230,110 @@ class MovingAverageState:
                 each field the result of the moving average)
         """
         name, idx, new_value = new_record
-        new_name = f"moving_average({name.decode()})".encode()
+        try:
+            new_name = self.names[name]
+        except KeyError:
+            new_name = f"moving_average({name.decode()})".encode()
+            self.names[name] = new_name
         self.new_output = self._update(new_value)
         return new_name, idx, self.new_output
 
+    def update_many(
+        self, new_records: List[Tuple[bytes, bytes, StreamValue]]
+    ) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Update the state of the moving average with a batch of records,
+        computing the moving averages of each field in one vectorized pass.
+        The result is the same as calling update for each record.
+
+        Args:
+            new_records (List[Tuple[bytes, bytes, StreamValue]]): the new
+                values to calculate the moving average, oldest first
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the moving
+                average result after each of the records
+        """
+        n = len(new_records)
+        if n == 0:
+            return []
+        values = [record[2] for record in new_records]
+
+        means = []
+        for field, window in self.state.items():
+            present = np.fromiter(
+                (field in value for value in values), dtype=bool, count=n
+            )
+            new = np.array(
+                [float(value[field]) for value in values if field in value],
+                dtype=np.float64,
+            )
+            # mean of the field after each record (the window moves only
+            # with the records containing the field)
+            field_means = window.extend(new)[np.cumsum(present)]
+            means.append((field, field_means.tolist()))
+
+        outputs = []
+        state = self.state
+        for i, (name, idx, new_value) in enumerate(new_records):
+            try:
+                new_name = self.names[name]
+            except KeyError:
+                new_name = f"moving_average({name.decode()})".encode()
+                self.names[name] = new_name
+
+            output = {}
+            for field, field_means in means:
+                mean = field_means[i]
+                if mean == mean:
+                    output[field] = mean
+            for f, v in new_value.items():
+                if f not in state:
+                    output[f] = float(v)
+            outputs.append((new_name, idx, output))
+
+        self.new_output = outputs[-1][2]
+        return outputs
+
+    def dump(self) -> Dict[str, np.ndarray]:
+        """Copy the windows of the moving average for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the raw buffers and the positions of the
+                windows
+        """
+        fields, offsets = pack_bytes(list(self.state))
+        arrays = {
+            "fields": fields,
+            "field_offsets": offsets,
+            "positions": np.array(
+                [window.position for window in self.state.values()], dtype=np.int64
+            ),
+        }
+        for i, window in enumerate(self.state.values()):
+            arrays[f"window_{i}"] = window.values.copy()
+        return arrays
+
+    def load(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the windows of the moving average from a checkpoint
+
+        Args:
+            arrays (Dict[str, np.ndarray]): the arrays of the checkpoint
+
+        Raises:
+            ValueError: in case the checkpoint has different windows
+        """
+        fields = unpack_bytes(arrays["fields"], arrays["field_offsets"])
+        windows = list(self.state.values())
+        if fields != list(self.state) or any(
+            len(arrays[f"window_{i}"]) != window.size
+            for i, window in enumerate(windows)
+        ):
+            raise ValueError("Checkpoint not compatible with the windows.")
+        for i, window in enumerate(windows):
+            window.values[:] = arrays[f"window_{i}"]
+            window.position = int(arrays["positions"][i])
+            window.resum()
+
 
 class MovingAverage:
     """Moving Average Filter class. Calculate the moving average of the
@@ -98,7 +341,13 @@ class MovingAverage:
         with different time windows for each fields in the stream.
     """
     def __init__(
-        self, stream: Stream, window: Union[Tuple[str, int], List[Tuple[str, int]]]
+        self,
+        stream: Stream,
+        window: Union[Tuple[str, int], List[Tuple[str, int]]],
+        maxsize: int = 0,
+        overflow: str = "block",
+        checkpoint: Optional[Checkpoint] = None,
+        metrics: Optional[MetricsRegistry] = None,
     ) -> None:
         """Initialize the moving average filter and start the reader function
 
@@ -107,6 +356,15 @@ class MovingAverage:
             window (Union[Tuple[str, int], List[Tuple[str, int]]]): moving
                 average window for each field of the provieded source
                 stream
+            maxsize (int, optional): capacity of the internal queue, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). Defaults to "block".
+            checkpoint (Optional[Checkpoint], optional): save the windows
+                periodically, and restore them at start, reading right after
+                the last record applied to them. Defaults to None.
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node. Defaults to None.
 
         Raises:
             TypeError: in case of wrong window type
@@ -121,9 +379,20 @@ class MovingAverage:
             raise TypeError("MovingAverage window must be tuple or list of tuples.")
 
         self.state = MovingAverageState(self.windows)
-
-        self.queue: StreamQueue = asyncio.Queue()
-        asyncio.ensure_future(self.stream._read(self.queue))
+        self.checkpoint = checkpoint
+        # redis id of the last record applied to the state
+        self.last_id: Optional[bytes] = None
+
+        self.queue: StreamQueue = Channel(maxsize, overflow)
+        self.pending: Deque[StreamRecord] = deque()
+        self.metrics = None if metrics is None else metrics.register(
+            self.node_name, self.queue, self._queued
+        )
+        if checkpoint is None:
+            self.stream._start(lambda: self.stream._read(self.queue))
+        else:
+            self.stream.checkpoints.append(checkpoint)
+            self.stream._start(self._resume)
 
     @property
     def source_name(self) -> str:
@@ -161,5 +430,68 @@ class MovingAverage:
             Tuple[bytes, bytes, Dict[bytes, float]]: the new state of the
                 Moving Average (provided by the Moving Average State class)
         """
-        res = await self.queue.get()
-        return self.state.update(res)
+        if not self.pending:
+            self.pending.extend(await self.queue.get_batch())
+        started = time.perf_counter()
+        res = self.pending.popleft()
+        output = self.state.update(res)
+        self.last_id = res[1]
+        self.stream.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, res[1])
+        return output
+
+    async def next_batch(self) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Wait for new values and update the state of the Moving Average
+            with all of them at once
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the states of the
+                Moving Average after each of the new values
+        """
+        if self.pending:
+            batch = list(self.pending)
+            self.pending.clear()
+        else:
+            batch = await self.queue.get_batch()
+        started = time.perf_counter()
+        outputs = self.state.update_many(batch)
+        self.last_id = batch[-1][1]
+        for res in batch:
+            self.stream.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(len(batch), len(outputs), started, batch[0][1])
+        return outputs
+
+    def _queued(self) -> int:
+        """Number of records waiting to be processed
+
+        Returns:
+            int: the number of records
+        """
+        return self.queue.qsize() + len(self.pending)
+
+    async def _resume(self) -> None:
+        """Restore the state from the checkpoint, if any, start saving the
+            checkpoints and read the stream right after the last record of
+            the checkpoint
+        """
+        checkpoint: Checkpoint = self.checkpoint  # type: ignore
+        arrays = await checkpoint.load(self.stream.client)
+        if arrays is not None:
+            self.state.load(arrays)
+            self.last_id = arrays["last_id"].tobytes() or None
+            if self.last_id is not None:
+                self.stream.last_id = self.last_id
+        checkpoint.start(self.stream.client, self._capture)
+        await self.stream._read(self.queue)
+
+    def _capture(self) -> Dict[str, np.ndarray]:
+        """Copy the state and the id of its last record for a checkpoint
+
+        Returns:
+            Dict[str, np.ndarray]: the arrays of the checkpoint
+        """
+        arrays = self.state.dump()
+        arrays["last_id"] = np.frombuffer(self.last_id or b"", dtype=np.uint8)
+        return arrays
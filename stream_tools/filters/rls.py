@@ -0,0 +1,487 @@
+from __future__ import annotations
+
+import time
+
+from collections import OrderedDict
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+import numpy as np  # type: ignore
+
+from ..metrics import MetricsRegistry
+from ..stream import Stream
+from ..tools.join import Join
+from ..utils.channel import Channel
+from ..utils.ids import id_key
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel[StreamRecord]
+    State = Dict[bytes, Tuple[bytes, OrderedDict[bytes, bytes]]]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+    StreamQueue = Channel
+    State = Dict[bytes, Tuple[bytes, OrderedDict]]
+
+# a field of a stream record, or a (stream name, field) of a joined state
+Field = Union[str, Tuple[str, str]]
+# source name, redis id and the feature values followed by the target
+# (None when some of them are missing)
+Row = Tuple[bytes, bytes, Optional[List[float]]]
+
+
+class RLSState:
+    """State class of the recursive least squares filter. The coefficients
+    of the linear model and the inverse covariance matrix are stored in
+    preallocated numpy arrays, which are updated in place for every new
+    observation, so an update allocates no new matrices.
+    """
+    def __init__(
+        self,
+        features: List[Field],
+        target: Field,
+        forgetting: float = 1.0,
+        delta: float = 100.0,
+        intercept: bool = True,
+    ) -> None:
+        """Initialize the RLS State class
+
+        Args:
+            features (List[Field]): the fields used as features, either
+                field names of a stream record or (stream name, field name)
+                of a joined state
+            target (Field): the field to predict
+            forgetting (float, optional): forgetting factor in (0, 1], the
+                weight of an observation decays by this factor for each
+                new observation. Defaults to 1.0 (no forgetting).
+            delta (float, optional): initial value of the diagonal of the
+                inverse covariance matrix, the bigger the faster the first
+                observations move the coefficients. Defaults to 100.0.
+            intercept (bool, optional): whether to fit an intercept.
+                Defaults to True.
+
+        Raises:
+            ValueError: in case of wrong forgetting factor or delta
+        """
+        if not 0 < forgetting <= 1:
+            raise ValueError("Forgetting factor must be in (0, 1].")
+        if not delta > 0:
+            raise ValueError("Delta must be positive.")
+
+        self.features = list(features)
+        self.target = target
+        self.forgetting = float(forgetting)
+        self.delta = float(delta)
+        self.intercept = bool(intercept)
+
+        self.keys = [self._key(field) for field in self.features + [target]]
+        self.streams = sorted({k[0] for k in self.keys if k[0] is not None})
+        self.coefficient_names = [b"intercept"] if self.intercept else []
+        self.coefficient_names.extend(
+            field.encode() if isinstance(field, str) else ":".join(field).encode()
+            for field in self.features
+        )
+        self.names: Dict[bytes, bytes] = {}
+
+        size = len(self.coefficient_names)
+        self.offset = int(self.intercept)
+        self.weights = np.zeros(size)
+        self.inverse = np.eye(size) * self.delta
+        # buffers of the update
+        self.x = np.ones(size)
+        self.projection = np.empty(size)
+        self.gain = np.empty(size)
+        self.correction = np.empty((size, size))
+
+    @staticmethod
+    def _key(field: Field) -> Tuple[Optional[bytes], bytes]:
+        """The stream name (None for a stream record) and the field name
+
+        Args:
+            field (Field): the field
+
+        Raises:
+            TypeError: in case of wrong field type
+
+        Returns:
+            Tuple[Optional[bytes], bytes]: stream and field names
+        """
+        if isinstance(field, str):
+            return None, field.encode()
+        if isinstance(field, tuple) and len(field) == 2:
+            return field[0].encode(), field[1].encode()
+        raise TypeError("RLS fields must be str or (stream, field) tuples.")
+
+    def _name(self, name: bytes) -> bytes:
+        """The output name for a source
+
+        Args:
+            name (bytes): the source name
+
+        Returns:
+            bytes: the output name
+        """
+        try:
+            return self.names[name]
+        except KeyError:
+            new_name = f"rls({name.decode()})".encode()
+            self.names[name] = new_name
+            return new_name
+
+    def row(self, source: Union[StreamRecord, State]) -> Row:
+        """Get the feature and target values from a stream record or from
+        a joined state
+
+        Args:
+            source (Union[StreamRecord, State]): a stream record or the
+                state of a join
+
+        Returns:
+            Row: source name, redis id and values (None if some of them
+                are missing)
+        """
+        values: Optional[List[float]]
+        if isinstance(source, tuple):
+            name, idx, record = source
+            try:
+                values = [float(record[field]) for _, field in self.keys]
+            except KeyError:
+                values = None
+            return name, idx, values
+
+        name = ",".join(s.decode() for s in self.streams).encode()
+        try:
+            # the fields of a joined state always have a stream name
+            values = [
+                float(source[s][1][field]) for s, field in self.keys  # type: ignore
+            ]
+        except KeyError:
+            values = None
+        # id of the latest record used by the row
+        ids = [source[s][0] for s in self.streams if s in source]
+        idx = max(ids, key=id_key) if ids else b""
+        return name, idx, values
+
+    def _step(self, x: np.ndarray, y: float) -> Tuple[float, float]:
+        """Update the coefficients and the inverse covariance matrix with
+        a new observation
+
+        Args:
+            x (np.ndarray): the features (with the intercept)
+            y (float): the target
+
+        Returns:
+            Tuple[float, float]: the prediction before the update and its
+                error
+        """
+        inverse = self.inverse
+        projection = self.projection
+        gain = self.gain
+
+        prediction = float(np.dot(self.weights, x))
+        error = y - prediction
+
+        np.dot(inverse, x, out=projection)
+        np.divide(
+            projection, self.forgetting + float(np.dot(x, projection)), out=gain
+        )
+        np.outer(gain, projection, out=self.correction)
+        inverse -= self.correction
+        # the matrix is kept symmetric, otherwise the rounding errors grow
+        # by 1 / forgetting at each update
+        np.add(inverse, inverse.T, out=self.correction)
+        np.multiply(self.correction, 0.5 / self.forgetting, out=inverse)
+        gain *= error
+        self.weights += gain
+        return prediction, error
+
+    def _output(
+        self, weights: List[float], prediction: Optional[Sequence[float]]
+    ) -> Dict[bytes, float]:
+        """Build the output of an update
+
+        Args:
+            weights (List[float]): the coefficients
+            prediction (Optional[Sequence[float]]): the prediction and
+                its error, None if there was no update
+
+        Returns:
+            Dict[bytes, float]: the coefficients followed by prediction and
+                error
+        """
+        output = dict(zip(self.coefficient_names, weights))
+        if prediction is not None:
+            output[b"prediction"], output[b"error"] = prediction
+        return output
+
+    def update_row(self, row: Row) -> Tuple[bytes, bytes, Dict[bytes, float]]:
+        """Update the model with a new row of values
+
+        Args:
+            row (Row): the row
+
+        Returns:
+            Tuple[bytes, bytes, Dict[bytes, float]]: the coefficients after
+                the update, with the prediction and its error
+        """
+        name, idx, values = row
+        prediction = None
+        if values is not None and np.isfinite(values).all():
+            x = self.x
+            x[self.offset:] = values[:-1]
+            prediction = self._step(x, values[-1])
+        self.new_output = self._output(self.weights.tolist(), prediction)
+        return self._name(name), idx, self.new_output
+
+    def update(
+        self, new_record: Union[StreamRecord, State]
+    ) -> Tuple[bytes, bytes, Dict[bytes, float]]:
+        """Update the model with a new stream record or joined state
+
+        Args:
+            new_record (Union[StreamRecord, State]): the new record
+
+        Returns:
+            Tuple[bytes, bytes, Dict[bytes, float]]: the coefficients after
+                the update, with the prediction and its error
+        """
+        return self.update_row(self.row(new_record))
+
+    def update_rows(
+        self, rows: Sequence[Row]
+    ) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Update the model with a batch of rows (e.g. a replay). The
+        values of the whole batch are converted to a single matrix and the
+        coefficients after each row are collected in a preallocated array.
+        The update itself is recursive, so it is still applied row by row,
+        one python call of a few small numpy operations for each row.
+
+        Args:
+            rows (Sequence[Row]): the rows, oldest first
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the coefficients
+                after each of the rows, with the predictions and errors
+        """
+        n = len(rows)
+        if n == 0:
+            return []
+
+        size = len(self.keys)
+        data = np.full((n, size + self.offset), np.nan)
+        if self.intercept:
+            data[:, 0] = 1.0
+        for i, (_, _, values) in enumerate(rows):
+            if values is not None:
+                data[i, self.offset:] = values
+        complete = np.isfinite(data).all(axis=1)
+
+        weights = np.empty((n, len(self.weights)))
+        predictions = np.full((n, 2), np.nan)
+        step = self._step
+        for i in range(n):
+            if complete[i]:
+                predictions[i] = step(data[i, :-1], data[i, -1])
+            weights[i] = self.weights
+
+        outputs = []
+        for i, (weights_i, prediction_i, (name, idx, _)) in enumerate(
+            zip(weights.tolist(), predictions.tolist(), rows)
+        ):
+            output = self._output(weights_i, prediction_i if complete[i] else None)
+            outputs.append((self._name(name), idx, output))
+        self.new_output = outputs[-1][2]
+        return outputs
+
+    def update_many(
+        self, new_records: Sequence[Union[StreamRecord, State]]
+    ) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Update the model with a batch of stream records
+
+        Args:
+            new_records (Sequence[Union[StreamRecord, State]]): the new
+                records, oldest first
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the coefficients
+                after each of the records, with the predictions and errors
+        """
+        return self.update_rows([self.row(record) for record in new_records])
+
+
+class RLSFilter:
+    """Recursive Least Squares Filter class. Fit online a linear model
+        of a target field from some feature fields, read from a stream or
+        from the joined state of several streams.
+    """
+    def __init__(
+        self,
+        source: Union[Stream, Join],
+        features: Union[Field, List[Field]],
+        target: Field,
+        forgetting: float = 1.0,
+        delta: float = 100.0,
+        intercept: bool = True,
+        maxsize: int = 0,
+        overflow: str = "block",
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        """Initialize the RLS filter and start the reader function
+
+        Args:
+            source (Union[Stream, Join]): the source stream, or a join of
+                several streams
+            features (Union[Field, List[Field]]): the feature fields, field
+                names for a stream or (stream name, field name) for a join
+            target (Field): the target field
+            forgetting (float, optional): forgetting factor in (0, 1].
+                Defaults to 1.0 (no forgetting).
+            delta (float, optional): initial value of the diagonal of the
+                inverse covariance matrix. Defaults to 100.0.
+            intercept (bool, optional): whether to fit an intercept.
+                Defaults to True.
+            maxsize (int, optional): capacity of the internal queue for a
+                stream source, 0 means unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). Defaults to "block".
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node (the records waiting in a
+                join are counted by the join). Defaults to None.
+
+        Raises:
+            TypeError: in case of wrong source or fields type
+            ValueError: in case of wrong forgetting factor or delta, or of a
+                join emitting deltas
+        """
+        if not isinstance(source, (Stream, Join)):
+            raise TypeError("RLSFilter source must be a Stream or a Join.")
+        self.source = source
+
+        if not isinstance(features, list):
+            features = [features]
+        self.state = RLSState(features, target, forgetting, delta, intercept)
+        if isinstance(source, Stream) and self.state.streams:
+            raise TypeError("RLSFilter fields of a Stream must be str.")
+        if isinstance(source, Join) and any(
+            k[0] is None for k in self.state.keys
+        ):
+            raise TypeError("RLSFilter fields of a Join must be (stream, field).")
+        if isinstance(source, Join) and source.emit == "delta":
+            raise ValueError("RLSFilter needs the whole state of a Join.")
+
+        if isinstance(source, Stream):
+            self.queue: StreamQueue = Channel(maxsize, overflow)
+            self.pending: Deque[StreamRecord] = deque()
+            source._start(lambda: source._read(self.queue))
+
+        if metrics is None:
+            self.metrics = None
+        elif isinstance(source, Stream):
+            self.metrics = metrics.register(self.node_name, self.queue, self._queued)
+        else:
+            self.metrics = metrics.register(self.node_name)
+
+    @property
+    def source_name(self) -> str:
+        """The source name getter
+
+        Returns:
+            str: the name of the source stream, or of the joined streams
+        """
+        if isinstance(self.source, Stream):
+            return self.source.name
+        return ",".join(s.decode() for s in self.state.streams)
+
+    @property
+    def node_name(self) -> str:
+        """The node name getter
+
+        Returns:
+            str: the node name
+        """
+        features = ", ".join(n.decode() for n in self.state.coefficient_names)
+        node_name = (
+            f"rls({self.source_name})"
+            f"[({features}) -> {self.state.target}, {self.state.forgetting}]"
+        )
+        return node_name
+
+    def __aiter__(self) -> RLSFilter:
+        """Get the RLS filter iterator
+
+        Returns:
+            RLSFilter: the RLS filter instance
+        """
+        return self
+
+    async def __anext__(self) -> Tuple[bytes, bytes, Dict[bytes, float]]:
+        """Get the next value from the source and update the model
+
+        Returns:
+            Tuple[bytes, bytes, Dict[bytes, float]]: the coefficients of
+                the model after the update, with the prediction and error
+        """
+        if isinstance(self.source, Join):
+            # the join does not emit deltas (see __init__)
+            state: State = await self.source.__anext__()  # type: ignore
+            started = time.perf_counter()
+            output = self.state.update(state)
+        else:
+            if not self.pending:
+                self.pending.extend(await self.queue.get_batch())
+            started = time.perf_counter()
+            res = self.pending.popleft()
+            output = self.state.update(res)
+            self.source.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, output[1])
+        return output
+
+    async def next_batch(self) -> List[Tuple[bytes, bytes, Dict[bytes, float]]]:
+        """Wait for new values and update the model with all of them
+            at once
+
+        Returns:
+            List[Tuple[bytes, bytes, Dict[bytes, float]]]: the coefficients
+                of the model after each of the new values
+        """
+        if isinstance(self.source, Join):
+            # the join state is updated in place, so a row is taken after
+            # each of the records already received by the join
+            join = self.source
+            row = self.state.row
+            rows = [row(await join.__anext__())]  # type: ignore
+            started = time.perf_counter()
+            while join.pending:
+                rows.append(row(await join.__anext__()))  # type: ignore
+            outputs = self.state.update_rows(rows)
+        else:
+            if self.pending:
+                batch = list(self.pending)
+                self.pending.clear()
+            else:
+                batch = await self.queue.get_batch()
+            started = time.perf_counter()
+            outputs = self.state.update_many(batch)
+            for res in batch:
+                self.source.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(len(outputs), len(outputs), started, outputs[0][1])
+        return outputs
+
+    def _queued(self) -> int:
+        """Number of records waiting to be processed
+
+        Returns:
+            int: the number of records
+        """
+        return self.queue.qsize() + len(self.pending)
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from collections import OrderedDict
+from collections import defaultdict
+from typing import DefaultDict
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+import aioredis
+
+from .client import RedisClient
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+
+logger = logging.getLogger(__name__)
+
+
+class ConsumerGroup:
+    """Consumer group settings for Stream and Streams.
+    The entries of the streams are shared among all the consumers of the
+    group, so the load of a stream can be spread on several processes.
+    Acknowledgements are collected and sent with a single XACK for each
+    stream when `ack_count` entries are waiting or every `ack_interval`
+    seconds. A failed XACK is logged and its acknowledgements are sent again
+    with the next one.
+    """
+    def __init__(
+        self,
+        group_name: str,
+        consumer_name: str,
+        ack_count: int = 100,
+        ack_interval: float = 1.0,
+        claim_idle: Optional[int] = None,
+        claim_interval: float = 30.0,
+        claim_count: int = 100,
+    ) -> None:
+        """Initialize the consumer group
+
+        Args:
+            group_name (str): the name of the redis consumer group
+            consumer_name (str): the name of this consumer in the group
+            ack_count (int, optional): number of acknowledgements that
+                triggers a XACK. Defaults to 100.
+            ack_interval (float, optional): maximum time in seconds an
+                acknowledgement waits before being sent. Defaults to 1.0.
+            claim_idle (Optional[int], optional): idle time in milliseconds
+                after which the pending entries of other consumers are
+                claimed. Defaults to None (entries are never claimed).
+            claim_interval (float, optional): time in seconds between
+                two claims of the pending entries. Defaults to 30.0.
+            claim_count (int, optional): maximum number of pending entries
+                checked for each stream at every claim. Defaults to 100.
+        """
+        self.group_name = str(group_name)
+        self.consumer_name = str(consumer_name)
+        self.ack_count = int(ack_count)
+        self.ack_interval = float(ack_interval)
+        self.claim_idle = claim_idle
+        self.claim_interval = float(claim_interval)
+        self.claim_count = int(claim_count)
+
+        self.acks: DefaultDict[bytes, List[bytes]] = defaultdict(list)
+        self.acks_waiting = 0
+        self.flushing: Optional[asyncio.Future] = None
+        self.flusher: Optional[asyncio.Future] = None
+
+    async def start(self, redis: RedisClient, stream_names: List[str]) -> None:
+        """Create the group on the streams (if it does not exist yet)
+        and start sending the acknowledgements.
+
+        Args:
+            redis (RedisClient): the redis instance used for the
+                non-blocking commands (XACK, XPENDING, XCLAIM)
+            stream_names (List[str]): the streams read by the group
+        """
+        self.redis = redis
+        self.stream_names = list(stream_names)
+
+        for stream_name in self.stream_names:
+            try:
+                await redis.xgroup_create(
+                    stream_name, self.group_name, latest_id="$", mkstream=True
+                )
+            except aioredis.ReplyError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+        # entries already delivered to this consumer but not acknowledged
+        # (e.g. before a restart) are read again before the new ones
+        self.recovering: Dict[bytes, bytes] = {
+            stream_name.encode(): b"0" for stream_name in self.stream_names
+        }
+        self.next_claim = 0.0
+        self.flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self) -> None:
+        """Stop the periodic acknowledgements and send the waiting ones,
+        after the XACK in progress (if any)
+        """
+        if self.flusher is not None:
+            self.flusher.cancel()
+            try:
+                await self.flusher
+            except asyncio.CancelledError:
+                pass
+            self.flusher = None
+        await self.flush()
+
+    async def read(
+        self, redis: RedisClient, count: int, timeout: int
+    ) -> List[StreamRecord]:
+        """Read the next entries for this consumer: first the entries still
+        pending for this consumer, then the claimed entries of dead
+        consumers and the new entries of the streams.
+
+        Args:
+            redis (RedisClient): the redis instance used for the
+                blocking reads
+            count (int): maximum number of entries for each stream
+            timeout (int): how long (in milliseconds) the read waits for
+                new entries, 0 waits forever
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        if self.recovering:
+            names = list(self.recovering)
+            res = await redis.xread_group(
+                self.group_name,
+                self.consumer_name,
+                [name.decode() for name in names],
+                count=count,
+                latest_ids=[self.recovering[name] for name in names],
+            )
+            last_ids = {row[0]: row[1] for row in res}
+            for name in names:
+                if name in last_ids:
+                    self.recovering[name] = last_ids[name]
+                else:
+                    del self.recovering[name]
+            if res:
+                return res
+
+        if self.claim_idle is not None:
+            now = asyncio.get_event_loop().time()
+            if now >= self.next_claim:
+                self.next_claim = now + self.claim_interval
+                res = await self.claim()
+                if res:
+                    return res
+
+        return await redis.xread_group(
+            self.group_name,
+            self.consumer_name,
+            self.stream_names,
+            timeout=timeout,
+            count=count,
+            latest_ids=[">"] * len(self.stream_names),
+        )
+
+    async def claim(self) -> List[StreamRecord]:
+        """Take the ownership of the entries pending for longer than
+        `claim_idle` milliseconds on other consumers (e.g. dead workers).
+
+        Returns:
+            List[StreamRecord]: the claimed entries
+        """
+        consumer_name = self.consumer_name.encode()
+        # only called when claim_idle is set
+        claim_idle: int = self.claim_idle  # type: ignore
+        claimed: List[StreamRecord] = []
+        for stream_name in self.stream_names:
+            pending = await self.redis.xpending(
+                stream_name, self.group_name, "-", "+", self.claim_count
+            )
+            ids = [
+                p[0] for p in pending
+                if p[1] != consumer_name and p[2] >= claim_idle
+            ]
+            if not ids:
+                continue
+
+            rows = await self.redis.xclaim(
+                stream_name,
+                self.group_name,
+                self.consumer_name,
+                claim_idle,
+                *ids
+            )
+            key = stream_name.encode()
+            claimed.extend((key, idx, value) for idx, value in rows)
+        return claimed
+
+    def ack(self, stream_name: bytes, idx: bytes) -> None:
+        """Acknowledge an entry. The acknowledgement is sent
+        with the next XACK of the stream.
+
+        Args:
+            stream_name (bytes): the name of the stream of the entry
+            idx (bytes): the redis id of the entry
+        """
+        self.acks[stream_name].append(idx)
+        self.acks_waiting += 1
+        if self.acks_waiting >= self.ack_count:
+            self._start_flush()
+
+    async def flush(self) -> None:
+        """Send the waiting acknowledgements, one XACK for each stream,
+        after the XACK in progress (if any)
+
+        Raises:
+            RedisClientError: in case the XACK fails (the
+                acknowledgements are kept to be sent again)
+        """
+        if self.flushing is not None:
+            await asyncio.wait([self.flushing])
+        if self.acks_waiting:
+            await asyncio.shield(self._start_flush())
+
+    def _start_flush(self) -> asyncio.Future:
+        """Start sending the waiting acknowledgements, unless a XACK is
+        already in progress. All the XACKs are sent by this single task.
+
+        Returns:
+            asyncio.Future: the task sending the acknowledgements
+        """
+        if self.flushing is None:
+            self.flushing = asyncio.ensure_future(self._send())
+            self.flushing.add_done_callback(self._flushed)
+        return self.flushing
+
+    async def _send(self) -> None:
+        """Send the waiting acknowledgements, putting them back if the
+        XACK fails
+        """
+        acks, self.acks = self.acks, defaultdict(list)
+        waiting, self.acks_waiting = self.acks_waiting, 0
+        try:
+            if acks:
+                pipe = self.redis.pipeline()
+                for stream_name, ids in acks.items():
+                    pipe.xack(stream_name, self.group_name, *ids)
+                await pipe.execute()
+        except BaseException:
+            for stream_name, ids in acks.items():
+                self.acks[stream_name][:0] = ids
+            self.acks_waiting += waiting
+            raise
+        finally:
+            self.flushing = None
+
+    def _flushed(self, future: asyncio.Future) -> None:
+        """Log the failure of a XACK
+
+        Args:
+            future (asyncio.Future): the task sending the acknowledgements
+        """
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "XACK of group %s failed, %d acknowledgements waiting.",
+                self.group_name,
+                self.acks_waiting,
+                exc_info=future.exception(),
+            )
+
+    async def _flush_periodically(self) -> None:
+        """Send the waiting acknowledgements every `ack_interval` seconds,
+        going on after a failed XACK (logged by _flushed)
+        """
+        while True:
+            await asyncio.sleep(self.ack_interval)
+            if self.acks_waiting:
+                try:
+                    await self.flush()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    pass
@@ -0,0 +1,1000 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import TYPE_CHECKING
+
+import aioredis
+
+from .client import RedisClient
+from .pool import Pool
+from .utils.ids import IdKey
+from .utils.ids import MAX_SEQ
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, bytes]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+
+Entry = Tuple[bytes, StreamValue]
+Value = Union[bytes, bytearray, str, int, float]
+
+# entries trimmed at once by an approximate MAXLEN, like a redis node
+TRIM_CHUNK = 100
+
+_CONVERTERS: Dict[type, Callable[[Any], bytes]] = {
+    bytes: lambda value: value,
+    bytearray: bytes,
+    str: lambda value: value.encode(),
+    int: lambda value: b"%d" % value,
+    float: lambda value: b"%r" % value,
+}
+
+
+def _encode(value: Value) -> bytes:
+    """Convert an argument to bytes, as aioredis does
+
+    Args:
+        value (Value): the argument
+
+    Raises:
+        TypeError: in case of unsupported type
+
+    Returns:
+        bytes: the encoded argument
+    """
+    try:
+        return _CONVERTERS[type(value)](value)
+    except KeyError:
+        raise TypeError(
+            f"Argument {value!r} expected to be of bytearray, bytes,"
+            " float, int, or str type"
+        )
+
+
+def _parse_id(value: Value, seq: int = 0) -> IdKey:
+    """Parse a redis id, possibly without sequence number
+
+    Args:
+        value (Value): the id
+        seq (int, optional): the sequence number of an incomplete id.
+            Defaults to 0.
+
+    Raises:
+        aioredis.ReplyError: in case of invalid id
+
+    Returns:
+        IdKey: the timestamp and the sequence number
+    """
+    ms, sep, rest = _encode(value).partition(b"-")
+    try:
+        return int(ms), int(rest) if sep else seq
+    except ValueError:
+        raise aioredis.ReplyError(
+            "ERR Invalid stream ID specified as stream command argument"
+        )
+
+
+def _format_id(key: IdKey) -> bytes:
+    """The redis id of a timestamp and a sequence number
+
+    Args:
+        key (IdKey): the timestamp and the sequence number
+
+    Returns:
+        bytes: the redis id
+    """
+    return b"%d-%d" % key
+
+
+def _now() -> int:
+    """The current time in milliseconds
+
+    Returns:
+        int: the timestamp
+    """
+    return int(time.time() * 1000)
+
+
+class _Group:
+    """Consumer group of an in-memory stream: the last delivered id and
+    the pending entries, with their consumer, delivery time and number
+    of deliveries
+    """
+    def __init__(self, last: IdKey) -> None:
+        """Initialize the group with no pending entries
+
+        Args:
+            last (IdKey): the last id delivered to the group
+        """
+        self.last = last
+        self.pending: Dict[bytes, List[Any]] = {}
+
+
+class _Entries:
+    """Entries of an in-memory stream, sorted by id. The ids are kept as
+    (timestamp, sequence) keys too, so ranges are found by bisection.
+    """
+    def __init__(self) -> None:
+        """Initialize the empty stream
+        """
+        self.keys: List[IdKey] = []
+        self.ids: List[bytes] = []
+        self.values: List[StreamValue] = []
+        self.last: IdKey = (0, 0)
+        self.groups: Dict[bytes, _Group] = {}
+
+    def add(self, fields: Mapping[Value, Value], message_id: Value) -> bytes:
+        """Append an entry
+
+        Args:
+            fields (Mapping[Value, Value]): the fields-values
+            message_id (Value): the id, or b"*" for a generated id
+
+        Raises:
+            aioredis.ReplyError: in case of id not greater than the last one
+
+        Returns:
+            bytes: the id of the entry
+        """
+        if _encode(message_id) == b"*":
+            ms = max(_now(), self.last[0])
+            key = (ms, self.last[1] + 1) if ms == self.last[0] else (ms, 0)
+            if key == (0, 0):
+                key = (0, 1)
+        else:
+            key = _parse_id(message_id)
+            if key <= self.last:
+                raise aioredis.ReplyError(
+                    "ERR The ID specified in XADD is equal or smaller than the"
+                    " target stream top item"
+                )
+        idx = _format_id(key)
+        self.keys.append(key)
+        self.ids.append(idx)
+        self.values.append(
+            OrderedDict((_encode(k), _encode(v)) for k, v in fields.items())
+        )
+        self.last = key
+        return idx
+
+    def trim(self, max_len: int, exact: bool) -> int:
+        """Remove the oldest entries beyond `max_len`. The approximate trim
+        removes only whole chunks of TRIM_CHUNK entries.
+
+        Args:
+            max_len (int): the number of entries kept
+            exact (bool): trim exactly to `max_len` entries
+
+        Returns:
+            int: the number of removed entries
+        """
+        excess = len(self.ids) - int(max_len)
+        if not exact:
+            excess -= excess % TRIM_CHUNK
+        if excess <= 0:
+            return 0
+        del self.keys[:excess]
+        del self.ids[:excess]
+        del self.values[:excess]
+        return excess
+
+    def after(self, key: IdKey, count: Optional[int]) -> List[Entry]:
+        """The entries following an id
+
+        Args:
+            key (IdKey): the id
+            count (Optional[int]): maximum number of entries
+
+        Returns:
+            List[Entry]: the entries
+        """
+        start = bisect_right(self.keys, key)
+        end = len(self.keys) if count is None else min(start + count, len(self.keys))
+        return list(zip(self.ids[start:end], self.values[start:end]))
+
+    def between(
+        self, start: IdKey, stop: IdKey, count: Optional[int], reverse: bool
+    ) -> List[Entry]:
+        """The entries between two ids (both included)
+
+        Args:
+            start (IdKey): the first id
+            stop (IdKey): the last id
+            count (Optional[int]): maximum number of entries
+            reverse (bool): from the last entry backwards
+
+        Returns:
+            List[Entry]: the entries
+        """
+        low = bisect_left(self.keys, start)
+        high = bisect_right(self.keys, stop)
+        if high <= low:
+            return []
+        if reverse:
+            first = low if count is None else max(high - count, low)
+            ids, values = self.ids[first:high][::-1], self.values[first:high][::-1]
+        else:
+            last = high if count is None else min(low + count, high)
+            ids, values = self.ids[low:last], self.values[low:last]
+        return list(zip(ids, values))
+
+    def get(self, idx: bytes) -> Optional[StreamValue]:
+        """The fields-values of an entry
+
+        Args:
+            idx (bytes): the id of the entry
+
+        Returns:
+            Optional[StreamValue]: the fields-values, None if the entry has
+                been removed
+        """
+        i = bisect_left(self.keys, _parse_id(idx))
+        if i < len(self.ids) and self.ids[i] == idx:
+            return self.values[i]
+        return None
+
+
+class MemoryServer:
+    """In-process stand-in of a redis server for the stream commands
+    (XADD, XREAD, XRANGE, XREADGROUP, ...) and plain keys. The clients of
+    the same server share its streams, and the blocking reads are woken
+    up by the new entries, so a producer and its consumers in the same
+    process skip the network. The fields-values of an entry are not copied
+    for each reader, so they must not be changed.
+    """
+    def __init__(self) -> None:
+        """Initialize the empty server
+        """
+        self.streams: Dict[bytes, _Entries] = {}
+        self.keys: Dict[bytes, bytes] = {}
+        # readers blocked on each stream name
+        self.waiters: Dict[bytes, List[asyncio.Future]] = {}
+
+    def stream(self, name: Value, create: bool = False) -> Optional[_Entries]:
+        """The entries of a stream
+
+        Args:
+            name (Value): the stream name
+            create (bool, optional): create the stream if it does not
+                exist. Defaults to False.
+
+        Returns:
+            Optional[_Entries]: the entries, None if the stream does not
+                exist
+        """
+        key = _encode(name)
+        entries = self.streams.get(key)
+        if entries is None and create:
+            entries = self.streams[key] = _Entries()
+        return entries
+
+    def notify(self, name: bytes) -> None:
+        """Wake up the readers blocked on a stream
+
+        Args:
+            name (bytes): the stream name
+        """
+        for waiter in self.waiters.pop(name, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, names: List[bytes], timeout: Optional[float]) -> bool:
+        """Wait for a new entry in one of the streams
+
+        Args:
+            names (List[bytes]): the stream names
+            timeout (Optional[float]): maximum time in seconds, None waits
+                forever
+
+        Returns:
+            bool: False in case of timeout
+        """
+        waiter = asyncio.get_event_loop().create_future()
+        for name in names:
+            self.waiters.setdefault(name, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            for name in names:
+                waiting = self.waiters.get(name)
+                if waiting is not None and waiter in waiting:
+                    waiting.remove(waiter)
+
+    def flushall(self) -> None:
+        """Remove all the streams and the keys
+        """
+        self.streams.clear()
+        self.keys.clear()
+
+
+class MemoryPipeline:
+    """Pipeline of a MemoryRedis client: the commands are run in order
+    by execute
+    """
+    def __init__(self, client: MemoryRedis) -> None:
+        """Initialize the empty pipeline
+
+        Args:
+            client (MemoryRedis): the client running the commands
+        """
+        self.client = client
+        self.commands: List[Tuple[asyncio.Future, str, tuple, dict]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., asyncio.Future]:
+        """Queue a command of the client
+
+        Args:
+            name (str): the command (e.g. "xadd")
+
+        Raises:
+            AttributeError: in case the client has no such command
+
+        Returns:
+            Callable[..., asyncio.Future]: the function queueing the command,
+                returning the future of its result
+        """
+        if not hasattr(self.client, name):
+            raise AttributeError(name)
+
+        def command(*args: Any, **kwargs: Any) -> asyncio.Future:
+            future = asyncio.get_event_loop().create_future()
+            self.commands.append((future, name, args, kwargs))
+            return future
+        return command
+
+    async def execute(self) -> List[Any]:
+        """Run the queued commands
+
+        Returns:
+            List[Any]: the results of the commands
+        """
+        commands, self.commands = self.commands, []
+        results = []
+        for future, name, args, kwargs in commands:
+            result = await getattr(self.client, name)(*args, **kwargs)
+            future.set_result(result)
+            results.append(result)
+        return results
+
+
+class MemoryRedis:
+    """Client of a MemoryServer, with the same interface (and results) of
+    the aioredis client for the commands used by the streams and the nodes
+    """
+    def __init__(self, server: MemoryServer) -> None:
+        """Initialize the client
+
+        Args:
+            server (MemoryServer): the server
+        """
+        self.server = server
+        self.closed = False
+        self.reading: List[asyncio.Task] = []
+
+    def close(self) -> None:
+        """Close the client, interrupting its blocked reads
+        """
+        self.closed = True
+        for task in self.reading:
+            task.cancel()
+        self.reading = []
+
+    async def wait_closed(self) -> None:
+        """Wait for the client to be closed
+        """
+
+    def pipeline(self) -> MemoryPipeline:
+        """Start a pipeline of commands
+
+        Returns:
+            MemoryPipeline: the pipeline
+        """
+        return MemoryPipeline(self)
+
+    async def get(self, key: Value) -> Optional[bytes]:
+        """GET: the value of a key
+
+        Args:
+            key (Value): the key
+
+        Returns:
+            Optional[bytes]: the value, None if the key does not exist
+        """
+        return self.server.keys.get(_encode(key))
+
+    async def set(self, key: Value, value: Value) -> bool:
+        """SET: set the value of a key
+
+        Args:
+            key (Value): the key
+            value (Value): the value
+
+        Returns:
+            bool: True
+        """
+        self.server.keys[_encode(key)] = _encode(value)
+        return True
+
+    async def delete(self, key: Value, *keys: Value) -> int:
+        """DEL: remove keys and streams
+
+        Args:
+            key (Value): the key or stream name
+            *keys (Value): further keys or stream names
+
+        Returns:
+            int: the number of removed keys and streams
+        """
+        removed = 0
+        for name in map(_encode, (key,) + keys):
+            if self.server.keys.pop(name, None) is not None:
+                removed += 1
+            elif self.server.streams.pop(name, None) is not None:
+                removed += 1
+        return removed
+
+    async def flushall(self) -> bool:
+        """FLUSHALL: remove all the keys and streams
+
+        Returns:
+            bool: True
+        """
+        self.server.flushall()
+        return True
+
+    async def xadd(
+        self,
+        stream: Value,
+        fields: Mapping[Value, Value],
+        message_id: Value = b"*",
+        max_len: Optional[int] = None,
+        exact_len: bool = False,
+    ) -> bytes:
+        """XADD: append an entry, trimming the stream to `max_len` entries
+
+        Args:
+            stream (Value): the stream name
+            fields (Mapping[Value, Value]): the fields-values of the entry
+            message_id (Value, optional): the id. Defaults to b"*"
+                (generated).
+            max_len (Optional[int], optional): the number of entries kept.
+                Defaults to None (no trim).
+            exact_len (bool, optional): trim exactly to `max_len` entries.
+                Defaults to False.
+
+        Returns:
+            bytes: the id of the entry
+        """
+        entries: _Entries = self.server.stream(stream, create=True)  # type: ignore
+        idx = entries.add(fields, message_id)
+        if max_len is not None:
+            entries.trim(max_len, exact_len)
+        self.server.notify(_encode(stream))
+        return idx
+
+    async def xtrim(self, stream: Value, max_len: int, exact_len: bool = False) -> int:
+        """XTRIM: trim the stream to `max_len` entries
+
+        Args:
+            stream (Value): the stream name
+            max_len (int): the number of entries kept
+            exact_len (bool, optional): trim exactly to `max_len` entries.
+                Defaults to False.
+
+        Returns:
+            int: the number of removed entries
+        """
+        entries = self.server.stream(stream)
+        return entries.trim(max_len, exact_len) if entries is not None else 0
+
+    async def xlen(self, stream: Value) -> int:
+        """XLEN: the number of entries of the stream
+
+        Args:
+            stream (Value): the stream name
+
+        Returns:
+            int: the number of entries, 0 if the stream does not exist
+        """
+        entries = self.server.stream(stream)
+        return len(entries.ids) if entries is not None else 0
+
+    async def xrange(
+        self,
+        stream: Value,
+        start: Value = "-",
+        stop: Value = "+",
+        count: Optional[int] = None,
+    ) -> List[Entry]:
+        """XRANGE: the entries between two positions
+
+        Args:
+            stream (Value): the stream name
+            start (Value, optional): the first position. Defaults to "-".
+            stop (Value, optional): the last position. Defaults to "+".
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+
+        Returns:
+            List[Entry]: the entries
+        """
+        return self._range(stream, start, stop, count, reverse=False)
+
+    async def xrevrange(
+        self,
+        stream: Value,
+        start: Value = "+",
+        stop: Value = "-",
+        count: Optional[int] = None,
+    ) -> List[Entry]:
+        """XREVRANGE: the entries between two positions, backwards
+
+        Args:
+            stream (Value): the stream name
+            start (Value, optional): the last position. Defaults to "+".
+            stop (Value, optional): the first position. Defaults to "-".
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+
+        Returns:
+            List[Entry]: the entries
+        """
+        return self._range(stream, stop, start, count, reverse=True)
+
+    def _range(
+        self,
+        stream: Value,
+        low: Value,
+        high: Value,
+        count: Optional[int],
+        reverse: bool,
+    ) -> List[Entry]:
+        """The entries between two positions (b"-", b"+", ids, incomplete
+        ids and exclusive "(" ids)
+
+        Args:
+            stream (Value): the stream name
+            low (Value): the first position
+            high (Value): the last position
+            count (Optional[int]): maximum number of entries
+            reverse (bool): from the last entry backwards
+
+        Returns:
+            List[Entry]: the entries
+        """
+        entries = self.server.stream(stream)
+        if entries is None:
+            return []
+        low, high = _encode(low), _encode(high)
+
+        if low == b"-":
+            start = (0, 0)
+        elif low.startswith(b"("):
+            ms, seq = _parse_id(low[1:])
+            start = (ms + 1, 0) if seq == MAX_SEQ else (ms, seq + 1)
+        else:
+            start = _parse_id(low)
+        if high == b"+":
+            stop = (2 ** 64, 0)
+        elif high.startswith(b"("):
+            ms, seq = _parse_id(high[1:], MAX_SEQ)
+            stop = (ms - 1, MAX_SEQ) if seq == 0 else (ms, seq - 1)
+        else:
+            stop = _parse_id(high, MAX_SEQ)
+        return entries.between(start, stop, count, reverse)
+
+    async def xread(
+        self,
+        streams: Sequence[Value],
+        timeout: Optional[int] = 0,
+        count: Optional[int] = None,
+        latest_ids: Optional[Sequence[Value]] = None,
+    ) -> List[StreamRecord]:
+        """XREAD: the entries following the ids, blocking for `timeout`
+        milliseconds (0 forever, None not at all) if there are none
+
+        Args:
+            streams (Sequence[Value]): the stream names
+            timeout (Optional[int], optional): how long the read waits for
+                new entries. Defaults to 0.
+            count (Optional[int], optional): maximum number of entries of
+                each stream. Defaults to None.
+            latest_ids (Optional[Sequence[Value]], optional): the ids of the
+                streams. Defaults to None (the entries added after the call).
+
+        Raises:
+            ValueError: in case of streams and ids of different length
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        names = [_encode(name) for name in streams]
+        if latest_ids is None:
+            latest_ids = [b"$"] * len(names)
+        if len(latest_ids) != len(names):
+            raise ValueError("The streams and latest_ids parameters must be of the "
+                             "same length")
+        # "$" is the last entry at the time of the call
+        cursors = []
+        for name, latest_id in zip(names, latest_ids):
+            if _encode(latest_id) == b"$":
+                entries = self.server.streams.get(name)
+                cursors.append(entries.last if entries is not None else (0, 0))
+            else:
+                cursors.append(_parse_id(latest_id))
+
+        def read() -> List[StreamRecord]:
+            res: List[StreamRecord] = []
+            for name, cursor in zip(names, cursors):
+                entries = self.server.streams.get(name)
+                if entries is not None:
+                    res.extend((name, idx, value) for idx, value in entries.after(
+                        cursor, count
+                    ))
+            return res
+
+        return await self._blocking(names, timeout, read)
+
+    async def xgroup_create(
+        self,
+        stream: Value,
+        group_name: Value,
+        latest_id: Value = "$",
+        mkstream: bool = False,
+    ) -> bool:
+        """XGROUP CREATE: create a consumer group
+
+        Args:
+            stream (Value): the stream name
+            group_name (Value): the group name
+            latest_id (Value, optional): the last id delivered to the group.
+                Defaults to "$" (the last entry of the stream).
+            mkstream (bool, optional): create the stream if it does not
+                exist. Defaults to False.
+
+        Raises:
+            aioredis.ReplyError: in case the stream does not exist or the
+                group exists already
+
+        Returns:
+            bool: True
+        """
+        entries = self.server.stream(stream, create=mkstream)
+        if entries is None:
+            raise aioredis.ReplyError(
+                "ERR The XGROUP subcommand requires the key to exist. Note that"
+                " for CREATE you may want to use the MKSTREAM option to create"
+                " an empty stream automatically."
+            )
+        group = _encode(group_name)
+        if group in entries.groups:
+            raise aioredis.ReplyError("BUSYGROUP Consumer Group name already exists")
+        latest = _encode(latest_id)
+        entries.groups[group] = _Group(
+            entries.last if latest == b"$" else _parse_id(latest)
+        )
+        return True
+
+    def _group(self, stream: Value, group_name: Value) -> Tuple[_Entries, _Group]:
+        """The entries of a stream and one of its consumer groups
+
+        Args:
+            stream (Value): the stream name
+            group_name (Value): the group name
+
+        Raises:
+            aioredis.ReplyError: in case the group does not exist
+
+        Returns:
+            Tuple[_Entries, _Group]: the entries and the group
+        """
+        entries = self.server.stream(stream)
+        group = entries.groups.get(_encode(group_name)) if entries else None
+        if entries is None or group is None:
+            raise aioredis.ReplyError(
+                f"NOGROUP No such key '{_encode(stream).decode()}' or consumer"
+                f" group '{_encode(group_name).decode()}'"
+            )
+        return entries, group
+
+    async def xread_group(
+        self,
+        group_name: Value,
+        consumer_name: Value,
+        streams: Sequence[Value],
+        timeout: Optional[int] = 0,
+        count: Optional[int] = None,
+        latest_ids: Optional[Sequence[Value]] = None,
+        no_ack: bool = False,
+    ) -> List[StreamRecord]:
+        """XREADGROUP: the new entries (">") for the consumer, or the
+        history of its pending entries
+
+        Args:
+            group_name (Value): the group name
+            consumer_name (Value): the consumer name
+            streams (Sequence[Value]): the stream names
+            timeout (Optional[int], optional): how long (in milliseconds)
+                the read of new entries waits for them, 0 waits forever,
+                None does not wait. Defaults to 0.
+            count (Optional[int], optional): maximum number of entries of
+                each stream. Defaults to None.
+            latest_ids (Optional[Sequence[Value]], optional): ">" for the
+                new entries, or the id after which the pending entries are
+                read. Defaults to None.
+            no_ack (bool, optional): do not add the entries to the pending
+                ones. Defaults to False.
+
+        Raises:
+            ValueError: in case of streams and ids of different length
+            aioredis.ReplyError: in case a group does not exist
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        names = [_encode(name) for name in streams]
+        if latest_ids is None or len(latest_ids) != len(names):
+            raise ValueError("The streams and latest_ids parameters must be of the "
+                             "same length")
+        consumer = _encode(consumer_name)
+        cursors = [_encode(latest_id) for latest_id in latest_ids]
+        groups = [self._group(name, group_name) for name in names]
+
+        def read() -> List[StreamRecord]:
+            res: List[StreamRecord] = []
+            now = _now()
+            for name, cursor, (entries, group) in zip(names, cursors, groups):
+                if cursor != b">":
+                    # the history of the entries pending for the consumer
+                    after = _parse_id(cursor)
+                    own = sorted(
+                        (_parse_id(idx), idx)
+                        for idx, pending in group.pending.items()
+                        if pending[0] == consumer
+                    )
+                    own = [(key, idx) for key, idx in own if key > after][:count]
+                    for _, idx in own:
+                        value = entries.get(idx)
+                        if value is not None:
+                            res.append((name, idx, value))
+                    continue
+                new = entries.after(group.last, count)
+                if new:
+                    group.last = _parse_id(new[-1][0])
+                for idx, value in new:
+                    if not no_ack:
+                        group.pending[idx] = [consumer, now, 1]
+                    res.append((name, idx, value))
+            return res
+
+        blocking = all(cursor == b">" for cursor in cursors)
+        return await self._blocking(names, timeout if blocking else None, read)
+
+    async def xack(self, stream: Value, group_name: Value, *ids: Value) -> int:
+        """XACK: acknowledge entries of the group
+
+        Args:
+            stream (Value): the stream name
+            group_name (Value): the group name
+            *ids (Value): the ids of the entries
+
+        Returns:
+            int: the number of acknowledged entries
+        """
+        _, group = self._group(stream, group_name)
+        acked = 0
+        for idx in ids:
+            acked += group.pending.pop(_encode(idx), None) is not None
+        return acked
+
+    async def xpending(
+        self,
+        stream: Value,
+        group_name: Value,
+        start: Optional[Value] = None,
+        stop: Optional[Value] = None,
+        count: Optional[int] = None,
+        consumer: Optional[Value] = None,
+    ) -> List[Any]:
+        """XPENDING: the summary of the pending entries, or their details
+        between two ids
+
+        Args:
+            stream (Value): the stream name
+            group_name (Value): the group name
+            start (Optional[Value], optional): the first id. Defaults to
+                None (the summary).
+            stop (Optional[Value], optional): the last id. Defaults to None.
+            count (Optional[int], optional): maximum number of entries.
+                Defaults to None.
+            consumer (Optional[Value], optional): only the entries of this
+                consumer. Defaults to None.
+
+        Returns:
+            List[Any]: the number of pending entries, the first and last id
+                and the entries of each consumer, or the id, consumer, idle
+                time and number of deliveries of each entry
+        """
+        _, group = self._group(stream, group_name)
+        pending = sorted(
+            (_parse_id(idx), idx, info) for idx, info in group.pending.items()
+        )
+        if start is None:
+            if not pending:
+                return [0, None, None, None]
+            consumers: Dict[bytes, int] = {}
+            for _, _, info in pending:
+                consumers[info[0]] = consumers.get(info[0], 0) + 1
+            return [
+                len(pending),
+                pending[0][1],
+                pending[-1][1],
+                [[name, b"%d" % n] for name, n in sorted(consumers.items())],
+            ]
+
+        low = (0, 0) if _encode(start) == b"-" else _parse_id(start)
+        last = b"+" if stop is None else _encode(stop)
+        high = (2 ** 64, 0) if last == b"+" else _parse_id(last, MAX_SEQ)
+        owner = _encode(consumer) if consumer is not None else None
+        now = _now()
+        return [
+            [idx, info[0], now - info[1], info[2]]
+            for key, idx, info in pending
+            if low <= key <= high and (owner is None or info[0] == owner)
+        ][:count]
+
+    async def xclaim(
+        self,
+        stream: Value,
+        group_name: Value,
+        consumer_name: Value,
+        min_idle_time: int,
+        id: Value,
+        *ids: Value,
+    ) -> List[Entry]:
+        """XCLAIM: take the ownership of pending entries
+
+        Args:
+            stream (Value): the stream name
+            group_name (Value): the group name
+            consumer_name (Value): the new owner
+            min_idle_time (int): claim only the entries idle for at least
+                this time (in milliseconds)
+            id (Value): the id of an entry
+            *ids (Value): the ids of further entries
+
+        Returns:
+            List[Entry]: the claimed entries
+        """
+        entries, group = self._group(stream, group_name)
+        consumer = _encode(consumer_name)
+        now = _now()
+        claimed = []
+        for idx in map(_encode, (id,) + ids):
+            info = group.pending.get(idx)
+            if info is None or now - info[1] < min_idle_time:
+                continue
+            value = entries.get(idx)
+            if value is None:
+                del group.pending[idx]
+                continue
+            group.pending[idx] = [consumer, now, info[2] + 1]
+            claimed.append((idx, value))
+        return claimed
+
+    async def _blocking(
+        self,
+        names: List[bytes],
+        timeout: Optional[int],
+        read: Callable[[], List[StreamRecord]],
+    ) -> List[StreamRecord]:
+        """Run a read, blocking until it returns some entries
+
+        Args:
+            names (List[bytes]): the streams read
+            timeout (Optional[int]): how long (in milliseconds) the read
+                waits for new entries, 0 waits forever, None does not wait
+            read (Callable[[], List[StreamRecord]]): the read
+
+        Returns:
+            List[StreamRecord]: the read entries
+        """
+        if self.closed:
+            raise aioredis.ConnectionClosedError("Connection closed or corrupted")
+        res = read()
+        if res or timeout is None:
+            return res
+
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout == 0 else loop.time() + timeout / 1000
+        task = asyncio.current_task()
+        self.reading.append(task)  # type: ignore
+        try:
+            while not res:
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                if not await self.server.wait(names, remaining):
+                    break
+                res = read()
+        finally:
+            if task in self.reading:
+                self.reading.remove(task)  # type: ignore
+        return res
+
+
+class MemoryPool(Pool):
+    """Pool of MemoryRedis clients of the same MemoryServer, to be used in
+    place of a RedisPool by streams, nodes and writers (e.g. in tests,
+    benchmarks and pipelines running in a single process)
+    """
+    def __init__(self, server: Optional[MemoryServer] = None) -> None:
+        """Initialize the pool
+
+        Args:
+            server (Optional[MemoryServer], optional): the server shared by
+                the clients. Defaults to None (a new server).
+        """
+        self.server = MemoryServer() if server is None else server
+        self.shared: Optional[MemoryRedis] = None
+        self.dedicated: List[MemoryRedis] = []
+
+    async def client(self) -> MemoryRedis:
+        """The client shared by all the users of the pool
+
+        Returns:
+            MemoryRedis: the shared client
+        """
+        if self.shared is None:
+            self.shared = MemoryRedis(self.server)
+        return self.shared
+
+    async def acquire(self) -> MemoryRedis:
+        """A dedicated client for the blocking reads
+
+        Returns:
+            MemoryRedis: the dedicated client
+        """
+        redis = MemoryRedis(self.server)
+        self.dedicated.append(redis)
+        return redis
+
+    def release(self, redis: RedisClient) -> None:
+        """Close a dedicated client, cancelling its blocked reads. The
+        clients hold no socket, so they are not reused.
+
+        Args:
+            redis (RedisClient): the dedicated client
+        """
+        redis.close()
+        self.dedicated = [client for client in self.dedicated if client is not redis]
+
+    async def close(self) -> None:
+        """Close the shared client and all the dedicated clients, cancelling
+        their blocked reads. The streams of the server are kept.
+        """
+        for redis in self.dedicated:
+            redis.close()
+        self.dedicated = []
+        if self.shared is not None:
+            self.shared.close()
+        self.shared = None
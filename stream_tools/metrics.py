@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from bisect import bisect_left
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from .utils.channel import Channel
+
+
+# upper bounds (seconds) of the histogram buckets
+PROCESSING_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0
+)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+Snapshot = Dict[str, Dict[str, Any]]
+
+
+class Histogram:
+    """Histogram of observations with fixed buckets, as in Prometheus.
+    An observation costs a bisection of the bucket bounds.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        """Initialize the empty histogram
+
+        Args:
+            bounds (Sequence[float]): the upper bounds of the buckets,
+                increasing (the last bucket has no bound)
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add an observation
+
+        Args:
+            value (float): the observed value
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def buckets(self) -> List[Tuple[str, int]]:
+        """The cumulative count of the observations of each bucket
+
+        Returns:
+            List[Tuple[str, int]]: the upper bound ("+Inf" for the last
+                bucket) and the number of observations up to it
+        """
+        bounds = [repr(float(bound)) for bound in self.bounds] + ["+Inf"]
+        cumulative = []
+        total = 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The current state of the histogram
+
+        Returns:
+            Dict[str, Any]: the count, the sum and the cumulative buckets
+        """
+        return {"count": self.count, "sum": self.sum, "buckets": dict(self.buckets())}
+
+
+class NodeMetrics:
+    """Metrics of a node: the records received and returned, the records
+    waiting in its queue, the processing time of each call and the latency
+    of the records. The latency is the time from the redis id (the time the
+    record was added to its stream) of the oldest record of each call to
+    the return of the call, so it includes the time spent in the queue and
+    any lag of the node behind its streams.
+    """
+    def __init__(self, node_name: str) -> None:
+        """Initialize the metrics
+
+        Args:
+            node_name (str): the name of the node
+        """
+        self.node_name = node_name
+        self.records_in = 0
+        self.records_out = 0
+        self.processing = Histogram(PROCESSING_BUCKETS)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        # queues of the nodes, and functions counting their waiting records
+        self.channels: List[Channel] = []
+        self.queued: List[Callable[[], int]] = []
+
+    def observe(
+        self, records_in: int, records_out: int, started: float, idx: bytes
+    ) -> None:
+        """Record a call of the node
+
+        Args:
+            records_in (int): the records processed by the call
+            records_out (int): the records returned by the call
+            started (float): the time.perf_counter() at the start of the
+                processing (after the records have been received)
+            idx (bytes): the redis id of the oldest processed record, no
+                latency is recorded if it is empty
+        """
+        self.records_in += records_in
+        self.records_out += records_out
+        self.processing.observe(time.perf_counter() - started)
+        if idx:
+            self.latency.observe(time.time() - int(idx.split(b"-", 1)[0]) / 1000)
+
+    @property
+    def queue_depth(self) -> int:
+        """The records waiting to be processed
+
+        Returns:
+            int: the number of records
+        """
+        return sum(queued() for queued in self.queued)
+
+    @property
+    def dropped(self) -> int:
+        """The records dropped or coalesced by the queues
+
+        Returns:
+            int: the number of records
+        """
+        return sum(channel.dropped + channel.coalesced for channel in self.channels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The current value of the metrics
+
+        Returns:
+            Dict[str, Any]: the metrics
+        """
+        return {
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "queue_depth": self.queue_depth,
+            "dropped": self.dropped,
+            "processing_seconds": self.processing.snapshot(),
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value
+
+    Args:
+        value (str): the value
+
+    Returns:
+        str: the escaped value
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Registry of the metrics of the nodes, by node name. A node given the
+    registry (metrics option) updates its metrics at every call, with a few
+    counters and two histogram observations, so they can be always on.
+    The metrics are read with snapshot, or in the Prometheus text format
+    with prometheus and from the HTTP endpoint started by serve.
+    Nodes with the same name share their metrics.
+    """
+    PREFIX = "stream_tools"
+
+    def __init__(self) -> None:
+        """Initialize the empty registry
+        """
+        self.nodes: Dict[str, NodeMetrics] = {}
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    def register(
+        self,
+        node_name: str,
+        channel: Optional[Channel] = None,
+        queued: Optional[Callable[[], int]] = None,
+    ) -> NodeMetrics:
+        """Get the metrics of a node, creating them for a new node name
+
+        Args:
+            node_name (str): the name of the node
+            channel (Optional[Channel], optional): the queue of the node.
+                Defaults to None (no queue).
+            queued (Optional[Callable[[], int]], optional): function
+                returning the number of records waiting in the node.
+                Defaults to None (the records in the queue).
+
+        Returns:
+            NodeMetrics: the metrics of the node
+        """
+        metrics = self.nodes.get(node_name)
+        if metrics is None:
+            metrics = self.nodes[node_name] = NodeMetrics(node_name)
+        if channel is not None:
+            metrics.channels.append(channel)
+            metrics.queued.append(queued or channel.qsize)
+        elif queued is not None:
+            metrics.queued.append(queued)
+        return metrics
+
+    def unregister(self, node_name: str) -> None:
+        """Remove the metrics of a node
+
+        Args:
+            node_name (str): the name of the node
+        """
+        self.nodes.pop(node_name, None)
+
+    def snapshot(self) -> Snapshot:
+        """The current value of the metrics of all the nodes
+
+        Returns:
+            Snapshot: the metrics by node name
+        """
+        return {name: metrics.snapshot() for name, metrics in self.nodes.items()}
+
+    def prometheus(self) -> str:
+        """The metrics of all the nodes in the Prometheus text format
+
+        Returns:
+            str: the metrics
+        """
+        prefix = self.PREFIX
+        nodes = [(_label(name), metrics) for name, metrics in self.nodes.items()]
+        lines = []
+
+        scalars = [
+            ("records_in_total", "counter", "Records processed by the node.",
+             lambda m: m.records_in),
+            ("records_out_total", "counter", "Records returned by the node.",
+             lambda m: m.records_out),
+            ("queue_depth", "gauge", "Records waiting to be processed.",
+             lambda m: m.queue_depth),
+            ("dropped_total", "counter", "Records dropped or coalesced by the queue.",
+             lambda m: m.dropped),
+        ]
+        for name, kind, help_text, value in scalars:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for label, metrics in nodes:
+                lines.append(f'{prefix}_{name}{{node="{label}"}} {value(metrics)}')
+
+        histograms = [
+            ("processing_seconds", "Processing time of each call of the node.",
+             lambda m: m.processing),
+            ("latency_seconds", "Time from the redis id of the oldest record of "
+             "each call to its return.", lambda m: m.latency),
+        ]
+        for name, help_text, histogram in histograms:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for label, metrics in nodes:
+                h = histogram(metrics)
+                for bound, count in h.buckets():
+                    lines.append(
+                        f'{prefix}_{name}_bucket{{node="{label}",le="{bound}"}} {count}'
+                    )
+                lines.append(f'{prefix}_{name}_sum{{node="{label}"}} {h.sum!r}')
+                lines.append(f'{prefix}_{name}_count{{node="{label}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port: int = 9108, host: str = "127.0.0.1") -> None:
+        """Start the HTTP endpoint of the metrics (GET /metrics), in the
+        Prometheus text format
+
+        Args:
+            port (int, optional): the port. Defaults to 9108.
+            host (str, optional): the address. Defaults to "127.0.0.1".
+        """
+        self.server = await asyncio.start_server(self._handle, host, port)
+
+    async def close(self) -> None:
+        """Stop the HTTP endpoint
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer a request to the HTTP endpoint
+
+        Args:
+            reader (asyncio.StreamReader): the request
+            writer (asyncio.StreamWriter): the response
+        """
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and (
+                parts[1] == b"/metrics" or parts[1].startswith(b"/metrics?")
+            ):
+                status = b"200 OK"
+                body = self.prometheus().encode()
+            else:
+                status = b"404 Not Found"
+                body = b"Not found\n"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
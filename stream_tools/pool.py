@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from abc import ABC
+from abc import abstractmethod
+from types import TracebackType
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Type
+from typing import TypeVar
+
+import aioredis
+
+from .client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+P = TypeVar("P", bound="Pool")
+
+
+class Pool(ABC):
+    """Factory of the clients used by streams, nodes and writers: a client
+    shared for the non-blocking commands and a dedicated client for each
+    blocking reader. The clients implement RedisClient.
+    """
+    async def __aenter__(self: P) -> P:
+        """Start the context of the pool, opening the shared client
+
+        Returns:
+            Pool: the initialized pool
+        """
+        await self.client()
+        return self
+
+    async def __aexit__(
+        self,
+        exception_type: Optional[Type[BaseException]],
+        exception: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Exiting the context of the pool closes all its clients
+
+        Args:
+            exception_type (Optional[Type[BaseException]]): the exception type
+            exception (Optional[BaseException]): the exception
+            traceback (Optional[TracebackType]): traceback message
+        """
+        await self.close()
+
+    @abstractmethod
+    async def client(self) -> RedisClient:
+        """Get the client for the non-blocking commands, shared by all
+        the users of the pool
+
+        Returns:
+            RedisClient: the shared client
+        """
+
+    @abstractmethod
+    async def acquire(self) -> RedisClient:
+        """Get a dedicated client for the blocking reads
+
+        Returns:
+            RedisClient: the dedicated client
+        """
+
+    @abstractmethod
+    def release(self, redis: RedisClient) -> None:
+        """Give back a dedicated client
+
+        Args:
+            redis (RedisClient): the dedicated client
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Close the shared client and all the dedicated clients
+        """
+
+
+class RedisPool(Pool):
+    """Factory of the redis clients used by streams and nodes.
+    A single pool of connections is shared for the non-blocking commands,
+    while every blocking reader (every Stream or Streams in its context)
+    holds a dedicated connection, so that the blocking reads never delay
+    the other commands. So a pipeline keeps open one socket per stream
+    context, plus the shared ones.
+    A released dedicated connection is unblocked (CLIENT UNBLOCK) and kept
+    idle, to be reused by the next reader instead of opening a new socket.
+    """
+    def __init__(
+        self,
+        address: str = "redis://localhost",
+        minsize: int = 1,
+        maxsize: int = 10,
+        **settings: Any
+    ) -> None:
+        """Initialize the pool. No connection is opened until needed.
+
+        Args:
+            address (str, optional): the redis server address, either a
+                redis uri ("redis://host:port", "unix:///path/redis.sock")
+                or a unix socket path. Defaults to "redis://localhost".
+            minsize (int, optional): minimum number of connections of the
+                shared pool. Defaults to 1.
+            maxsize (int, optional): maximum number of connections of the
+                shared pool, and of idle dedicated connections.
+                Defaults to 10.
+            **settings: per-connection settings (db, password, ssl,
+                timeout) passed to aioredis
+        """
+        self.address = address
+        self.minsize = int(minsize)
+        self.maxsize = int(maxsize)
+        self.settings = settings
+
+        self.shared: Optional[aioredis.Redis] = None
+        self.connecting: Optional[asyncio.Future[aioredis.Redis]] = None
+        self.dedicated: List[aioredis.Redis] = []
+        # released dedicated connections, ready to be reused, and the ones
+        # being unblocked; the client id of each dedicated connection
+        self.idle: List[aioredis.Redis] = []
+        self.recycling: Dict[aioredis.Redis, asyncio.Future] = {}
+        self.client_ids: Dict[aioredis.Redis, int] = {}
+
+    async def client(self) -> aioredis.Redis:
+        """Get the client for the non-blocking commands, shared by all
+        the users of the pool
+
+        Returns:
+            aioredis.Redis: the shared redis client
+        """
+        shared = self.shared
+        if shared is None:
+            if self.connecting is None:
+                self.connecting = asyncio.ensure_future(
+                    aioredis.create_redis_pool(
+                        self.address,
+                        minsize=self.minsize,
+                        maxsize=self.maxsize,
+                        **self.settings
+                    )
+                )
+            shared = self.shared = await asyncio.shield(self.connecting)
+        return shared
+
+    async def acquire(self) -> aioredis.Redis:
+        """Get a dedicated connection for the blocking reads: an idle
+        connection released by another reader, or a new one
+
+        Returns:
+            aioredis.Redis: the dedicated redis client
+        """
+        while self.idle:
+            redis = self.idle.pop()
+            if not redis.closed:
+                break
+            self.client_ids.pop(redis, None)
+        else:
+            redis = await aioredis.create_redis(self.address, **self.settings)
+            self.client_ids[redis] = await redis.execute(b"CLIENT", b"ID")
+        self.dedicated.append(redis)
+        return redis
+
+    def release(self, redis: RedisClient) -> None:
+        """Give back a dedicated connection. A connection used for blocking
+        reads may still have a pending read, so it is unblocked before it
+        can be reused: until then it is neither idle nor dedicated.
+
+        Args:
+            redis (RedisClient): the dedicated redis client
+        """
+        for connection in self.dedicated:
+            if connection is redis:
+                break
+        else:
+            return
+        self.dedicated.remove(connection)
+        if connection.closed:
+            self._discard(connection)
+        else:
+            self.recycling[connection] = asyncio.ensure_future(
+                self._recycle(connection)
+            )
+
+    async def _recycle(self, redis: aioredis.Redis) -> None:
+        """Unblock the pending read of a released connection, if any, and
+        keep the connection idle, or close it if it is not usable or if
+        there are enough idle connections already
+
+        Args:
+            redis (aioredis.Redis): the dedicated redis client
+        """
+        try:
+            shared = await self.client()
+            await shared.execute(b"CLIENT", b"UNBLOCK", self.client_ids[redis])
+            # the reply follows the one of the pending read, if any
+            await redis.ping()
+        except Exception as e:
+            logger.warning("Dedicated redis connection not reusable: %r", e)
+            self._discard(redis)
+            return
+        finally:
+            self.recycling.pop(redis, None)
+        if len(self.idle) < self.maxsize:
+            self.idle.append(redis)
+        else:
+            self._discard(redis)
+
+    def _discard(self, redis: aioredis.Redis) -> None:
+        """Close a dedicated connection
+
+        Args:
+            redis (aioredis.Redis): the dedicated redis client
+        """
+        redis.close()
+        self.client_ids.pop(redis, None)
+
+    async def close(self) -> None:
+        """Close the shared pool and all the dedicated connections
+        """
+        recycling = dict(self.recycling)
+        for future in recycling.values():
+            future.cancel()
+        await asyncio.gather(*recycling.values(), return_exceptions=True)
+        for redis in self.dedicated + self.idle + list(recycling):
+            self._discard(redis)
+        self.dedicated = []
+        self.idle = []
+        self.recycling = {}
+
+        if self.connecting is not None and self.shared is None:
+            self.shared = await self.connecting
+        if self.shared is not None:
+            self.shared.close()
+            await self.shared.wait_closed()
+        self.shared = None
+        self.connecting = None
@@ -1,37 +1,112 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 
 from collections import OrderedDict
 from types import TracebackType
 from typing import Type
 from typing import Tuple
 from typing import AsyncGenerator
+from typing import Awaitable
+from typing import Callable
+from typing import List
 from typing import Optional
 from typing import TYPE_CHECKING
 
-import aioredis
+from .checkpoint import Checkpoint
+from .group import ConsumerGroup
+from .pool import Pool
+from .pool import RedisPool
+from .utils.channel import Channel
+from .utils.codec import Codec
+from .utils.codec import TextCodec
+from .utils.ids import Position
+from .utils.ids import latest_id
+from .utils.ids import previous_id
+from .utils.ids import to_id
 
 if TYPE_CHECKING:
     StreamValue = OrderedDict[bytes, bytes]
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue[StreamRecord]
+    StreamQueue = Channel[StreamRecord]
 else:
     StreamValue = OrderedDict
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue
+    StreamQueue = Channel
+
+logger = logging.getLogger(__name__)
+
+
+async def stop_readers(readers: List[asyncio.Future]) -> None:
+    """Cancel the readers of the nodes and wait for them, logging the
+    errors of the readers that failed before
+
+    Args:
+        readers (List[asyncio.Future]): the tasks of the readers
+    """
+    for reader in readers:
+        reader.cancel()
+    for reader in readers:
+        try:
+            await reader
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Reader of the stream failed.")
 
 
 class Stream:
     """Class implementing the basic redis stream
     """
-    def __init__(self, stream_name: str) -> None:
+    def __init__(
+        self,
+        stream_name: str,
+        count: int = 1,
+        block: int = 0,
+        group: Optional[ConsumerGroup] = None,
+        pool: Optional[Pool] = None,
+        codec: Optional[Codec] = None,
+        start: Optional[Position] = None,
+    ) -> None:
         """Initialize the Stream
 
         Args:
             stream_name (str): the name of the redis stream
+            count (int, optional): maximum number of entries fetched with
+                a single read. Defaults to 1.
+            block (int, optional): how long (in milliseconds) a read waits
+                for new entries, 0 waits forever. Defaults to 0.
+            group (Optional[ConsumerGroup], optional): read the stream as a
+                consumer of the given group. Defaults to None.
+            pool (Optional[Pool], optional): the pool providing the
+                redis connections, shared with other streams and nodes.
+                Defaults to None (a private pool on redis://localhost).
+            codec (Optional[Codec], optional): the codec of the entries
+                (e.g. Float64Codec for binary numeric entries).
+                Defaults to None (TextCodec).
+            start (Optional[Position], optional): the first position read:
+                b"-" (the first entry), b"$" (the entries added after the
+                start of the reading), an id (included) or a timestamp in
+                milliseconds or a datetime (the entries from that time on).
+                It is not used in consumer group mode. Defaults to None
+                (b"-" for read and read_batch, b"$" for the nodes).
         """
         self.stream_name = str(stream_name)
+        self.count = int(count)
+        self.block = int(block)
+        self.group = group
+        self.pool = pool
+        self.codec = TextCodec() if codec is None else codec
+        self.start = to_id(start) if start is not None else None
+        self.last_id: Optional[bytes] = None
+        self.delivered = 0
+        # checkpoints of the nodes reading the stream, stopped at exit
+        self.checkpoints: List[Checkpoint] = []
+        # readers of the nodes, started in the context and cancelled at exit
+        self.readers: List[asyncio.Future] = []
+        self.starting: List[Callable[[], Awaitable[None]]] = []
+        self.running = False
 
     @property
     def name(self) -> str:
@@ -45,13 +120,23 @@ class Stream:
     async def __aenter__(self) -> Stream:
         """Start the context of the stream.
         Entering in the context will create the connection with
-        the redis server.
+        the redis server: a dedicated connection for the blocking reads
+        and the shared client of the pool for the other commands.
 
         Returns:
             Stream: the initialized stream
         """
-        self.redis = await aioredis.create_redis("redis://localhost")
+        self.own_pool = self.pool is None
+        if self.pool is None:
+            self.pool = RedisPool()
+        self.redis = await self.pool.acquire()
+        self.client = await self.pool.client()
+        if self.group is not None:
+            await self.group.start(self.client, [self.stream_name])
         self.running = True
+        for reader in self.starting:
+            self._start(reader)
+        self.starting = []
         return self
 
     async def __aexit__(
@@ -61,8 +146,10 @@ class Stream:
         traceback: Optional[TracebackType],
     ) -> Optional[bool]:
         """Exiting the context of the stream.
-        While exiting the connection with the redis server
-        will be closed.
+        While exiting the readers of the nodes are cancelled, the
+        checkpoints of the nodes are saved a last time and the dedicated
+        connection with the redis server is given back to the pool, which
+        is closed if it is not shared.
 
         Args:
             exception_type (Optional[Type[BaseException]]): the exception type
@@ -72,9 +159,34 @@ class Stream:
         Returns:
             Optional[bool]: if the context is exited with a runtime error
         """
-        self.redis.close()
+        self.running = False
+        await stop_readers(self.readers)
+        self.readers = []
+        for checkpoint in self.checkpoints:
+            await checkpoint.stop()
+        if self.group is not None:
+            await self.group.stop()
+        pool: Pool = self.pool  # type: ignore
+        pool.release(self.redis)
+        if self.own_pool:
+            await pool.close()
+            self.pool = None
         return bool(isinstance(exception, RuntimeError))
 
+    def _start(self, reader: Callable[[], Awaitable[None]]) -> None:
+        """Start the reader of a node in a new task, cancelled when the
+        context exits. The readers of the nodes created before entering
+        the context are started when entering it.
+
+        Args:
+            reader (Callable[[], Awaitable[None]]): function returning the
+                coroutine of the reader
+        """
+        if self.running:
+            self.readers.append(asyncio.ensure_future(reader()))
+        else:
+            self.starting.append(reader)
+
     async def __aiter__(self) -> Stream:
         """Return the Stream as an iterator.
         Call this with:
@@ -97,23 +209,108 @@ class Stream:
             Iterator[AsyncGenerator[StreamRecord, None]]: generator containing
                 the read value
         """
-        last_message_id = b"0"
+        async for batch in self.read_batch(timeout):
+            for row in batch:
+                yield row
+
+    async def read_batch(
+        self, timeout: int = 1
+    ) -> AsyncGenerator[List[StreamRecord], None]:
+        """Function to provide values from the stream in a async
+        generator fashion, a whole batch (up to `count` entries) at a time.
+        The reading starts from the `start` position (by default the first
+        entry of the stream), or right after `last_id` if the cursor has
+        been already set.
+        In consumer group mode every batch is acknowledged when the
+        next one is requested.
+
+        Args:
+            timeout (int, optional): Timeout in seconds. Defaults to 1.
+
+        Yields:
+            Iterator[AsyncGenerator[List[StreamRecord], None]]: generator
+                containing the list of read values
+        """
+        if self.last_id is None:
+            self.last_id = await self._start_id(b"-")
+
         while self.running:
-            res = await self.redis.xread(
-                [self.stream_name], latest_ids=[last_message_id], count=1
-            )
+            res = await self._fetch(int(timeout * 1000))
 
-            for row in res:
-                last_message_id = row[1]
-                yield row
+            if res:
+                self.last_id = res[-1][1]
+                self.delivered += len(res)
+                yield res
+                for row in res:
+                    self.ack(row)
 
     async def _read(self, queue: StreamQueue) -> None:
-        """Read the last value from the given stream
-        and put it in the async queue.
+        """Read the last values from the given stream
+        and put them in the async queue.
+        The reading starts from the `start` position (by default the entries
+        added after the call), or right after `last_id` if the cursor has
+        been already set. Every read
+        continues from the last delivered entry, so no entry is skipped.
 
         Args:
-            queue (StreamQueue): the queue in which to put the read value
+            queue (StreamQueue): the queue in which to put the read values
         """
+        if self.last_id is None and self.group is None:
+            self.last_id = await self._start_id(b"$")
+
         while True:
-            res = await self.redis.xread([self.stream_name], count=1)
-            await queue.put(res[0])
+            res = await self._fetch(self.block)
+            if res:
+                self.last_id = res[-1][1]
+                self.delivered += len(res)
+                await queue.put_many(res)
+
+    def ack(self, record: StreamRecord) -> None:
+        """Acknowledge a record once it has been processed.
+        It has effect only in consumer group mode.
+
+        Args:
+            record (StreamRecord): the processed record
+        """
+        if self.group is not None:
+            self.group.ack(record[0], record[1])
+
+    async def _fetch(self, timeout: int) -> List[StreamRecord]:
+        """Read the entries following the cursor, or the entries assigned
+        to this consumer in consumer group mode.
+
+        Args:
+            timeout (int): how long (in milliseconds) the read waits for
+                new entries, 0 waits forever
+
+        Returns:
+            List[StreamRecord]: the read entries, decoded by the codec
+        """
+        if self.group is not None:
+            res = await self.group.read(self.redis, self.count, timeout)
+        else:
+            # the cursor is set before the first read
+            last_id: bytes = self.last_id  # type: ignore
+            res = await self.redis.xread(
+                [self.stream_name],
+                timeout=timeout,
+                count=self.count,
+                latest_ids=[last_id],
+            )
+        return self.codec.decode_many(res)
+
+    async def _start_id(self, default: bytes) -> bytes:
+        """The cursor of the first read: the id preceding the start
+        position, so XREAD seeks it directly instead of reading the
+        stream from its first entry
+
+        Args:
+            default (bytes): the position used if no start is set
+
+        Returns:
+            bytes: the redis id
+        """
+        start = self.start if self.start is not None else default
+        if start == b"$":
+            return await latest_id(self.client, self.stream_name)
+        return previous_id(start)
@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 import asyncio
+
 from collections import OrderedDict
+from collections import deque
 from types import TracebackType
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
 from typing import List
 from typing import Type
 from typing import Tuple
@@ -10,42 +17,87 @@ from typing import Optional
 from typing import Union
 from typing import TYPE_CHECKING
 
-import aioredis
-
+from .backfill import Backfill
+from .checkpoint import Checkpoint
+from .group import ConsumerGroup
+from .pool import Pool
+from .pool import RedisPool
 from .stream import Stream
+from .stream import stop_readers
 from .tools.join import Join
 from .tools.merge import Merge
+from .utils.channel import Channel
+from .utils.ids import id_key
+from .utils.ids import latest_id
+from .utils.ids import previous_id
 
 
 if TYPE_CHECKING:
     StreamValue = OrderedDict[bytes, bytes]
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue[StreamRecord]
+    StreamQueue = Channel[StreamRecord]
 else:
-    StreamQueue = asyncio.Queue
+    StreamQueue = Channel
 
 
 class Streams:
     """Implementing a class to manager two or more streams.
     """
-    def __init__(self, stream_list: List[Stream]) -> None:
+    def __init__(
+        self,
+        stream_list: List[Stream],
+        group: Optional[ConsumerGroup] = None,
+        pool: Optional[Pool] = None,
+    ) -> None:
         """Initialize the set of streams.
 
         Args:
-            stream_list (List[Stream]): the list of streams to be managed
+            stream_list (List[Stream]): the list of streams to be managed,
+                Backfill streams are read from their history
+            group (Optional[ConsumerGroup], optional): read the streams as a
+                consumer of the given group. Defaults to None.
+            pool (Optional[Pool], optional): the pool providing the
+                redis connections, shared with other streams and nodes.
+                Defaults to None (a private pool on redis://localhost).
+
+        Raises:
+            ValueError: in case of Backfill streams in consumer group mode
         """
+        if group is not None and any(isinstance(s, Backfill) for s in stream_list):
+            raise ValueError("Backfill streams can not be read by a group.")
         self.stream_list = list(stream_list)
         self.stream_names = [s.name for s in stream_list]
+        self.group = group
+        self.pool = pool
+        self.last_ids: Dict[bytes, bytes] = {}
+        self.delivered = 0
+        # checkpoints of the joins, stopped at exit
+        self.checkpoints: List[Checkpoint] = []
+        # readers of the nodes, started in the context and cancelled at exit
+        self.readers: List[asyncio.Future] = []
+        self.starting: List[Callable[[], Awaitable[None]]] = []
+        self.running = False
 
     async def __aenter__(self) -> Streams:
         """Start the context of the set of streams.
         Entering the context will create the connection with
-        the redis server
+        the redis server: a dedicated connection for the blocking reads
+        and the shared client of the pool for the other commands.
 
         Returns:
             Streams: the initialized set of streams
         """
-        self.redis = await aioredis.create_redis("redis://localhost")
+        self.own_pool = self.pool is None
+        if self.pool is None:
+            self.pool = RedisPool()
+        self.redis = await self.pool.acquire()
+        self.client = await self.pool.client()
+        if self.group is not None:
+            await self.group.start(self.client, self.stream_names)
+        self.running = True
+        for reader in self.starting:
+            self._start(reader)
+        self.starting = []
 
         return self
 
@@ -56,8 +108,10 @@ class Streams:
         traceback: Optional[TracebackType],
     ) -> Optional[bool]:
         """Exiting the context of the streams.
-        While exiting the connection with the redis server
-        will be closed.
+        While exiting the readers of the nodes are cancelled, the
+        checkpoints of the joins are saved a last time and the dedicated
+        connection with the redis server is given back to the pool, which
+        is closed if it is not shared.
 
         Args:
             exception_type (Optional[Type[BaseException]]): the exception type
@@ -67,21 +121,59 @@ class Streams:
         Returns:
             Optional[bool]: if the context is exited with a runtime error
         """
-        self.redis.close()
+        self.running = False
+        await stop_readers(self.readers)
+        self.readers = []
+        for checkpoint in self.checkpoints:
+            await checkpoint.stop()
+        if self.group is not None:
+            await self.group.stop()
+        pool: Pool = self.pool  # type: ignore
+        pool.release(self.redis)
+        if self.own_pool:
+            await pool.close()
+            self.pool = None
         return bool(isinstance(exception, RuntimeError))
 
-    def merge(self) -> Merge:
+    def _start(self, reader: Callable[[], Awaitable[None]]) -> None:
+        """Start the reader of a node in a new task, cancelled when the
+        context exits. The readers of the nodes created before entering
+        the context are started when entering it.
+
+        Args:
+            reader (Callable[[], Awaitable[None]]): function returning the
+                coroutine of the reader
+        """
+        if self.running:
+            self.readers.append(asyncio.ensure_future(reader()))
+        else:
+            self.starting.append(reader)
+
+    def merge(self, **kwargs: Any) -> Merge:
         """Return a merger as an iterator.
         > async value in streams.merge():
         >    print value
 
+        Args:
+            **kwargs: further options of the merger (e.g. maxsize, overflow,
+                ordered, wait)
+
         Returns:
             Merge: the initialized merge class (an iterator)
         """
-        merger = Merge(self.redis, self._reads)
+        merger = Merge(
+            self.client,
+            self._reads,
+            ack=self.ack,
+            start=self._start,
+            streams=[stream_name.encode() for stream_name in self.stream_names],
+            **kwargs,
+        )
         return merger
 
-    def join(self, join_method: str, *args: Union[int, float]) -> Join:
+    def join(
+        self, join_method: str, *args: Union[int, float], **kwargs: Any
+    ) -> Join:
         """Return a joiner as an iterator.
         > async value in streams.join('join_method', arg):
         >   print(value)
@@ -89,20 +181,165 @@ class Streams:
         Args:
             join_method (str): the join method.
                 See ref to Join for more details
+            **kwargs: further options of the joiner (e.g. maxsize, overflow)
 
         Returns:
             Join: the initialized joiner class (an iterator)
         """
-        joiner = Join(self.redis, self._reads, join_method, *args)
+        joiner = Join(
+            self.client,
+            self._reads,
+            join_method,
+            *args,
+            ack=self.ack,
+            start=self._start,
+            last_ids=self.last_ids,
+            streams=[stream_name.encode() for stream_name in self.stream_names],
+            **kwargs,
+        )
+        if joiner.checkpoint is not None:
+            self.checkpoints.append(joiner.checkpoint)
         return joiner
 
     async def _reads(self, queue: StreamQueue) -> None:
-        """Read the last value out of all streams included in the set
-        of streams and put it in the async queue
+        """Read the last values out of all streams included in the set
+        of streams and put them in the async queue.
+        Each stream keeps its own cursor (see `last_ids`), so every read
+        continues from the last entry delivered for that stream, and its
+        entries are decoded by its codec. The reading of each stream starts
+        from its `start` position (by default the entries added after the
+        call).
+        The streams are read in rounds: a round delivers up to `count`
+        entries of each stream (the count of the Stream), so a busy stream
+        takes a share of the round proportional to its count and can not
+        starve the others. The entries read beyond the share of a stream
+        wait for the next rounds, and the stream is not read again until
+        they are delivered.
+        The history of the Backfill streams is delivered first (see
+        `_backfill`), then only the streams following it are read.
 
         Args:
-            queue (StreamQueue): the queue in which to put the read value
+            queue (StreamQueue): the queue in which to put the read values
         """
+        shares = {
+            stream.name.encode(): max(stream.count, 1)
+            for stream in self.stream_list
+        }
+        count = max(shares.values())
+        codecs = {stream.name.encode(): stream.codec for stream in self.stream_list}
+
+        if self.group is not None:
+            while True:
+                res = await self.group.read(self.redis, count, 0)
+                res = [(r[0], r[1], codecs[r[0]].decode(r[2])) for r in res]
+                self.delivered += len(res)
+                await queue.put_many(res)
+
+        backfills = {
+            stream.name.encode(): stream
+            for stream in self.stream_list
+            if isinstance(stream, Backfill)
+        }
+        for stream in self.stream_list:
+            key = stream.name.encode()
+            if key not in self.last_ids and key not in backfills:
+                if stream.start is None or stream.start == b"$":
+                    self.last_ids[key] = await latest_id(self.client, stream.name)
+                else:
+                    self.last_ids[key] = previous_id(stream.start)
+        if backfills:
+            await self._backfill(queue, list(backfills.values()))
+
+        keys = [
+            stream_name.encode()
+            for stream_name in self.stream_names
+            if stream_name.encode() not in backfills
+            or backfills[stream_name.encode()].follow
+        ]
+        if not keys:
+            return
+        backlog: Dict[bytes, Deque[StreamRecord]] = {key: deque() for key in keys}
+
         while True:
-            res = await self.redis.xread(self.stream_names, count=1)
-            await queue.put(res[0])
+            idle = [key for key in keys if not backlog[key]]
+            if idle:
+                # block only when no stream has entries to deliver
+                res = await self.redis.xread(
+                    [key.decode() for key in idle],
+                    timeout=0 if len(idle) == len(keys) else None,
+                    count=count,
+                    latest_ids=[self.last_ids[key] for key in idle],
+                )
+                for row in res:
+                    backlog[row[0]].append(
+                        (row[0], row[1], codecs[row[0]].decode(row[2]))
+                    )
+
+            batch: List[StreamRecord] = []
+            for key in keys:
+                entries = backlog[key]
+                share = min(shares[key], len(entries))
+                if share:
+                    batch.extend(entries.popleft() for _ in range(share))
+                    self.last_ids[key] = batch[-1][1]
+            self.delivered += len(batch)
+            await queue.put_many(batch)
+
+    async def _backfill(self, queue: StreamQueue, backfills: List[Backfill]) -> None:
+        """Read the history of the Backfill streams and put it in the async
+        queue in id order. The pages of the streams are fetched together,
+        and the entries are delivered up to the smallest last id of the
+        pages, since the next pages can only contain later entries. Then
+        the cursors of the streams are set right after their history.
+
+        Args:
+            queue (StreamQueue): the queue in which to put the read values
+            backfills (List[Backfill]): the Backfill streams
+        """
+        pages: Dict[bytes, Deque[StreamRecord]] = {
+            stream.name.encode(): deque() for stream in backfills
+        }
+        size = max(stream.page for stream in backfills)
+
+        while True:
+            fetching = [
+                stream for stream in backfills
+                if not stream.done and not pages[stream.name.encode()]
+            ]
+            res = await asyncio.gather(
+                *(stream._page(self.redis) for stream in fetching)
+            )
+            for stream, page in zip(fetching, res):
+                pages[stream.name.encode()].extend(page)
+
+            # a stream with more pages has fetched a whole page
+            bounds = [
+                id_key(pages[stream.name.encode()][-1][1])
+                for stream in backfills
+                if not stream.done
+            ]
+            bound = min(bounds) if bounds else None
+            ready = []
+            for entries in pages.values():
+                while entries and (bound is None or id_key(entries[0][1]) <= bound):
+                    ready.append(entries.popleft())
+            if ready:
+                ready.sort(key=lambda res: id_key(res[1]))
+                self.delivered += len(ready)
+                await queue.put_many(ready)
+                await queue.drain(size)
+            if bound is None:
+                break
+
+        for stream in backfills:
+            self.last_ids[stream.name.encode()] = stream.live_id()
+
+    def ack(self, record: StreamRecord) -> None:
+        """Acknowledge a record once it has been processed.
+        It has effect only in consumer group mode.
+
+        Args:
+            record (StreamRecord): the processed record
+        """
+        if self.group is not None:
+            self.group.ack(record[0], record[1])
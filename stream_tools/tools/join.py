@@ -1,17 +1,35 @@
 from __future__ import annotations
 import asyncio
+import heapq
+import time
 
 from collections import OrderedDict
+from collections import deque
+from typing import Awaitable
 from typing import Callable
+from typing import Deque
 from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
 from typing import Tuple
 from typing import Union
 from typing import TYPE_CHECKING
 
-import aioredis
+import numpy as np  # type: ignore
 
+from ..checkpoint import Checkpoint
+from ..checkpoint import pack_bytes
+from ..checkpoint import unpack_bytes
+from ..client import RedisClient
+from ..metrics import MetricsRegistry
+from ..utils.channel import Channel
+from .state import PersistentState
+from .state import StateView
 
 JOIN = ["update_state", "time_catch", "timeframe"]
+EMIT = ["state", "delta", "snapshot"]
 
 
 StateTime = Dict[bytes, int]
@@ -19,59 +37,211 @@ StateTime = Dict[bytes, int]
 if TYPE_CHECKING:
     StreamValue = OrderedDict[bytes, bytes]
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue[StreamRecord]
+    StreamQueue = Channel[StreamRecord]
     State = Dict[bytes, Tuple[bytes, OrderedDict[bytes, bytes]]]
 else:
     StreamValue = OrderedDict
     StreamRecord = Tuple[bytes, bytes, StreamValue]
-    StreamQueue = asyncio.Queue
+    StreamQueue = Channel
     State = Dict[bytes, Tuple[bytes, OrderedDict]]
 
+# the updated streams of the state and the streams removed from it
+StateDelta = Tuple[State, List[bytes]]
+JoinOutput = Union[State, StateDelta, StateView]
+Arrays = Dict[str, np.ndarray]
+
 
 class Join:
     """Joiner class. Join data from two or more streams
     """
     def __init__(
         self,
-        redis: aioredis.Redis,
+        redis: RedisClient,
         reader: Callable,
         join: str,
-        *args: Union[int, float]
+        *args: Union[int, float],
+        ack: Optional[Callable] = None,
+        start: Optional[Callable] = None,
+        maxsize: int = 0,
+        overflow: str = "block",
+        emit: str = "state",
+        checkpoint: Optional[Checkpoint] = None,
+        last_ids: Optional[Dict[bytes, bytes]] = None,
+        streams: Optional[List[bytes]] = None,
+        metrics: Optional[MetricsRegistry] = None,
     ) -> None:
         """Initialize the joiner and start running the reader function
 
         Args:
-            redis (aioredis.Redis): the redis instance
+            redis (RedisClient): the redis instance
             reader (Callable): reader function that will send values
                 to the internal queue
             join (str): the join method
+            ack (Optional[Callable], optional): function called with each
+                record once it has been joined. Defaults to None.
+            start (Optional[Callable], optional): function starting the
+                reader function in a task, e.g. to cancel it when the
+                streams exit. Defaults to None (a new task).
+            maxsize (int, optional): capacity of the internal queue, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). "coalesce" keeps only the latest
+                record of each stream. Defaults to "block".
+            emit (str, optional): what the update-state and time-catch joins
+                return. "state" is the joined state, updated in place by the
+                next values. "delta" is a tuple of the updated streams and
+                of the streams removed from the state since the last output.
+                "snapshot" is a read-only view of the state that is not
+                changed by the next values. Defaults to "state".
+            checkpoint (Optional[Checkpoint], optional): save the state
+                periodically, and restore it at start, reading each stream
+                right after its last record applied to the state.
+                Defaults to None.
+            last_ids (Optional[Dict[bytes, bytes]], optional): the cursors
+                of the streams read by the reader, set from the checkpoint.
+                Defaults to None.
+            streams (Optional[List[bytes]], optional): names of the joined
+                streams, used in the node name. Defaults to None.
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node. Defaults to None.
+
+        The time-catch join takes the time window in seconds. The timeframe
+        join takes the timeframe in seconds and, optionally, the allowed
+        lateness in seconds (defaults to None: the windows wait for all the
+        streams).
 
         Raises:
-            ValueError: in case the join method passed is not a str type
-            TypeError: in case no time window are provided for time-catch join
+            ValueError: in case the join method passed is not a str type,
+                or of unknown emit mode
+            TypeError: in case no time window are provided for time-catch
+                or timeframe join
         """
         self.redis = redis
         self.reader = reader
+        self.ack = ack
+        self.start = start
 
         if join in JOIN:
             self.join = str(join)
         else:
             raise ValueError("Wrong join type.")
+        if emit not in EMIT:
+            raise ValueError("Wrong emit mode.")
+        self.emit = emit
+        self.args = args
+        self.streams = list(streams or [])
+        # streams removed from the state since the last delta
+        self.evicted: Optional[List[bytes]] = [] if emit == "delta" else None
 
         if join == "time_catch":
             if len(args) == 0:
                 raise TypeError("No time window provided.")
 
             self.window = float(args[0]) * 1000
-            self.state: State = {}
+            self.state: State = self._new_state()
             self.state_time: StateTime = {}
+            # min-heap of (timestamp, stream name) of the stored states,
+            # entries of states updated after them are skipped lazily
+            self.expiry: List[Tuple[int, bytes]] = []
 
         if join == "update_state":
-            self.state = {}
+            self.state = self._new_state()
             self.state_time = {}
 
-        self.queue: StreamQueue = asyncio.Queue()
-        asyncio.ensure_future(self.reader(self.queue))
+        if join == "timeframe":
+            if len(args) == 0:
+                raise TypeError("No timeframe provided.")
+
+            self.frame = max(int(float(args[0]) * 1000), 1)
+            self.lateness: Optional[int] = (
+                int(float(args[1]) * 1000)
+                if len(args) > 1 and args[1] is not None
+                else None
+            )
+            # open windows by start time (ms), with the heap of their starts
+            self.windows: Dict[int, State] = {}
+            self.starts: List[int] = []
+            # latest timestamp of each stream and the slowest stream
+            self.latest: StateTime = {}
+            self.slowest: Optional[bytes] = None
+            # joined streams with no observation yet, holding the watermark
+            self.unseen: Set[bytes] = set(self.streams)
+            self.newest = 0
+            # windows ending before the watermark are closed
+            self.watermark = 0
+            self.late = 0
+            self.closed: Deque[State] = deque()
+
+        self.checkpoint = checkpoint
+        self.last_ids = last_ids
+        # redis id of the last record of each stream applied to the state
+        self.consumed: Dict[bytes, bytes] = {}
+
+        self.queue: StreamQueue = Channel(maxsize, overflow)
+        self.pending: Deque[StreamRecord] = deque()
+        self.metrics = None if metrics is None else metrics.register(
+            self.node_name, self.queue, self._queued
+        )
+        if checkpoint is None:
+            self._start(lambda: self.reader(self.queue))
+        else:
+            self._start(self._resume)
+
+    def _start(self, reader: Callable[[], Awaitable[None]]) -> None:
+        """Start the reading of the streams
+
+        Args:
+            reader (Callable[[], Awaitable[None]]): function returning the
+                coroutine of the reader
+        """
+        if self.start is None:
+            asyncio.ensure_future(reader())
+        else:
+            self.start(reader)
+
+    def _new_state(self) -> State:
+        """The empty state of the join, with copy-on-write snapshots for
+            the snapshot mode
+
+        Returns:
+            State: the empty state
+        """
+        if self.emit == "snapshot":
+            return PersistentState()  # type: ignore
+        return {}
+
+    def _output(self, updated: Iterable[bytes]) -> JoinOutput:
+        """The output of the join for the emit mode
+
+        Args:
+            updated (Iterable[bytes]): the streams updated since the last
+                output
+
+        Returns:
+            JoinOutput: the state, its delta or a snapshot of it
+        """
+        if self.emit == "state":
+            return self.state
+        if self.emit == "snapshot":
+            return self.state.snapshot()  # type: ignore
+        state = self.state
+        changes = {k: state[k] for k in updated if k in state}
+        # the evicted keys are tracked in delta mode
+        keys: List[bytes] = self.evicted  # type: ignore
+        evicted = [k for k in dict.fromkeys(keys) if k not in state]
+        self.evicted = []
+        return changes, evicted
+
+    @property
+    def node_name(self) -> str:
+        """The node name getter
+
+        Returns:
+            str: the node name
+        """
+        names = ",".join(s.decode() for s in self.streams)
+        args = ", ".join(str(arg) for arg in self.args)
+        return f"{self.join}_join({names})[{args}]"
 
     def __aiter__(self) -> Join:
         """Get the joiner iterator
@@ -81,32 +251,39 @@ class Join:
         """
         return self
 
-    async def __anext__(self) -> State:
+    async def __anext__(self) -> JoinOutput:
         """Get the next joined value from the streams
 
         Returns:
-            State: the updated state as a result of the join
+            JoinOutput: the updated state as a result of the join, or its
+                delta or snapshot (see emit)
         """
         if self.join == "time_catch":
             res = await self.time_catch()
         elif self.join == "update_state":
             res = await self.update_state()
-        # elif self.join == 'timeframe':
-        #     res = await self.timeframe()  # TODO
+        else:
+            res = await self.timeframe()
         return res
 
-    async def time_catch(self) -> State:
+    async def time_catch(self) -> JoinOutput:
         """Get the new value from the queue and push it to
             the (timed) state
 
         Returns:
-            State: the updated state as a result of the timed join
+            JoinOutput: the updated state as a result of the timed join
         """
-        res = await self.queue.get()
+        res = await self._next_record()
+        started = time.perf_counter()
 
         self._time_store_state(res[0], res[1], res[2])
+        if self.ack is not None:
+            self.ack(res)
 
-        return self.state
+        output = self._output((res[0],))
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, res[1])
+        return output
 
     def _time_store_state(
         self,
@@ -117,6 +294,8 @@ class Join:
         """Update the joiner state and the timestamp of the last state
             for new observation from the streams, and remove state too
             old if compared from the provided time window.
+            The states are expired in time order from a min-heap, so an
+            observation costs O(log n) with n joined streams.
 
         Args:
             state_key (bytes): the stream name of the new observation
@@ -125,25 +304,190 @@ class Join:
                 new observation
         """
         self.state[state_key] = (state_id, state_value)
+        self.consumed[state_key] = state_id
 
-        new_state_time = int(state_id.decode().split("-")[0])
-        self.state_time[state_key] = new_state_time
+        new_state_time = int(state_id.split(b"-", 1)[0])
+        state_time = self.state_time
+        state_time[state_key] = new_state_time
+        expiry = self.expiry
+        heapq.heappush(expiry, (new_state_time, state_key))
 
         # remove state props too old if compared with the given window
-        for k in self.state_time:
-            if new_state_time - self.state_time[k] > self.window:
+        oldest = new_state_time - self.window
+        while expiry and expiry[0][0] < oldest:
+            old_time, k = heapq.heappop(expiry)
+            if state_time.get(k) == old_time:
                 del self.state[k]
+                del state_time[k]
+                if self.evicted is not None:
+                    self.evicted.append(k)
+
+        # drop the skipped entries when they outnumber the states
+        if len(expiry) > 2 * len(state_time) + 64:
+            self.expiry = [(t, k) for k, t in state_time.items()]
+            heapq.heapify(self.expiry)
 
-    async def update_state(self) -> State:
+    async def update_state(self) -> JoinOutput:
         """Get the new value from the queue and push it to
             the (timed) state
 
         Returns:
-            State: the updated state as a result of the plain join
+            JoinOutput: the updated state as a result of the plain join
         """
-        res = await self.queue.get()
+        res = await self._next_record()
+        started = time.perf_counter()
         self._store_state(res[0], res[1], res[2])
-        return self.state
+        if self.ack is not None:
+            self.ack(res)
+        output = self._output((res[0],))
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, res[1])
+        return output
+
+    async def timeframe(self) -> State:
+        """Get the new values from the queue until a window is closed
+
+        Returns:
+            State: the last record of each stream in the closed window
+        """
+        while not self.closed:
+            res = await self._next_record()
+            started = time.perf_counter()
+            self._window_store_state(res[0], res[1], res[2])
+            if self.ack is not None:
+                self.ack(res)
+            if self.metrics is not None:
+                self.metrics.observe(1, 0, started, res[1])
+        if self.metrics is not None:
+            self.metrics.records_out += 1
+        return self.closed.popleft()
+
+    def _window_store_state(
+        self,
+        state_key: bytes,
+        state_id: bytes,
+        state_value: StreamValue,
+    ) -> None:
+        """Store a new observation in the tumbling window of its redis id
+            and close the windows ending before the watermark. The watermark
+            is the latest time reached by all the streams (it does not move
+            until every joined stream has an observation). With a lateness
+            it is never more than `lateness` behind the newest observation,
+            so slow streams can not keep the windows open. Observations of
+            closed windows are dropped.
+
+        Args:
+            state_key (bytes): the stream name of the new observation
+            state_id (bytes): redis id (timestamp) of the new observation
+            state_value (StreamValue): fields-values included in the new
+                observation
+        """
+        self.consumed[state_key] = state_id
+        new_state_time = int(state_id.split(b"-", 1)[0])
+        start = new_state_time - new_state_time % self.frame
+        if start + self.frame <= self.watermark:
+            self.late += 1
+            return
+
+        window = self.windows.get(start)
+        if window is None:
+            window = self.windows[start] = {}
+            heapq.heappush(self.starts, start)
+        window[state_key] = (state_id, state_value)
+
+        latest = self.latest
+        if new_state_time > latest.get(state_key, -1):
+            if state_key not in latest:
+                self.unseen.discard(state_key)
+            latest[state_key] = new_state_time
+            # the slowest stream is searched again only when it moves
+            if self.slowest is None or self.slowest == state_key:
+                self.slowest = min(latest, key=latest.__getitem__)
+            elif new_state_time < latest[self.slowest]:
+                self.slowest = state_key
+        if new_state_time > self.newest:
+            self.newest = new_state_time
+
+        watermark = self.watermark
+        if not self.unseen:
+            watermark = latest[self.slowest]  # type: ignore
+        if self.lateness is not None:
+            watermark = max(watermark, self.newest - self.lateness)
+        if watermark > self.watermark:
+            self.watermark = watermark
+        while self.starts and self.starts[0] + self.frame <= self.watermark:
+            self.closed.append(self.windows.pop(heapq.heappop(self.starts)))
+
+    async def next_batch(self) -> Union[JoinOutput, List[State]]:
+        """Wait for new values and push all of them to the state
+            with a single wakeup
+
+        Returns:
+            Union[JoinOutput, List[State]]: the updated state after the
+                whole batch has been joined (or its delta or snapshot, see
+                emit), or the windows closed by the batch for the timeframe
+                join
+        """
+        if self.join == "timeframe":
+            while not self.closed:
+                if self.pending:
+                    batch = list(self.pending)
+                    self.pending.clear()
+                else:
+                    batch = await self.queue.get_batch()
+                started = time.perf_counter()
+                for res in batch:
+                    self._window_store_state(res[0], res[1], res[2])
+                if self.ack is not None:
+                    for res in batch:
+                        self.ack(res)
+                if self.metrics is not None:
+                    self.metrics.observe(len(batch), 0, started, batch[0][1])
+            closed = list(self.closed)
+            self.closed.clear()
+            if self.metrics is not None:
+                self.metrics.records_out += len(closed)
+            return closed
+
+        if self.pending:
+            batch = list(self.pending)
+            self.pending.clear()
+        else:
+            batch = await self.queue.get_batch()
+
+        started = time.perf_counter()
+        if self.join == "time_catch":
+            store = self._time_store_state
+        else:
+            store = self._store_state
+        for res in batch:
+            store(res[0], res[1], res[2])
+        if self.ack is not None:
+            for res in batch:
+                self.ack(res)
+        output = self._output(res[0] for res in batch)
+        if self.metrics is not None:
+            self.metrics.observe(len(batch), 1, started, batch[0][1])
+        return output
+
+    async def _next_record(self) -> StreamRecord:
+        """Get the next record, waiting for a new batch from the queue
+            only when the already received ones have been consumed
+
+        Returns:
+            StreamRecord: the next record from the streams
+        """
+        if not self.pending:
+            self.pending.extend(await self.queue.get_batch())
+        return self.pending.popleft()
+
+    def _queued(self) -> int:
+        """Number of records waiting to be joined
+
+        Returns:
+            int: the number of records
+        """
+        return self.queue.qsize() + len(self.pending)
 
     def _store_state(
         self, state_key: bytes, state_id: bytes, state_value: StreamValue
@@ -158,5 +502,116 @@ class Join:
                 observation
         """
         self.state[state_key] = (state_id, state_value)
-        new_state_time = int(state_id.decode().split("-")[0])
+        self.consumed[state_key] = state_id
+        new_state_time = int(state_id.split(b"-", 1)[0])
         self.state_time[state_key] = new_state_time
+
+    def dump(self) -> Arrays:
+        """Copy the state of the join for a checkpoint: the stored records
+            (or the records of the windows), the last record applied of each
+            stream and, for the timeframe join, its clock. The values are
+            saved as bytes.
+
+        Returns:
+            Arrays: the arrays of the checkpoint
+        """
+        if self.join == "timeframe":
+            windows = list(self.closed) + list(self.windows.values())
+            entries = [(k, v) for window in windows for k, v in window.items()]
+        else:
+            entries = list(self.state.items())
+
+        names: List[bytes] = []
+        values: List[bytes] = []
+        for _, (_, value) in entries:
+            for field, field_value in value.items():
+                names.append(field)
+                if not isinstance(field_value, bytes):
+                    field_value = str(field_value).encode()
+                values.append(field_value)
+        arrays: Arrays = {
+            "sizes": np.array([len(v[1]) for _, v in entries], dtype=np.int64),
+        }
+        columns = {
+            "streams": [k for k, _ in entries],
+            "ids": [v[0] for _, v in entries],
+            "names": names,
+            "values": values,
+            "consumed_streams": list(self.consumed),
+            "consumed_ids": list(self.consumed.values()),
+        }
+        if self.join == "timeframe":
+            columns["latest_streams"] = list(self.latest)
+            arrays["latest_times"] = np.array(
+                list(self.latest.values()), dtype=np.int64
+            )
+            arrays["clock"] = np.array(
+                [self.newest, self.watermark, self.late], dtype=np.int64
+            )
+        for column, items in columns.items():
+            arrays[column], arrays[f"{column}_offsets"] = pack_bytes(items)
+        return arrays
+
+    def load(self, arrays: Arrays) -> None:
+        """Restore the state of the join from a checkpoint
+
+        Args:
+            arrays (Arrays): the arrays of the checkpoint
+        """
+        def column(name: str) -> List[bytes]:
+            return unpack_bytes(arrays[name], arrays[f"{name}_offsets"])
+
+        names = iter(column("names"))
+        values = iter(column("values"))
+        entries = [
+            (stream, (idx, OrderedDict(
+                (next(names), next(values)) for _ in range(size)
+            )))
+            for stream, idx, size in zip(
+                column("streams"), column("ids"), arrays["sizes"].tolist()
+            )
+        ]
+        self.consumed = dict(zip(column("consumed_streams"), column("consumed_ids")))
+
+        if self.join != "timeframe":
+            for stream, (idx, value) in entries:
+                self.state[stream] = (idx, value)
+                self.state_time[stream] = int(idx.split(b"-", 1)[0])
+            if self.join == "time_catch":
+                self.expiry = [(t, k) for k, t in self.state_time.items()]
+                heapq.heapify(self.expiry)
+            return
+
+        self.newest, self.watermark, self.late = arrays["clock"].tolist()
+        self.latest = dict(
+            zip(column("latest_streams"), arrays["latest_times"].tolist())
+        )
+        self.slowest = (
+            min(self.latest, key=self.latest.__getitem__) if self.latest else None
+        )
+        self.unseen = set(self.streams) - set(self.latest)
+        windows: Dict[int, State] = {}
+        for stream, (idx, value) in entries:
+            state_time = int(idx.split(b"-", 1)[0])
+            start = state_time - state_time % self.frame
+            windows.setdefault(start, {})[stream] = (idx, value)
+        for start in sorted(windows):
+            if start + self.frame <= self.watermark:
+                self.closed.append(windows[start])
+            else:
+                self.windows[start] = windows[start]
+                heapq.heappush(self.starts, start)
+
+    async def _resume(self) -> None:
+        """Restore the state from the checkpoint, if any, start saving the
+            checkpoints and read the streams right after the last records
+            of the checkpoint
+        """
+        checkpoint: Checkpoint = self.checkpoint  # type: ignore
+        arrays = await checkpoint.load(self.redis)
+        if arrays is not None:
+            self.load(arrays)
+            if self.last_ids is not None:
+                self.last_ids.update(self.consumed)
+        checkpoint.start(self.redis, self.dump)
+        await self.reader(self.queue)
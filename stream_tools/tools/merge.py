@@ -1,38 +1,145 @@
 from __future__ import annotations
 import asyncio
+import heapq
+import time
 
 from collections import OrderedDict
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import Callable
 from typing import TYPE_CHECKING
 
-import aioredis
-
+from ..client import RedisClient
+from ..metrics import MetricsRegistry
+from ..utils.channel import Channel
+from ..utils.ids import id_key
 
 if TYPE_CHECKING:
     StreamRecord = Tuple[bytes, bytes, OrderedDict[bytes, bytes]]
-    StreamQueue = asyncio.Queue[StreamRecord]
+    StreamQueue = Channel[StreamRecord]
 else:
     StreamRecord = Tuple[bytes, bytes, OrderedDict]
-    StreamQueue = asyncio.Queue
+    StreamQueue = Channel
+
+# timestamp, sequence number and stream name: the order of the records
+RecordKey = Tuple[int, int, bytes]
+
+
+def _record_key(record: StreamRecord) -> RecordKey:
+    """Sorting key of a record, by redis id and then by stream name
+
+    Args:
+        record (StreamRecord): the record
+
+    Returns:
+        RecordKey: the timestamp, the sequence number and the stream name
+    """
+    ms, seq = id_key(record[1])
+    return ms, seq, record[0]
 
 
 class Merge:
     """Merger class. Merge in a single row values received
     from two or more streams
     """
-    def __init__(self, redis: aioredis.Redis, reader: Callable) -> None:
+    def __init__(
+        self,
+        redis: RedisClient,
+        reader: Callable,
+        ack: Optional[Callable] = None,
+        start: Optional[Callable] = None,
+        maxsize: int = 0,
+        overflow: str = "block",
+        ordered: bool = False,
+        streams: Optional[List[bytes]] = None,
+        wait: Optional[float] = 1.0,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
         """Initialize the merger and start running the reader function
 
         Args:
-            redis (aioredis.Redis): the redis instance
+            redis (RedisClient): the redis instance
             reader (Callable): reader function that will
                 send merged the parameters to the internal queue
+            ack (Optional[Callable], optional): function called with each
+                record once it has been returned. Defaults to None.
+            start (Optional[Callable], optional): function starting the
+                reader function in a task, e.g. to cancel it when the
+                streams exit. Defaults to None (a new task).
+            maxsize (int, optional): capacity of the internal queue, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): policy applied when the internal queue
+                is full (see Channel). Defaults to "block".
+            ordered (bool, optional): return the records in redis id order
+                across the streams, instead of in arrival order.
+                Defaults to False.
+            streams (Optional[List[bytes]], optional): names of the merged
+                streams, needed by the ordered merge and used in the node
+                name. Defaults to None.
+            wait (Optional[float], optional): maximum time in seconds a
+                record of the ordered merge waits for the streams behind it,
+                None means no limit. Defaults to 1.0.
+            metrics (Optional[MetricsRegistry], optional): registry in which
+                to record the metrics of the node. Defaults to None.
+
+        The ordered merge returns a record when all the streams moved past
+        its id (the watermark), or when it waited too long for a silent
+        stream: records of that stream older than the returned ones are
+        then returned as soon as they arrive, and counted in `late`.
+
+        Raises:
+            TypeError: in case the ordered merge has no stream names
         """
         self.redis = redis
         self.reader = reader
-        self.queue: StreamQueue = asyncio.Queue()
-        asyncio.ensure_future(self.reader(self.queue))
+        self.ack = ack
+        self.start = start
+        self.ordered = ordered
+        self.streams = list(streams or [])
+        if ordered:
+            if not streams:
+                raise TypeError("No streams provided for the ordered merge.")
+            self.wait = wait
+            # buffered keys and records of each stream, and the heap of
+            # the first buffered key of each stream
+            self.buffers: Dict[bytes, Deque[Tuple[RecordKey, StreamRecord]]] = {
+                s: deque() for s in streams
+            }
+            self.heads: List[Tuple[RecordKey, bytes]] = []
+            # redis id of the last record of each stream, with their
+            # min-heap: entries of streams that moved are skipped lazily
+            self.latest: Dict[bytes, Tuple[int, int]] = {s: (-1, -1) for s in streams}
+            self.lagging: List[Tuple[Tuple[int, int], bytes]] = [
+                (k, s) for s, k in self.latest.items()
+            ]
+            heapq.heapify(self.lagging)
+            # arrival time and key of the buffered records, in arrival order
+            self.arrivals: Deque[Tuple[float, RecordKey]] = deque()
+            self.released: RecordKey = (-1, -1, b"")
+            self.late = 0
+        self.queue: StreamQueue = Channel(maxsize, overflow)
+        self.pending: Deque[StreamRecord] = deque()
+        self.metrics = None if metrics is None else metrics.register(
+            self.node_name, self.queue, self._queued
+        )
+        if start is None:
+            asyncio.ensure_future(self.reader(self.queue))
+        else:
+            start(lambda: self.reader(self.queue))
+
+    @property
+    def node_name(self) -> str:
+        """The node name getter
+
+        Returns:
+            str: the node name
+        """
+        names = ",".join(s.decode() for s in self.streams)
+        return f"{'ordered_' if self.ordered else ''}merge({names})"
 
     def __aiter__(self) -> Merge:
         """Get the merge iterator
@@ -48,5 +155,136 @@ class Merge:
         Returns:
             StreamRecord: return the element from the streams
         """
-        res = await self.queue.get()
-        return res  # yield?
+        if self.ordered:
+            while not self.pending:
+                await self._fill()
+        elif not self.pending:
+            self.pending.extend(await self.queue.get_batch())
+        started = time.perf_counter()
+        res = self.pending.popleft()
+        if self.ack is not None:
+            self.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(1, 1, started, res[1])
+        return res
+
+    async def next_batch(self) -> List[StreamRecord]:
+        """Get all the values already received from the streams,
+            waiting for at least one
+
+        Returns:
+            List[StreamRecord]: the elements from the streams
+        """
+        if self.ordered:
+            while not self.pending:
+                await self._fill()
+        if self.pending:
+            batch = list(self.pending)
+            self.pending.clear()
+        else:
+            batch = await self.queue.get_batch()
+        started = time.perf_counter()
+        if self.ack is not None:
+            for res in batch:
+                self.ack(res)
+        if self.metrics is not None:
+            self.metrics.observe(len(batch), len(batch), started, batch[0][1])
+        return batch
+
+    def _queued(self) -> int:
+        """Number of records waiting to be returned, buffered ones included
+
+        Returns:
+            int: the number of records
+        """
+        queued = self.queue.qsize() + len(self.pending)
+        if self.ordered:
+            queued += sum(len(buffer) for buffer in self.buffers.values())
+        return queued
+
+    async def _fill(self) -> None:
+        """Wait for new records and move the records that can be returned
+            in order to the pending ones. The wait is interrupted when the
+            oldest buffered record has waited too long.
+        """
+        timeout = None
+        if self.wait is not None and self.arrivals:
+            loop = asyncio.get_event_loop()
+            timeout = max(self.arrivals[0][0] + self.wait - loop.time(), 0.0)
+        if timeout is None or not self.queue.empty():
+            self._store(await self.queue.get_batch())
+        else:
+            try:
+                self._store(
+                    await asyncio.wait_for(self.queue.get_batch(), timeout)
+                )
+            except asyncio.TimeoutError:
+                pass
+        self._release()
+
+    def _store(self, batch: List[StreamRecord]) -> None:
+        """Buffer new records and move the watermark, the lowest key of
+            the last records of the streams. Late records are returned
+            without buffering.
+
+        Args:
+            batch (List[StreamRecord]): the new records
+        """
+        now = asyncio.get_event_loop().time()
+        latest = self.latest
+        for res in batch:
+            key = _record_key(res)
+            if key < self.released:
+                self.late += 1
+                self.pending.append(res)
+                continue
+            buffer = self.buffers.get(res[0])
+            if buffer is None:
+                buffer = self.buffers[res[0]] = deque()
+            if not buffer:
+                heapq.heappush(self.heads, (key, res[0]))
+            buffer.append((key, res))
+            if self.wait is not None:
+                self.arrivals.append((now, key))
+            idx = key[:2]
+            if idx > latest.get(res[0], idx):
+                latest[res[0]] = idx  # type: ignore
+                heapq.heappush(self.lagging, (idx, res[0]))  # type: ignore
+
+        # drop the skipped entries when they outnumber the streams
+        if len(self.lagging) > 2 * len(latest) + 64:
+            self.lagging = [(k, s) for s, k in latest.items()]
+            heapq.heapify(self.lagging)
+
+    def _release(self) -> None:
+        """Move the buffered records up to the watermark to the pending
+            ones, in key order. The records up to the ones that waited too
+            long are released too.
+        """
+        lagging = self.lagging
+        latest = self.latest
+        while latest[lagging[0][1]] != lagging[0][0]:
+            heapq.heappop(lagging)
+        # the next records have greater ids than the last ones of all the
+        # streams, so every key with the slowest id (any stream) is ready
+        ms, seq = lagging[0][0]
+        watermark: Tuple = (ms, seq + 1)
+
+        arrivals = self.arrivals
+        if self.wait is not None:
+            now = asyncio.get_event_loop().time()
+            while arrivals and now - arrivals[0][0] >= self.wait:
+                watermark = max(watermark, arrivals.popleft()[1])
+
+        heads = self.heads
+        while heads and heads[0][0] <= watermark:
+            key, name = heapq.heappop(heads)
+            buffer = self.buffers[name]
+            self.pending.append(buffer.popleft()[1])
+            self.released = key
+            if buffer:
+                heapq.heappush(heads, (buffer[0][0], name))
+
+        # the oldest arrival left is the next record to wait for
+        while arrivals and arrivals[0][1] <= self.released:
+            arrivals.popleft()
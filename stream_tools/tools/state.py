@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import MutableMapping
+from typing import Tuple
+
+
+BUCKETS = 64
+
+
+class StateView(Mapping):
+    """Read-only view of a PersistentState at the time of a snapshot.
+    The view shares the buckets of the state, so it is cheap to create,
+    and it stays valid after later updates of the state.
+    """
+    __slots__ = ("buckets", "size")
+
+    def __init__(self, buckets: Tuple[Dict[Any, Any], ...], size: int) -> None:
+        """Initialize the view
+
+        Args:
+            buckets (Tuple[Dict[Any, Any], ...]): the buckets of the state
+            size (int): the number of items
+        """
+        self.buckets = buckets
+        self.size = size
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.buckets[hash(key) % len(self.buckets)][key]
+
+    def __iter__(self) -> Iterator[Any]:
+        for bucket in self.buckets:
+            yield from bucket
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"StateView({dict(self.items())})"
+
+
+class PersistentState(MutableMapping):
+    """Mapping with copy-on-write snapshots. The items are split among a
+    fixed number of buckets: a snapshot shares all the buckets, and the
+    first update of a bucket after a snapshot copies only that bucket.
+    With n items, a snapshot costs O(BUCKETS) and an update at most
+    O(n / BUCKETS), instead of O(n) for a copy of the whole mapping.
+    """
+    def __init__(self, buckets: int = BUCKETS) -> None:
+        """Initialize the empty state
+
+        Args:
+            buckets (int, optional): the number of buckets.
+                Defaults to BUCKETS.
+        """
+        self.buckets: List[Dict[Any, Any]] = [{} for _ in range(buckets)]
+        # generation of the last copy of each bucket: the buckets copied
+        # before the last snapshot are shared with it
+        self.copied = [0] * buckets
+        self.generation = 0
+        self.size = 0
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.buckets[hash(key) % len(self.buckets)][key]
+
+    def _writable(self, key: Any) -> Dict[Any, Any]:
+        """The bucket of a key, copied if it is shared with a snapshot
+
+        Args:
+            key (Any): the key
+
+        Returns:
+            Dict[Any, Any]: the bucket
+        """
+        i = hash(key) % len(self.buckets)
+        if self.copied[i] != self.generation:
+            self.buckets[i] = dict(self.buckets[i])
+            self.copied[i] = self.generation
+        return self.buckets[i]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        bucket = self._writable(key)
+        if key not in bucket:
+            self.size += 1
+        bucket[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self.buckets[hash(key) % len(self.buckets)]:
+            raise KeyError(key)
+        del self._writable(key)[key]
+        self.size -= 1
+
+    def __iter__(self) -> Iterator[Any]:
+        for bucket in self.buckets:
+            yield from bucket
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"PersistentState({dict(self.items())})"
+
+    def snapshot(self) -> StateView:
+        """Take a read-only view of the current items
+
+        Returns:
+            StateView: the view, not affected by later updates
+        """
+        self.generation += 1
+        return StateView(tuple(self.buckets), self.size)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import deque
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Generic
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+
+OVERFLOW = ["block", "drop_oldest", "drop_newest", "coalesce"]
+
+
+T = TypeVar("T")
+
+
+class Channel(Generic[T]):
+    """Single-producer/single-consumer channel used by the nodes to receive
+    records from the stream readers.
+    The channel can be bounded: when it is full a new item is handled
+    according to the overflow policy:
+    - "block": the producer waits for free space
+    - "drop_oldest": the oldest item is discarded
+    - "drop_newest": the new item is discarded
+    - "coalesce": the new record replaces the queued record coming from the
+        same stream (the producer waits if there is none)
+    """
+    def __init__(self, maxsize: int = 0, overflow: str = "block") -> None:
+        """Initialize the channel
+
+        Args:
+            maxsize (int, optional): maximum number of items, 0 means
+                unbounded. Defaults to 0.
+            overflow (str, optional): the overflow policy.
+                Defaults to "block".
+
+        Raises:
+            ValueError: in case of unknown overflow policy
+        """
+        if overflow not in OVERFLOW:
+            raise ValueError("Wrong overflow policy.")
+
+        self.maxsize = int(maxsize)
+        self.overflow = overflow
+        self.dropped = 0
+        self.coalesced = 0
+
+        self.items: Deque[Any] = deque()
+        # with the coalesce policy the items are boxed in lists, so that
+        # a queued record can be replaced by the latest of its stream
+        self.latest: Dict[bytes, List[Any]] = {}
+        self.getter: Optional[asyncio.Future] = None
+        self.putter: Optional[asyncio.Future] = None
+
+    def qsize(self) -> int:
+        """Number of items in the channel
+
+        Returns:
+            int: the number of items
+        """
+        return len(self.items)
+
+    def empty(self) -> bool:
+        """Check if the channel is empty
+
+        Returns:
+            bool: True if there are no items in the channel
+        """
+        return not self.items
+
+    def full(self) -> bool:
+        """Check if the channel is full
+
+        Returns:
+            bool: True if there are maxsize items in the channel
+        """
+        return 0 < self.maxsize <= len(self.items)
+
+    def put_nowait(self, item: T) -> None:
+        """Put an item in the channel without waiting
+
+        Args:
+            item (T): the item
+
+        Raises:
+            asyncio.QueueFull: if the channel is full and the overflow
+                policy requires to wait
+        """
+        if 0 < self.maxsize <= len(self.items):
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+            elif self.overflow == "drop_oldest":
+                self._pop()
+                self.dropped += 1
+            elif self.overflow == "coalesce":
+                box = self.latest.get(item[0])  # type: ignore
+                if box is None:
+                    raise asyncio.QueueFull
+                box[0] = item
+                self.coalesced += 1
+                return
+            else:
+                raise asyncio.QueueFull
+
+        if self.overflow == "coalesce":
+            box = [item]
+            self.latest[item[0]] = box  # type: ignore
+            self.items.append(box)
+        else:
+            self.items.append(item)
+
+        if self.getter is not None and not self.getter.done():
+            self.getter.set_result(None)
+
+    async def put(self, item: T) -> None:
+        """Put an item in the channel, waiting for free space if required
+        by the overflow policy
+
+        Args:
+            item (T): the item
+        """
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                await self._wait_putter()
+
+    async def put_many(self, items: Iterable[T]) -> None:
+        """Put several items in the channel, waiting for free space if
+        required by the overflow policy
+
+        Args:
+            items (Iterable[T]): the items
+        """
+        for item in items:
+            while True:
+                try:
+                    self.put_nowait(item)
+                    break
+                except asyncio.QueueFull:
+                    await self._wait_putter()
+
+    async def drain(self, size: int) -> None:
+        """Wait until at most `size` items are in the channel, e.g. to
+        bound the records read ahead by a producer of an unbounded channel
+
+        Args:
+            size (int): the number of items
+        """
+        while len(self.items) > size:
+            await self._wait_putter()
+
+    def get_nowait(self) -> T:
+        """Get an item from the channel without waiting
+
+        Raises:
+            asyncio.QueueEmpty: if the channel is empty
+
+        Returns:
+            T: the oldest item of the channel
+        """
+        if not self.items:
+            raise asyncio.QueueEmpty
+        item = self._pop()
+        if self.putter is not None and not self.putter.done():
+            self.putter.set_result(None)
+        return item
+
+    async def get(self) -> T:
+        """Get an item from the channel, waiting for one if it is empty
+
+        Returns:
+            T: the oldest item of the channel
+        """
+        while not self.items:
+            await self._wait_getter()
+        return self.get_nowait()
+
+    async def get_batch(self, max_size: Optional[int] = None) -> List[T]:
+        """Wait for at least one item and return it together with all the
+        other items already available in the channel.
+
+        Args:
+            max_size (Optional[int], optional): maximum number of items
+                returned. Defaults to None (no limit).
+
+        Returns:
+            List[T]: the list of items, in arrival order
+        """
+        while not self.items:
+            await self._wait_getter()
+
+        if max_size is None or max_size >= len(self.items):
+            size = len(self.items)
+        else:
+            size = max_size
+        items = [self._pop() for _ in range(size)]
+
+        if self.putter is not None and not self.putter.done():
+            self.putter.set_result(None)
+        return items
+
+    def _pop(self) -> Any:
+        """Remove the oldest item of the channel
+
+        Returns:
+            Any: the removed item
+        """
+        item = self.items.popleft()
+        if self.overflow == "coalesce":
+            box, item = item, item[0]
+            if self.latest.get(item[0]) is box:
+                del self.latest[item[0]]
+        return item
+
+    async def _wait_getter(self) -> None:
+        """Wait for the producer to put a new item
+        """
+        self.getter = asyncio.get_event_loop().create_future()
+        try:
+            await self.getter
+        finally:
+            self.getter = None
+
+    async def _wait_putter(self) -> None:
+        """Wait for the consumer to free some space
+        """
+        self.putter = asyncio.get_event_loop().create_future()
+        try:
+            await self.putter
+        finally:
+            self.putter = None
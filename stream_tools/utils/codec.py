@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import struct
+import zlib
+
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    StreamValue = OrderedDict[bytes, Any]
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+else:
+    StreamValue = OrderedDict
+    StreamRecord = Tuple[bytes, bytes, StreamValue]
+
+
+class Codec(ABC):
+    """Codec of the values of the stream entries: it encodes the fields of
+    a new entry for XADD and decodes the fields of the read entries.
+    """
+    @abstractmethod
+    def encode(self, fields: Mapping[bytes, Any]) -> Mapping[bytes, Any]:
+        """Encode the fields of a new entry
+
+        Args:
+            fields (Mapping[bytes, Any]): the fields-values
+
+        Returns:
+            Mapping[bytes, Any]: the fields-values of the entry
+        """
+
+    @abstractmethod
+    def decode(self, value: StreamValue) -> StreamValue:
+        """Decode the fields of an entry
+
+        Args:
+            value (StreamValue): the fields-values of the entry
+
+        Returns:
+            StreamValue: the decoded fields-values
+        """
+
+    def decode_many(self, records: List[StreamRecord]) -> List[StreamRecord]:
+        """Decode the fields of some stream records
+
+        Args:
+            records (List[StreamRecord]): the read records
+
+        Returns:
+            List[StreamRecord]: the records with decoded fields
+        """
+        decode = self.decode
+        return [(name, idx, decode(value)) for name, idx, value in records]
+
+
+class TextCodec(Codec):
+    """Text codec, the redis default: every value is written as text (e.g.
+    b"1.5") and read back as bytes, parsed by the nodes.
+    """
+    def encode(self, fields: Mapping[bytes, Any]) -> Mapping[bytes, Any]:
+        return fields
+
+    def decode(self, value: StreamValue) -> StreamValue:
+        return value
+
+    def decode_many(self, records: List[StreamRecord]) -> List[StreamRecord]:
+        return records
+
+
+class Float64Codec(Codec):
+    """Binary codec of numeric entries: the values are packed as float64
+    (little-endian) in a single field, with the field names in another one
+    (separated by commas, so the names can not contain a comma).
+    Large payloads can be compressed with zlib. The decoded values are
+    floats, so the nodes do not parse them. Entries without the binary
+    field (e.g. written as text) are returned as they are.
+    The packers and the split field names are cached for up to CACHE_SIZE
+    sizes and headers, the oldest ones being dropped first.
+    """
+    NAMES = b"fields"
+    PACKED = b"float64"
+    COMPRESSED = b"float64z"
+    CACHE_SIZE = 1024
+
+    def __init__(self, compress: Optional[int] = None, level: int = 1) -> None:
+        """Initialize the codec
+
+        Args:
+            compress (Optional[int], optional): compress with zlib the
+                payloads of at least `compress` bytes. Defaults to None
+                (no compression).
+            level (int, optional): the zlib compression level.
+                Defaults to 1.
+        """
+        self.compress = compress
+        self.level = int(level)
+        self.structs: Dict[int, struct.Struct] = {}
+        self.names: Dict[bytes, List[bytes]] = {}
+
+    def _struct(self, size: int) -> struct.Struct:
+        """The packer of `size` float64 values
+
+        Args:
+            size (int): the number of values
+
+        Returns:
+            struct.Struct: the packer
+        """
+        try:
+            return self.structs[size]
+        except KeyError:
+            if len(self.structs) >= self.CACHE_SIZE:
+                del self.structs[next(iter(self.structs))]
+            packer = self.structs[size] = struct.Struct(f"<{size}d")
+            return packer
+
+    def encode(self, fields: Mapping[Any, Any]) -> Mapping[bytes, Any]:
+        """Pack the fields of a new entry
+
+        Args:
+            fields (Mapping[Any, Any]): the numeric fields-values, the
+                names are bytes or converted with str
+
+        Raises:
+            ValueError: in case of non-numeric values, or of field names
+                containing a comma
+
+        Returns:
+            Mapping[bytes, Any]: the names and the packed values
+        """
+        names = b",".join(
+            k if isinstance(k, bytes) else str(k).encode() for k in fields
+        )
+        if names.count(b",") != max(len(fields) - 1, 0):
+            raise ValueError("Float64Codec field names can not contain a comma.")
+        payload = self._struct(len(fields)).pack(*map(float, fields.values()))
+        if self.compress is not None and len(payload) >= self.compress:
+            return {
+                self.NAMES: names,
+                self.COMPRESSED: zlib.compress(payload, self.level),
+            }
+        return {self.NAMES: names, self.PACKED: payload}
+
+    def decode(self, value: StreamValue) -> StreamValue:
+        """Unpack the fields of an entry
+
+        Args:
+            value (StreamValue): the names and the packed values
+
+        Returns:
+            StreamValue: the fields-values, as floats
+        """
+        payload = value.get(self.PACKED)
+        if payload is None:
+            payload = value.get(self.COMPRESSED)
+            if payload is None:
+                return value
+            payload = zlib.decompress(payload)
+
+        header = value[self.NAMES]
+        try:
+            names = self.names[header]
+        except KeyError:
+            if len(self.names) >= self.CACHE_SIZE:
+                del self.names[next(iter(self.names))]
+            names = self.names[header] = header.split(b",")
+        # a plain dict (ordered too) is much faster to build
+        return dict(zip(names, self._struct(len(names)).unpack(payload)))  # type: ignore
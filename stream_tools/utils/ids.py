@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Tuple
+from typing import Union
+
+from ..client import Key
+from ..client import RedisClient
+
+
+# largest sequence number of a redis id
+MAX_SEQ = 2 ** 64 - 1
+
+Position = Union[bytes, str, int, datetime]
+IdKey = Tuple[int, int]
+
+
+def to_id(position: Position) -> bytes:
+    """The redis id of a position of a stream: an id (e.g. b"1606081071444-0",
+    or b"-" and b"+"), a timestamp in milliseconds or a datetime. Timestamps
+    are converted to incomplete ids (no sequence number), which XRANGE
+    expands to the first (start) or last (end) entry of that millisecond.
+
+    Args:
+        position (Position): the position
+
+    Raises:
+        TypeError: in case of wrong position type
+
+    Returns:
+        bytes: the redis id
+    """
+    if isinstance(position, bytes):
+        return position
+    if isinstance(position, str):
+        return position.encode()
+    if isinstance(position, datetime):
+        return str(int(position.timestamp() * 1000)).encode()
+    if isinstance(position, int) and not isinstance(position, bool):
+        return str(position).encode()
+    raise TypeError("Stream position must be an id, a timestamp or a datetime.")
+
+
+def id_key(idx: bytes) -> IdKey:
+    """Sorting key of a redis id
+
+    Args:
+        idx (bytes): the redis id
+
+    Returns:
+        IdKey: the timestamp and the sequence number
+    """
+    ms, _, seq = idx.partition(b"-")
+    return int(ms), int(seq or 0)
+
+
+def next_id(idx: bytes) -> bytes:
+    """The smallest redis id following an id, to continue an XRANGE
+    right after its last entry
+
+    Args:
+        idx (bytes): the redis id
+
+    Returns:
+        bytes: the following id
+    """
+    ms, seq = id_key(idx)
+    if seq == MAX_SEQ:
+        return f"{ms + 1}-0".encode()
+    return f"{ms}-{seq + 1}".encode()
+
+
+async def latest_id(redis: RedisClient, stream_name: Key) -> bytes:
+    """The id of the last entry of a stream, to read with XREAD the entries
+    added after it
+
+    Args:
+        redis (RedisClient): the client
+        stream_name (Key): the name of the stream
+
+    Returns:
+        bytes: the id of the last entry, or b"0-0" if the stream is empty
+    """
+    res = await redis.xrevrange(stream_name, count=1)
+    if res:
+        return res[0][0]
+    return b"0-0"
+
+
+def previous_id(position: bytes) -> bytes:
+    """The largest redis id preceding a start position, to read with XREAD
+    the entries from that position on
+
+    Args:
+        position (bytes): the redis id, possibly without sequence number,
+            or b"-"
+
+    Returns:
+        bytes: the preceding id (b"0-0" at the start of the stream)
+    """
+    if position == b"-":
+        return b"0-0"
+    ms, _, seq = position.partition(b"-")
+    if seq and int(seq):
+        return ms + b"-" + str(int(seq) - 1).encode()
+    if int(ms) == 0:
+        return b"0-0"
+    return f"{int(ms) - 1}-{MAX_SEQ}".encode()
@@ -1,9 +1,22 @@
+import dataclasses
+
 from collections import namedtuple
 
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
 from typing import Union
 from typing import NamedTuple
+from typing import Sequence
+from typing import get_type_hints
+
+import numpy as np  # type: ignore
+
+StreamRecord = Tuple[bytes, bytes, Mapping[bytes, bytes]]
 
 
 def sanitize(
@@ -19,6 +32,8 @@ def sanitize(
     else:
         if "_fields" in mode.__dict__:  # is a namedtuple
             return _sanitize_to_namedtuple(input_data, mode)
+        elif dataclasses.is_dataclass(mode):
+            return _dataclass_decoder(mode)(input_data)
         else:
             raise ValueError('Provided schema is not supported.')
 
@@ -61,3 +76,341 @@ def _sanitize_to_namedtuple(data: Dict[bytes, bytes], nt: NamedTuple) -> NamedTu
             raise KeyError("Namedtuple fields not compatible with provided data")
 
     return nt(**new_data)
+
+
+def _raw(value: bytes) -> bytes:
+    return value
+
+
+def _decode(value: bytes) -> str:
+    return value.decode()
+
+
+def _sniff(value: bytes) -> Union[int, float, str]:
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value.decode()
+
+
+def _sniff_timestamp(value: bytes) -> Union[int, float, str]:
+    # as sanitize, float timestamps (seconds) become int milliseconds
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value) * 1000)
+        except ValueError:
+            return value.decode()
+
+
+TIMESTAMP_FIELDS = ("timestamp", "TIMESTAMP")
+
+
+CONVERTERS: Dict[Any, Callable[[bytes], Any]] = {
+    float: float,
+    int: int,
+    str: _decode,
+    bytes: _raw,
+    Any: _sniff,
+}
+
+
+def _converter(field_type: Any, name: str = "") -> Callable[[bytes], Any]:
+    """The converter of the raw values of a field
+
+    Args:
+        field_type (Any): the type of the field (float, int, str, bytes,
+            Any or Optional of them) or a function converting a raw value
+        name (str, optional): the name of the field. Defaults to "".
+
+    Raises:
+        TypeError: in case of unsupported type
+
+    Returns:
+        Callable[[bytes], Any]: the converter
+    """
+    args = getattr(field_type, "__args__", None)
+    if getattr(field_type, "__origin__", None) is Union and args:
+        # Optional[X]
+        field_type = next(arg for arg in args if arg is not type(None))
+    if field_type is Any and name in TIMESTAMP_FIELDS:
+        return _sniff_timestamp
+    if field_type in CONVERTERS:
+        return CONVERTERS[field_type]
+    if callable(field_type) and not isinstance(field_type, type):
+        return field_type
+    raise TypeError(f"Unsupported field type {field_type!r}.")
+
+
+class Decoder:
+    """Decoder of stream values compiled from a schema.
+    The field names are encoded once and every field has a fixed converter,
+    so decoding a value only looks up and converts the fields of the
+    schema. The fields missing from the value take their default, if any.
+    """
+    def __init__(
+        self,
+        fields: List[Tuple[str, Callable[[bytes], Any]]],
+        build: Callable[[List[Any]], Any],
+        defaults: Optional[Mapping[str, Any]] = None,
+        factories: Optional[Mapping[str, Callable[[], Any]]] = None,
+    ) -> None:
+        """Initialize the decoder
+
+        Args:
+            fields (List[Tuple[str, Callable[[bytes], Any]]]): the field
+                names and converters
+            build (Callable[[List[Any]], Any]): function building the
+                decoded value from the converted values
+            defaults (Optional[Mapping[str, Any]], optional): the defaults
+                of the optional fields. Defaults to None.
+            factories (Optional[Mapping[str, Callable[[], Any]]], optional):
+                the functions making the defaults of the optional fields.
+                Defaults to None.
+        """
+        self.fields = [(name, name.encode(), convert) for name, convert in fields]
+        self.build = build
+        self.defaults = dict(defaults or {})
+        self.factories = dict(factories or {})
+
+    def __call__(self, data: Mapping[bytes, bytes]) -> Any:
+        """Decode a stream value
+
+        Args:
+            data (Mapping[bytes, bytes]): the stream value
+
+        Raises:
+            KeyError: in case a field without default is missing
+
+        Returns:
+            Any: the decoded value
+        """
+        try:
+            values = [convert(data[key]) for _, key, convert in self.fields]
+        except KeyError:
+            values = self._with_defaults(data)
+        return self.build(values)
+
+    def _with_defaults(self, data: Mapping[bytes, bytes]) -> List[Any]:
+        values = []
+        for name, key, convert in self.fields:
+            if key in data:
+                values.append(convert(data[key]))
+            elif name in self.defaults:
+                values.append(self.defaults[name])
+            elif name in self.factories:
+                values.append(self.factories[name]())
+            else:
+                raise KeyError(f"Field {name} missing from the provided data")
+        return values
+
+
+def compile_decoder(schema: Any) -> Decoder:
+    """Compile a decoder of stream values from a schema.
+    The schema can be a namedtuple (with type annotations, or without:
+    then the values are converted as by `sanitize`), a dataclass or a
+    mapping of field names to types. The supported types are float, int,
+    str, bytes and Any (converted as by `sanitize`), Optional of them, or
+    functions converting the raw bytes.
+
+    Args:
+        schema (Any): the schema
+
+    Raises:
+        TypeError: in case of unsupported schema or field type
+
+    Returns:
+        Decoder: the decoder, returning a schema instance (a dict with str
+            keys for a mapping schema)
+    """
+    if isinstance(schema, Mapping):
+        names = [str(name) for name in schema]
+        fields = [
+            (name, _converter(t, name)) for name, t in zip(names, schema.values())
+        ]
+        return Decoder(fields, lambda values: dict(zip(names, values)))
+
+    if isinstance(schema, type) and issubclass(schema, tuple) and hasattr(
+        schema, "_fields"
+    ):
+        hints = get_type_hints(schema)
+        fields = [
+            (name, _converter(hints.get(name, Any), name)) for name in schema._fields
+        ]
+        return Decoder(
+            fields,
+            schema._make,  # type: ignore
+            getattr(schema, "_field_defaults", {}),
+        )
+
+    if isinstance(schema, type) and dataclasses.is_dataclass(schema):
+        hints = get_type_hints(schema)
+        fields = []
+        defaults = {}
+        factories = {}
+        for field in dataclasses.fields(schema):
+            if not field.init:
+                continue
+            fields.append(
+                (field.name, _converter(hints.get(field.name, Any), field.name))
+            )
+            if field.default is not dataclasses.MISSING:
+                defaults[field.name] = field.default
+            elif field.default_factory is not dataclasses.MISSING:  # type: ignore
+                factories[field.name] = field.default_factory  # type: ignore
+
+        def _build(values: List[Any]) -> Any:
+            return schema(*values)
+
+        return Decoder(fields, _build, defaults, factories)
+
+    raise TypeError("Provided schema is not supported.")
+
+
+_DATACLASS_DECODERS: Dict[type, Decoder] = {}
+
+
+def _dataclass_decoder(schema: Any) -> Decoder:
+    try:
+        return _DATACLASS_DECODERS[schema]
+    except KeyError:
+        decoder = _DATACLASS_DECODERS[schema] = compile_decoder(schema)
+        return decoder
+
+
+class Columns(NamedTuple):
+    """Columnar batch of stream records"""
+    streams: np.ndarray
+    ids: np.ndarray
+    timestamps: np.ndarray
+    values: Dict[str, np.ndarray]
+    masks: Dict[str, np.ndarray]
+
+
+class BatchSanitizer:
+    """Columnar decoder of batches of stream records: the stream names and
+    the redis ids (object arrays), the timestamps of the ids (milliseconds)
+    and a float array for every field, NaN where the field is missing.
+    The arrays are views of buffers reused by the next batches, so a batch
+    no larger than the previous ones allocates no arrays: copy the arrays
+    to keep them after the next call.
+    """
+    def __init__(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        masks: bool = False,
+        capacity: int = 1024,
+    ) -> None:
+        """Initialize the decoder
+
+        Args:
+            fields (Optional[Sequence[str]], optional): the fields decoded,
+                all of them must be numeric. Defaults to None (all the
+                fields found in each batch).
+            masks (bool, optional): whether to return for every field a
+                bool array of the records including it. Defaults to False.
+            capacity (int, optional): initial size of the buffers.
+                Defaults to 1024.
+        """
+        names = None if fields is None else [str(f) for f in fields]
+        self.fields = names
+        self.keys = None if names is None else [f.encode() for f in names]
+        self.masks = bool(masks)
+        self.capacity = max(int(capacity), 1)
+        self._allocate(self.capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        """Allocate new buffers
+
+        Args:
+            capacity (int): the size of the buffers
+        """
+        self.capacity = capacity
+        self.streams = np.empty(capacity, dtype=object)
+        self.ids = np.empty(capacity, dtype=object)
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.buffers: Dict[bytes, np.ndarray] = {}
+        self.mask_buffers: Dict[bytes, np.ndarray] = {}
+
+    def _buffer(self, key: bytes) -> np.ndarray:
+        """The value buffer of a field
+
+        Args:
+            key (bytes): the field name
+
+        Returns:
+            np.ndarray: the buffer
+        """
+        try:
+            return self.buffers[key]
+        except KeyError:
+            buffer = self.buffers[key] = np.empty(self.capacity)
+            return buffer
+
+    def __call__(self, records: Sequence[StreamRecord]) -> Columns:
+        """Decode a batch of records
+
+        Args:
+            records (Sequence[StreamRecord]): the stream records
+
+        Raises:
+            ValueError: in case of non-numeric values
+
+        Returns:
+            Columns: the arrays of the batch, valid until the next call
+        """
+        n = len(records)
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+
+        self.streams[:n] = [record[0] for record in records]
+        self.ids[:n] = [record[1] for record in records]
+        self.timestamps[:n] = [
+            int(record[1].partition(b"-")[0]) for record in records
+        ]
+
+        keys = self.keys
+        if keys is None:
+            keys = list(dict.fromkeys(k for record in records for k in record[2]))
+        values = {}
+        masks = {}
+        for key in keys:
+            buffer = self._buffer(key)
+            buffer[:n] = [float(record[2].get(key, b"nan")) for record in records]
+            name = key.decode()
+            values[name] = buffer[:n]
+            if self.masks:
+                mask = self.mask_buffers.get(key)
+                if mask is None:
+                    mask = self.mask_buffers[key] = np.empty(self.capacity, bool)
+                mask[:n] = [key in record[2] for record in records]
+                masks[name] = mask[:n]
+
+        return Columns(
+            self.streams[:n], self.ids[:n], self.timestamps[:n], values, masks
+        )
+
+
+def sanitize_batch(
+    records: Sequence[StreamRecord],
+    fields: Optional[Sequence[str]] = None,
+    masks: bool = False,
+) -> Columns:
+    """Decode a batch of stream records into columns (see BatchSanitizer).
+    Use a BatchSanitizer to reuse the arrays across batches.
+
+    Args:
+        records (Sequence[StreamRecord]): the stream records
+        fields (Optional[Sequence[str]], optional): the fields decoded.
+            Defaults to None (all the fields).
+        masks (bool, optional): whether to return for every field a bool
+            array of the records including it. Defaults to False.
+
+    Returns:
+        Columns: the arrays of the batch
+    """
+    return BatchSanitizer(fields, masks, max(len(records), 1))(records)
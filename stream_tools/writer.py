@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from types import TracebackType
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Type
+
+from .pool import Pool
+from .pool import RedisPool
+from .utils.codec import Codec
+from .utils.codec import TextCodec
+
+
+Fields = Dict[bytes, Any]
+
+logger = logging.getLogger(__name__)
+
+
+class StreamWriter:
+    """Sink publishing records to a redis stream, e.g. the output of a node.
+    The records are collected and sent with a single pipeline of XADD when
+    `flush_count` records are waiting or every `flush_interval` seconds.
+    The stream can be trimmed with MAXLEN, approximate by default: redis
+    then trims whole nodes of the stream only, which is much cheaper.
+    """
+    def __init__(
+        self,
+        stream_name: str,
+        flush_count: int = 100,
+        flush_interval: float = 0.1,
+        maxlen: Optional[int] = None,
+        exact_len: bool = False,
+        pool: Optional[Pool] = None,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        """Initialize the writer
+
+        Args:
+            stream_name (str): the name of the redis stream
+            flush_count (int, optional): number of waiting records that
+                triggers a flush. Defaults to 100.
+            flush_interval (float, optional): maximum time in seconds a
+                record waits before being sent. Defaults to 0.1.
+            maxlen (Optional[int], optional): trim the stream to about
+                `maxlen` entries at every XADD. Defaults to None (no trim).
+            exact_len (bool, optional): trim the stream to exactly `maxlen`
+                entries. Defaults to False.
+            pool (Optional[Pool], optional): the pool providing the
+                redis connections, shared with other streams and nodes.
+                Defaults to None (a private pool on redis://localhost).
+            codec (Optional[Codec], optional): the codec of the entries
+                (e.g. Float64Codec for binary numeric entries).
+                Defaults to None (TextCodec).
+        """
+        self.stream_name = str(stream_name)
+        self.flush_count = int(flush_count)
+        self.flush_interval = float(flush_interval)
+        self.maxlen = maxlen
+        self.exact_len = bool(exact_len)
+        self.pool = pool
+        self.codec = TextCodec() if codec is None else codec
+
+        self.records: List[Mapping[bytes, Any]] = []
+        self.written = 0
+        self.last_id: Optional[bytes] = None
+        self.flushing: Optional[asyncio.Future] = None
+        self.flusher: Optional[asyncio.Future] = None
+
+    @property
+    def name(self) -> str:
+        """Get the name of the stream
+
+        Returns:
+            str: the stream name
+        """
+        return self.stream_name
+
+    async def __aenter__(self) -> StreamWriter:
+        """Start the context of the writer, getting the shared client of
+        the pool and starting the periodic flushes
+
+        Returns:
+            StreamWriter: the initialized writer
+        """
+        self.own_pool = self.pool is None
+        if self.pool is None:
+            self.pool = RedisPool()
+        self.client = await self.pool.client()
+        self.flusher = asyncio.ensure_future(self._flush_periodically())
+        return self
+
+    async def __aexit__(
+        self,
+        exception_type: Optional[Type[BaseException]],
+        exception: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> Optional[bool]:
+        """Exiting the context of the writer stops the periodic flushes,
+        sends the waiting records after the flush in progress (if any) and
+        closes the pool if it is not shared.
+
+        Args:
+            exception_type (Optional[Type[BaseException]]): the exception type
+            exception (Optional[BaseException]): the exception
+            traceback (Optional[TracebackType]): traceback message
+
+        Returns:
+            Optional[bool]: if the context is exited with a runtime error
+        """
+        if self.flusher is not None:
+            self.flusher.cancel()
+            try:
+                await self.flusher
+            except asyncio.CancelledError:
+                pass
+            self.flusher = None
+        await self.flush()
+        if self.own_pool:
+            pool: Pool = self.pool  # type: ignore
+            await pool.close()
+            self.pool = None
+        return bool(isinstance(exception, RuntimeError))
+
+    def write(self, output: Any) -> None:
+        """Add a record to the stream. The record is sent with the next
+        flush. The record can be the fields-values of the new entry, a
+        stream record or a node output (its values are written) or the
+        state of a join (the values of each stream are written with the
+        "stream:field" names).
+
+        Args:
+            output (Any): the record
+        """
+        fields = _fields(output)
+        if not fields:
+            return
+        self.records.append(self.codec.encode(fields))
+        if len(self.records) >= self.flush_count:
+            self._start_flush()
+
+    async def publish(self, source: AsyncIterator) -> None:
+        """Write all the outputs of a node (or a stream, a merge, a join).
+        The outputs wait for the flush when `flush_count` records are
+        waiting, so a slow redis slows down the source too.
+
+        Args:
+            source (AsyncIterator): the node
+        """
+        async for output in source:
+            self.write(output)
+            if len(self.records) >= self.flush_count:
+                await self.flush()
+
+    async def flush(self) -> None:
+        """Send the waiting records, with a single pipeline of XADD,
+        after the flush in progress (if any)
+
+        Raises:
+            aioredis.RedisError: in case the XADD fails (the records are
+                kept to be sent again)
+        """
+        if self.flushing is not None:
+            await asyncio.wait([self.flushing])
+        if self.records:
+            await asyncio.shield(self._start_flush())
+
+    def _start_flush(self) -> asyncio.Future:
+        """Start sending the waiting records, unless a flush is already in
+        progress. All the pipelines are sent by this single task, which
+        keeps the records in order.
+
+        Returns:
+            asyncio.Future: the task sending the records
+        """
+        if self.flushing is None:
+            self.flushing = asyncio.ensure_future(self._send())
+            self.flushing.add_done_callback(self._flushed)
+        return self.flushing
+
+    async def _send(self) -> None:
+        """Send the waiting records, putting them back if the XADD fails
+        """
+        records, self.records = self.records, []
+        try:
+            if records:
+                pipe = self.client.pipeline()
+                for fields in records:
+                    pipe.xadd(
+                        self.stream_name,
+                        fields,
+                        max_len=self.maxlen,
+                        exact_len=self.exact_len,
+                    )
+                ids = await pipe.execute()
+                self.written += len(ids)
+                self.last_id = ids[-1]
+        except BaseException:
+            self.records[:0] = records
+            raise
+        finally:
+            self.flushing = None
+
+    def _flushed(self, future: asyncio.Future) -> None:
+        """Log the failure of a XADD
+
+        Args:
+            future (asyncio.Future): the task sending the records
+        """
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "XADD to stream %s failed, %d records waiting.",
+                self.stream_name,
+                len(self.records),
+                exc_info=future.exception(),
+            )
+
+    async def _flush_periodically(self) -> None:
+        """Send the waiting records every `flush_interval` seconds,
+        going on after a failed XADD (logged by _flushed)
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.records:
+                try:
+                    await self.flush()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    pass
+
+
+def _fields(output: Any) -> Fields:
+    """The fields-values of the entry written for a record
+
+    Args:
+        output (Any): the record, a node output or a join state
+
+    Returns:
+        Fields: the fields-values
+    """
+    if isinstance(output, tuple):
+        # a stream record or a node output: (name, id, values),
+        # or the delta of a join: (updated streams, removed streams)
+        output = output[2] if len(output) == 3 else output[0]
+    if not isinstance(output, Mapping):
+        raise TypeError("StreamWriter records must be mappings or records.")
+
+    fields: Fields = {}
+    for key, value in output.items():
+        key = key if isinstance(key, bytes) else str(key).encode()
+        if isinstance(value, tuple):
+            # the (id, values) of a stream in a join state
+            for field, field_value in value[1].items():
+                fields[key + b":" + field] = field_value
+        else:
+            fields[key] = value
+    return fields
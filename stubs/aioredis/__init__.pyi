@@ -1,59 +1,156 @@
 from collections import OrderedDict
 from typing import Any
+from typing import Awaitable
 from typing import Optional
 from typing import List
+from typing import Mapping
+from typing import Sequence
 from typing import Tuple
-from typing import Dict
 from typing import Union
 
 
 ReadMessageType = Tuple[bytes, bytes, OrderedDict[bytes, bytes]]
 RangeMessageType = Tuple[bytes, OrderedDict[bytes, bytes]]
+Key = Union[str, bytes]
+FieldValue = Union[bytes, float, int, str]
+
+
+class RedisError(Exception): ...
+
+
+class ReplyError(RedisError): ...
+
+
+class ConnectionClosedError(RedisError): ...
 
 
 class CommandsMixin:
 	async def xread(
 		self,
-		streams: List[str],
-		timeout: int = 0,
+		streams: Sequence[Key],
+		timeout: Optional[int] = 0,
+		count: Optional[int] = None,
+		latest_ids: Optional[Sequence[Key]] = None
+	) -> List[ReadMessageType]: ...
+
+	async def xread_group(
+		self,
+		group_name: Key,
+		consumer_name: Key,
+		streams: Sequence[Key],
+		timeout: Optional[int] = 0,
 		count: Optional[int] = None,
-		latest_ids: Optional[List[bytes]] = None
+		latest_ids: Optional[Sequence[Key]] = None,
+		no_ack: bool = False
 	) -> List[ReadMessageType]: ...
 
 	async def xrange(
 		self,
-		stream: str,
-		start: str = '+',
-		stop: str = '-',
+		stream: Key,
+		start: Key = '-',
+		stop: Key = '+',
 		count: Optional[int] = None
 	) -> List[RangeMessageType]: ...
 
 	async def xrevrange(
 		self,
-		stream: str,
-		start: str = '+',
-		stop: str = '-',
+		stream: Key,
+		start: Key = '+',
+		stop: Key = '-',
 		count: Optional[int] = None
 	) -> List[RangeMessageType]: ...
 
 	async def xadd(
 		self,
-		stream: str,
-		fields: Dict[str, Union[bytes, float, int, str]],
+		stream: Key,
+		fields: Mapping[Any, FieldValue],
+		message_id: Key = b'*',
 		max_len: Optional[int] = None,
 		exact_len: Optional[bool] = None
 	) -> bytes: ...
 
+	async def xlen(self, stream: Key) -> int: ...
+
+	async def xack(self, stream: Key, group_name: Key, id: Key, *ids: Key) -> int: ...
+
+	async def xgroup_create(
+		self,
+		stream: Key,
+		group_name: Key,
+		latest_id: Key = '$',
+		mkstream: bool = False
+	) -> bool: ...
+
+	async def xpending(
+		self,
+		stream: Key,
+		group_name: Key,
+		start: Optional[Key] = None,
+		stop: Optional[Key] = None,
+		count: Optional[int] = None,
+		consumer: Optional[Key] = None
+	) -> List[Any]: ...
+
+	async def xclaim(
+		self,
+		stream: Key,
+		group_name: Key,
+		consumer_name: Key,
+		min_idle_time: int,
+		id: Key,
+		*ids: Key
+	) -> List[RangeMessageType]: ...
+
+	async def get(self, key: Key) -> Optional[bytes]: ...
+
+	async def set(self, key: Key, value: Union[bytes, str, int, float]) -> bool: ...
+
+	async def delete(self, key: Key, *keys: Key) -> int: ...
+
+
+class Pipeline:
+	def __getattr__(self, name: str) -> Any: ...
+
+	def xadd(
+		self,
+		stream: Key,
+		fields: Mapping[Any, FieldValue],
+		message_id: Key = b'*',
+		max_len: Optional[int] = None,
+		exact_len: Optional[bool] = None
+	) -> Awaitable[bytes]: ...
+
+	def xack(self, stream: Key, group_name: Key, id: Key, *ids: Key) -> Awaitable[int]: ...
+
+	async def execute(self, *, return_exceptions: bool = False) -> List[Any]: ...
+
 
 class Redis(CommandsMixin):
 
 	def __init__(self, pool_or_conn: Any) -> None: ...
 
+	@property
+	def closed(self) -> bool: ...
+
 	def close(self) -> None: ...
 
 	async def wait_closed(self) -> None: ...
 
+	async def execute(self, command: Key, *args: Any, **kwargs: Any) -> Any: ...
+
+	async def ping(self) -> bytes: ...
+
 	async def flushall(self) -> None: ...
 
+	def pipeline(self) -> Pipeline: ...
+
+
+async def create_redis(address: Any, **kwargs: Any) -> Redis: ...
+
 
-async def create_redis(address: str) -> Redis: ...
+async def create_redis_pool(
+	address: Any,
+	minsize: int = 1,
+	maxsize: int = 10,
+	**kwargs: Any
+) -> Redis: ...
@@ -3,6 +3,8 @@ from typing import AsyncGenerator
 import aioredis
 import pytest  # type: ignore
 
+from stream_tools import MemoryPool
+
 
 @pytest.fixture
 async def redis() -> AsyncGenerator:
@@ -12,3 +14,11 @@ async def redis() -> AsyncGenerator:
     await redis.flushall()
     redis.close()
     await redis.wait_closed()
+
+
+@pytest.fixture
+async def memory() -> AsyncGenerator:
+    """Return an in-memory pool, replacing the redis server"""
+    pool = MemoryPool()
+    yield pool
+    await pool.close()
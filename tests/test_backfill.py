@@ -0,0 +1,119 @@
+import asyncio
+
+from datetime import datetime
+from datetime import timezone
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import aioredis
+import pytest
+
+from stream_tools import Backfill
+from stream_tools import Streams
+from stream_tools.bars import SumBar
+from stream_tools.filters import MovingAverage
+from stream_tools.stream import StreamQueue
+from stream_tools.stream import StreamRecord
+from stream_tools.utils.channel import Channel
+from stream_tools.utils.ids import id_key
+
+
+def test_backfill_init() -> None:
+    start = datetime(2020, 11, 22, 21, 37, 51, 444000, tzinfo=timezone.utc)
+    backfill = Backfill("test", start=start, end=b"1606081071991-0", page=50)
+
+    assert backfill.name == "test"
+    assert backfill.start == b"1606081071444"
+    assert backfill.end == b"1606081071991-0"
+    assert backfill.page == 50
+    assert backfill.follow is False
+    assert backfill.live_id() == b"1606081071443-18446744073709551615"
+
+    with pytest.raises(TypeError):
+        Backfill("test", start=1.5)  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_backfill_read_batch_range(redis: aioredis.Redis) -> None:
+    ids = [await redis.xadd("test_stream_1", {"x": i}) for i in range(12)]
+
+    backfill = Backfill("test_stream_1", start=ids[2], end=ids[9], page=3)
+    async with backfill:
+        result = [batch async for batch in backfill.read_batch()]
+
+    assert [len(batch) for batch in result] == [3, 3, 2]
+    assert [row[1] for batch in result for row in batch] == ids[2:10]
+    assert backfill.backfilled == 8
+    assert backfill.done
+
+
+@pytest.mark.asyncio
+async def test_backfill_nodes(redis: aioredis.Redis) -> None:
+    for i in range(25):
+        await redis.xadd("test_stream_1", {"x": i})
+
+    async with Backfill("test_stream_1", page=10) as stream:
+        ma = MovingAverage(stream, ("x", 5))
+        outputs: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+        while len(outputs) < 25:
+            outputs.extend(await ma.next_batch())
+    assert outputs[-1][2] == {b"x": 22.0}
+
+    async with Backfill("test_stream_1", page=10) as stream:
+        bar = SumBar(stream, ("x", 100))
+        bars: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+        while len(bars) < 2:
+            bars.extend(await bar.next_batch())
+    assert [b[2][b"x"] for b in bars] == [105.0, 105.0]
+
+
+@pytest.mark.asyncio
+async def test_backfill_follow(redis: aioredis.Redis) -> None:
+    ids = [await redis.xadd("test_stream_1", {"x": i}) for i in range(5)]
+
+    async with Backfill("test_stream_1", page=2, follow=True, count=10) as stream:
+        queue: StreamQueue = Channel()
+        reader = asyncio.ensure_future(stream._read(queue))
+        result: List[StreamRecord] = []
+        while len(result) < 5:
+            result.extend(await queue.get_batch())
+        ids += [await redis.xadd("test_stream_1", {"x": i}) for i in range(5, 8)]
+        while len(result) < 8:
+            result.extend(await queue.get_batch())
+        await asyncio.sleep(0.05)
+        reader.cancel()
+
+    assert [row[1] for row in result] == ids
+    assert queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_streams_backfill_in_id_order(redis: aioredis.Redis) -> None:
+    ids = []
+    for i in range(20):
+        name = "test_stream_1" if i % 3 else "test_stream_2"
+        ids.append((name.encode(), await redis.xadd(name, {"x": i})))
+
+    stream1 = Backfill("test_stream_1", page=4, follow=True)
+    stream2 = Backfill("test_stream_2", page=4)
+    async with Streams([stream1, stream2]) as streams:
+        queue: StreamQueue = Channel()
+        reader = asyncio.ensure_future(streams._reads(queue))
+        result: List[StreamRecord] = []
+        while len(result) < 20:
+            result.extend(await queue.get_batch())
+        await redis.xadd("test_stream_2", {"x": 20})
+        last = await redis.xadd("test_stream_1", {"x": 21})
+        result.extend(await queue.get_batch())
+        reader.cancel()
+
+    keys = [id_key(row[1]) for row in result]
+    assert keys == sorted(keys)
+    assert sorted((row[0], row[1]) for row in result[:20]) == sorted(ids)
+    # the entries of stream 2 are not followed
+    assert result[20:] == [(b"test_stream_1", last, {b"x": b"21"})]
+    assert streams.delivered == 21
+
+    with pytest.raises(ValueError):
+        Streams([stream1], group=object())  # type: ignore
@@ -0,0 +1,162 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import aioredis
+import numpy as np
+import pytest
+
+from stream_tools import Stream
+from stream_tools.bars import Bar
+from stream_tools.bars.bar import BarOutput
+from stream_tools.bars.bar import BarState
+from stream_tools.bars.bar import CountTrigger
+from stream_tools.bars.bar import REDUCERS
+from stream_tools.bars.bar import Reducer
+from stream_tools.bars.bar import ThresholdTrigger
+from stream_tools.bars.bar import Trigger
+
+
+def _state(reducer: str, trigger: Trigger) -> BarState:
+    weight = "v" if reducer == "weighted_average" else None
+    return BarState(REDUCERS[reducer](weight), trigger)
+
+
+def _bars(
+    state: BarState, values: List[Dict[bytes, bytes]]
+) -> List[Dict[bytes, float]]:
+    bars = []
+    for i, value in enumerate(values):
+        state.update((b"a", f"{i}-0".encode(), OrderedDict(value)))
+        if state.output is not None:
+            bars.append(state.output[2])
+    return bars
+
+
+RECORDS = [
+    {b"x": b"2.0", b"v": b"1.0"},
+    {b"x": b"4.0", b"v": b"3.0"},
+    {b"x": b"3.0", b"v": b"1.0"},
+    {b"x": b"1.0", b"v": b"2.0"},
+]
+
+
+@pytest.mark.parametrize(
+    "reducer, expected",
+    [
+        ("sum", [{b"x": 6.0, b"v": 4.0}, {b"x": 4.0, b"v": 3.0}]),
+        ("average", [{b"x": 3.0, b"v": 2.0}, {b"x": 2.0, b"v": 1.5}]),
+        ("weighted_average", [{b"x": 3.5, b"v": 4.0}, {b"x": 5 / 3, b"v": 3.0}]),
+        ("last", [{b"x": 4.0, b"v": 3.0}, {b"x": 1.0, b"v": 2.0}]),
+        ("absolute_delta", [{b"x": 2.0, b"v": 2.0}, {b"x": -2.0, b"v": 1.0}]),
+        ("relative_delta", [{b"x": 1.0, b"v": 2.0}, {b"x": -2 / 3, b"v": 1.0}]),
+    ],
+)
+def test_bar_state_reducers(
+    reducer: str, expected: List[Dict[bytes, float]]
+) -> None:
+    state = _state(reducer, CountTrigger(2))
+    assert _bars(state, RECORDS) == [pytest.approx(bar) for bar in expected]
+
+
+def test_bar_state_threshold_fields() -> None:
+    state = _state("average", ThresholdTrigger({"v": 4.0, "z": 100.0}))
+    bars = _bars(state, RECORDS + [{b"v": b"nan"}])
+    assert list(bars[0]) == [b"v", b"z", b"x"]
+    assert bars[0][b"z"] != bars[0][b"z"]  # no values
+    assert bars[0][b"v"] == 2.0
+    assert state.trigger is False
+    assert state.output is None
+
+
+REDUCER_NAMES = list(REDUCERS)
+
+
+@pytest.mark.parametrize("reducer", REDUCER_NAMES)
+@pytest.mark.parametrize("trigger", [("threshold", 30.0), ("count", 7)])
+@pytest.mark.parametrize("batch", [1, 5, 300])
+def test_bar_state_update_many_matches_update(
+    reducer: str, trigger: Tuple[str, Union[int, float]], batch: int
+) -> None:
+    rng = np.random.default_rng(batch)
+    records = []
+    for i in range(600):
+        value: OrderedDict[bytes, bytes] = OrderedDict()
+        if rng.random() < 0.9:
+            x = rng.normal(3.0, 2.0) if rng.random() < 0.95 else np.nan
+            value[b"x"] = str(x).encode()
+        if rng.random() < 0.8:
+            value[b"v"] = str(rng.random()).encode()
+        if i > 100 and rng.random() < 0.3:
+            value[b"w"] = str(rng.normal()).encode()
+        records.append((b"a", f"{i}-0".encode(), value))
+
+    def _trigger() -> Trigger:
+        if trigger[0] == "threshold":
+            return ThresholdTrigger({"x": trigger[1]})
+        return CountTrigger(int(trigger[1]))
+
+    single = _state(reducer, _trigger())
+    many = _state(reducer, _trigger())
+    expected: List[BarOutput] = []
+    for record in records:
+        single.update(record)
+        if single.output is not None:
+            expected.append(single.output)
+    result: List[BarOutput] = []
+    for i in range(0, len(records), batch):
+        result.extend(many.update_many(records[i:i + batch]))
+
+    assert len(result) == len(expected)
+    for res, exp in zip(result, expected):
+        assert res[:2] == exp[:2]
+        assert list(res[2]) == list(exp[2])
+        assert res[2] == pytest.approx(exp[2], rel=1e-9, nan_ok=True)
+    assert many.trigger == single.trigger
+
+
+def test_bar_init() -> None:
+    stream = Stream("test_stream")
+    bar1 = Bar(stream, "average", ("x", 5))
+    bar2 = Bar(stream, "weighted_average", 100, weight="volume")
+
+    assert bar1.source_name == "test_stream"
+    assert bar1.node_name == "average_bar(test_stream)[(x, 5)]"
+    assert bar2.node_name == "weighted_average_bar(test_stream)[100]"
+
+
+def test_bar_wrong_init_args() -> None:
+    stream = Stream("test_stream")
+    with pytest.raises(ValueError):
+        Bar(stream, "median", 10)
+    with pytest.raises(TypeError):
+        Bar(stream, "sum", "x")  # type: ignore
+    with pytest.raises(TypeError):
+        Bar(stream, "weighted_average", 10)
+    # the reducers and the rules must implement the abstract methods
+    with pytest.raises(TypeError):
+        Reducer()  # type: ignore
+    with pytest.raises(TypeError):
+        Trigger()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_bar_next_batch(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream", count=10) as stream:
+        bar = Bar(stream, "last", 2)
+        await asyncio.sleep(0.1)
+        for x in [1.0, 3.0, 7.0, 9.0, 11.0]:
+            await redis.xadd("test_stream", {"x": x})
+        await asyncio.sleep(0.1)
+
+        result = await bar.next_batch()
+        await redis.xadd("test_stream", {"x": 13.0})
+        last = await bar.__anext__()
+
+    assert [value[0] for value in result] == [b"last(test_stream)"] * 2
+    assert [value[2] for value in result] == [{b"x": 3.0}, {b"x": 9.0}]
+    assert last is not None and last[2] == {b"x": 13.0}
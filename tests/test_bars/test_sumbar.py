@@ -173,6 +173,8 @@ def test_sumbar_with_wrong_init_args() -> None:
         SumBar(stream, "x")
     with pytest.raises(TypeError):
         SumBar(stream, {"x": 5})
+    with pytest.raises(TypeError):
+        SumBar(stream, [("x", 5), ["y", 2]])  # type: ignore
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,161 @@
+import asyncio
+
+from collections import OrderedDict
+from pathlib import Path
+
+import aioredis
+import pytest
+
+from stream_tools import Checkpoint
+from stream_tools import MemoryPool
+from stream_tools import Stream
+from stream_tools.bars.bar import BarState
+from stream_tools.bars.bar import CountTrigger
+from stream_tools.bars.bar import WeightedAverageReducer
+from stream_tools.checkpoint import dumps
+from stream_tools.checkpoint import loads
+from stream_tools.checkpoint import pack_bytes
+from stream_tools.checkpoint import unpack_bytes
+from stream_tools.filters import MovingAverage
+from stream_tools.filters.moving_average import MovingAverageState
+from stream_tools.stream import StreamQueue
+from stream_tools.tools.join import Join
+
+
+async def _reader(queue: StreamQueue) -> None:
+    pass
+
+
+def test_pack_bytes() -> None:
+    values = [b"a", b"", b"bcd"]
+    data, offsets = pack_bytes(values)
+    assert data.tobytes() == b"abcd"
+    assert offsets.tolist() == [1, 1, 4]
+    assert unpack_bytes(data, offsets) == values
+    assert unpack_bytes(*pack_bytes([])) == []
+
+    arrays = loads(dumps({"data": data, "offsets": offsets}))
+    assert unpack_bytes(arrays["data"], arrays["offsets"]) == values
+
+
+def test_movave_state_dump_load() -> None:
+    state = MovingAverageState({"x": 3, "y": 2})
+    for i in range(5):
+        value = OrderedDict({b"x": b"%d" % i, b"y": b"%d" % (2 * i)})
+        state.update((b"a", f"{i}-0".encode(), value))
+
+    restored = MovingAverageState({"x": 3, "y": 2})
+    restored.load(loads(dumps(state.dump())))
+    record = (b"a", b"5-0", OrderedDict({b"x": b"5", b"y": b"10"}))
+    assert restored.update(record) == state.update(record)
+
+    with pytest.raises(ValueError):
+        MovingAverageState({"x": 4}).load(state.dump())
+
+
+def test_bar_state_dump_load() -> None:
+    state = BarState(WeightedAverageReducer("v"), CountTrigger(4))
+    for i in range(6):
+        value = OrderedDict({b"p": b"%d" % i, b"v": b"%d" % (1 + i)})
+        state.update((b"a", f"{i}-0".encode(), value))
+
+    restored = BarState(WeightedAverageReducer("v"), CountTrigger(4))
+    restored.load(loads(dumps(state.dump())))
+    assert restored.records == 2
+    records = [
+        (b"a", f"{i}-0".encode(), OrderedDict({b"p": b"%d" % i, b"v": b"%d" % (1 + i)}))
+        for i in range(6, 10)
+    ]
+    assert restored.update_many(records) == state.update_many(records)
+
+
+@pytest.mark.asyncio
+async def test_join_dump_load() -> None:
+    join = Join(None, _reader, "time_catch", 1)  # type: ignore
+    join._time_store_state(b"a", b"1000-0", OrderedDict({b"x": b"1"}))
+    join._time_store_state(b"b", b"1500-0", OrderedDict({b"x": b"2.5"}))
+    join._time_store_state(b"b", b"2100-0", OrderedDict({b"x": b"3", b"y": b"4"}))
+
+    restored = Join(None, _reader, "time_catch", 1)  # type: ignore
+    restored.load(loads(dumps(join.dump())))
+    assert restored.state == {b"b": (b"2100-0", OrderedDict({b"x": b"3", b"y": b"4"}))}
+    assert restored.consumed == {b"a": b"1000-0", b"b": b"2100-0"}
+    restored._time_store_state(b"a", b"3200-0", OrderedDict({b"x": b"5"}))
+    assert list(restored.state) == [b"a"]
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe_dump_load() -> None:
+    join = Join(None, _reader, "timeframe", 1)  # type: ignore
+    join._window_store_state(b"a", b"1100-0", OrderedDict({b"x": b"1"}))
+    join._window_store_state(b"b", b"1200-0", OrderedDict({b"x": b"2"}))
+    join._window_store_state(b"a", b"2100-0", OrderedDict({b"x": b"3"}))
+    join._window_store_state(b"b", b"2300-0", OrderedDict({b"x": b"4"}))
+
+    restored = Join(None, _reader, "timeframe", 1)  # type: ignore
+    restored.load(loads(dumps(join.dump())))
+    assert list(restored.closed) == list(join.closed)
+    assert restored.windows == join.windows
+    assert (restored.watermark, restored.slowest) == (join.watermark, join.slowest)
+
+    for node in (join, restored):
+        node._window_store_state(b"a", b"3000-0", OrderedDict({b"x": b"5"}))
+        node._window_store_state(b"b", b"3000-0", OrderedDict({b"x": b"6"}))
+    assert list(restored.closed) == list(join.closed)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("to_file", [False, True])
+async def test_movave_checkpoint_resume(
+    redis: aioredis.Redis, tmp_path: Path, to_file: bool
+) -> None:
+    path = str(tmp_path / "ma.ckpt") if to_file else None
+
+    async with Stream("test_stream_ckpt") as stream:
+        checkpoint = Checkpoint("test_ckpt", interval=0.05, path=path)
+        ma = MovingAverage(stream, ("x", 3), checkpoint=checkpoint)
+        await asyncio.sleep(0.05)
+        for x in [1.0, 2.0, 3.0]:
+            await redis.xadd("test_stream_ckpt", {"x": x})
+        outputs = [await ma.__anext__() for _ in range(3)]
+        assert outputs[-1][2] == {b"x": 2.0}
+        await asyncio.sleep(0.15)
+        await checkpoint.stop()
+        assert checkpoint.saved > 0
+
+    # written while the node is stopped
+    last = await redis.xadd("test_stream_ckpt", {"x": 4.0})
+
+    async with Stream("test_stream_ckpt") as stream:
+        checkpoint = Checkpoint("test_ckpt", interval=60, path=path)
+        ma = MovingAverage(stream, ("x", 3), checkpoint=checkpoint)
+        output = await asyncio.wait_for(ma.__anext__(), 1)
+        await checkpoint.stop()
+    assert output == (b"moving_average(test_stream_ckpt)", last, {b"x": 3.0})
+    assert (await redis.get("test_ckpt") is None) == to_file
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_saved_at_exit(memory: MemoryPool, tmp_path: Path) -> None:
+    path = str(tmp_path / "ma.ckpt")
+    redis = await memory.client()
+
+    async with Stream("s", pool=memory) as stream:
+        checkpoint = Checkpoint("ma", interval=60, path=path)
+        ma = MovingAverage(stream, ("x", 3), checkpoint=checkpoint)
+        await asyncio.sleep(0.01)
+        for x in [1.0, 2.0]:
+            await redis.xadd("s", {"x": x})
+        for _ in range(2):
+            await asyncio.wait_for(ma.__anext__(), 1)
+        assert checkpoint.saved == 0
+    # the state is saved when the stream exits, and the saver is stopped
+    assert checkpoint.saver is None
+    assert checkpoint.saved == 1
+
+    async with Stream("s", pool=memory) as stream:
+        ma = MovingAverage(stream, ("x", 3), checkpoint=Checkpoint("ma", path=path))
+        await asyncio.sleep(0.01)
+        await redis.xadd("s", {"x": 6.0})
+        output = await asyncio.wait_for(ma.__anext__(), 1)
+    assert output[2] == {b"x": 3.0}
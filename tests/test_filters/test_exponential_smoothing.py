@@ -0,0 +1,150 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import aioredis
+
+import numpy as np
+import pytest
+
+from stream_tools import Stream
+from stream_tools.filters import ExponentialSmoothing
+from stream_tools.filters.exponential_smoothing import ExponentialSmoothingState
+from stream_tools.stream import StreamRecord
+from stream_tools.stream import StreamValue
+
+
+def test_exp_smooth_state_alpha() -> None:
+    es_state = ExponentialSmoothingState({"x": ("alpha", 0.5)})
+    assert es_state.update(
+        (b"a", b"1606081071444-0", OrderedDict({b"x": b"1.0", b"y": b"11.0"}))
+    ) == (b"exponential_smoothing(a)", b"1606081071444-0", {b"x": 1.0, b"y": 11.0})
+    # weights 0.5 and 1
+    assert es_state.update(
+        (b"a", b"1606081071587-0", OrderedDict({b"x": b"4.0"}))
+    ) == (b"exponential_smoothing(a)", b"1606081071587-0", {b"x": 3.0})
+    # weights 0.25, 0.5 and 1
+    assert es_state.update(
+        (b"a", b"1606081071619-0", OrderedDict({b"x": b"nan", b"y": b"1.0"}))
+    ) == (b"exponential_smoothing(a)", b"1606081071619-0", {b"x": 3.0, b"y": 1.0})
+    assert es_state.update(
+        (b"a", b"1606081071991-0", OrderedDict({b"x": b"8.0"}))
+    )[2] == {b"x": pytest.approx(10.25 / 1.75)}
+
+
+def test_exp_smooth_state_half_life() -> None:
+    es_state = ExponentialSmoothingState({"x": ("half_life", 1)})
+    es_state.update((b"a", b"1-0", OrderedDict({b"x": b"1.0"})))
+    res = es_state.update((b"a", b"2-0", OrderedDict({b"x": b"4.0"})))
+    assert res[2] == {b"x": pytest.approx(3.0)}
+
+
+def test_exp_smooth_state_time_half_life() -> None:
+    es_state = ExponentialSmoothingState({"x": ("time_half_life", 100)})
+    es_state.update((b"a", b"1000-0", OrderedDict({b"x": b"1.0"})))
+    # same timestamp: same weight
+    res = es_state.update((b"a", b"1000-1", OrderedDict({b"x": b"3.0"})))
+    assert res[2] == {b"x": pytest.approx(2.0)}
+    # two half-lives later: the old values weigh 1/4
+    res = es_state.update((b"a", b"1200-0", OrderedDict({b"x": b"9.0"})))
+    assert res[2] == {b"x": pytest.approx((0.25 * 4.0 + 9.0) / 1.5)}
+
+
+def test_exp_smooth_state_wrong_args() -> None:
+    with pytest.raises(ValueError):
+        ExponentialSmoothingState({"x": ("alpha", 0.0)})
+    with pytest.raises(ValueError):
+        ExponentialSmoothingState({"x": ("alpha", 1.5)})
+    with pytest.raises(ValueError):
+        ExponentialSmoothingState({"x": ("half_life", -1)})
+    with pytest.raises(ValueError):
+        ExponentialSmoothingState({"x": ("span", 3)})
+
+
+@pytest.mark.parametrize(
+    "smoothing",
+    [
+        {"x": ("alpha", 0.1), "y": ("alpha", 1.0)},
+        {"x": ("half_life", 3), "y": ("alpha", 0.999)},
+        {"x": ("time_half_life", 1000), "y": ("time_half_life", 1)},
+    ],
+)
+@pytest.mark.parametrize("batch", [1, 7, 200])
+def test_exp_smooth_state_update_many_matches_update(
+    smoothing: Dict[str, Tuple[str, float]], batch: int
+) -> None:
+    rng = np.random.default_rng(batch)
+    records: List[StreamRecord] = []
+    timestamp = 1000
+    for i in range(500):
+        # irregular and sometimes out of order timestamps
+        timestamp += int(rng.integers(-3, 500))
+        value: StreamValue = OrderedDict()
+        if rng.random() < 0.9:
+            x = rng.normal(100.0, 5.0) if rng.random() < 0.95 else np.nan
+            value[b"x"] = str(x).encode()
+        if rng.random() < 0.7:
+            value[b"y"] = str(rng.normal()).encode()
+        value[b"z"] = b"1.5"
+        records.append((b"a", f"{timestamp}-{i}".encode(), value))
+
+    single = ExponentialSmoothingState(smoothing)
+    many = ExponentialSmoothingState(smoothing)
+    expected = [single.update(record) for record in records]
+    result = []
+    for i in range(0, len(records), batch):
+        result.extend(many.update_many(records[i:i + batch]))
+
+    assert len(result) == len(expected)
+    for res, exp in zip(result, expected):
+        assert res[:2] == exp[:2]
+        assert list(res[2]) == list(exp[2])
+        assert res[2] == pytest.approx(exp[2], rel=1e-9)
+
+
+def test_exponential_smoothing_init() -> None:
+    stream1 = Stream("test_stream")
+    stream2 = Stream("another_test_stream")
+    es1 = ExponentialSmoothing(stream1, ("x", 0.5))
+    es2 = ExponentialSmoothing(
+        stream2, [("x", "half_life", 5), ("y", "time_half_life", 2000)]
+    )
+
+    assert es1.source_name == "test_stream"
+    assert es1.node_name == "exponential_smoothing(test_stream)[(x, alpha, 0.5)]"
+    assert es2.node_name == (
+        "exponential_smoothing(another_test_stream)"
+        "[(x, half_life, 5), (y, time_half_life, 2000)]"
+    )
+
+
+def test_exponential_smoothing_wrong_init_args() -> None:
+    stream = Stream("test_stream")
+    with pytest.raises(TypeError):
+        ExponentialSmoothing(stream)  # type: ignore
+    with pytest.raises(TypeError):
+        ExponentialSmoothing(stream, 0.5)  # type: ignore
+    with pytest.raises(TypeError):
+        ExponentialSmoothing(stream, {"x": 0.5})  # type: ignore
+    with pytest.raises(ValueError):
+        ExponentialSmoothing(stream, ("x", "window", 5))
+
+
+@pytest.mark.asyncio
+async def test_exponential_smoothing_next_batch(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream", count=10) as stream:
+        smoothing = ExponentialSmoothing(stream, ("x", 0.5))
+        await asyncio.sleep(0.1)
+        for x in [1.0, 4.0]:
+            await redis.xadd("test_stream", {"x": x})
+        await asyncio.sleep(0.1)
+
+        result = await smoothing.next_batch()
+        await redis.xadd("test_stream", {"x": 8.0})
+        last = await smoothing.__anext__()
+
+    assert [value[2] for value in result] == [{b"x": 1.0}, {b"x": 3.0}]
+    assert last[2] == {b"x": pytest.approx(10.25 / 1.75)}
@@ -1,13 +1,17 @@
 import asyncio
 
 from collections import OrderedDict
+from typing import Dict
 from typing import List
 
+import aioredis
+import numpy as np
 import pytest
 
 from stream_tools import Stream
 from stream_tools.filters import MovingAverage
 from stream_tools.filters.moving_average import MovingAverageState
+from stream_tools.filters.moving_average import RingWindow
 
 
 def test_movave_state_one_arg_one_value() -> None:
@@ -245,3 +249,120 @@ async def test_moving_average_with_missing_field(redis) -> None:
     ]
 
     assert expected_res == res
+
+
+@pytest.mark.asyncio
+async def test_moving_average_next_batch(redis: aioredis.Redis) -> None:
+    async def _main() -> List[Dict[bytes, float]]:
+        stream = Stream("test_stream", count=10)
+        async with stream:
+            result: List[Dict[bytes, float]] = []
+            moving_average = MovingAverage(stream, ("x", 2))
+            while len(result) < 3:
+                for value in await moving_average.next_batch():
+                    result.append(dict(value[2]))
+            return result
+
+    async def _checker() -> None:
+        await asyncio.sleep(0.1)
+        for x in [1.0, 3.0, 7.0]:
+            await redis.xadd("test_stream", {"x": x})
+
+    _, res = await asyncio.gather(_checker(), _main())
+
+    assert res == [{b"x": 1.0}, {b"x": 2.0}, {b"x": 5.0}]
+
+
+@pytest.mark.asyncio
+async def test_moving_average_bounded_queue(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream", count=10) as stream:
+        moving_average = MovingAverage(stream, ("x", 2), 2, "drop_oldest")
+        await asyncio.sleep(0.1)
+        for x in [1.0, 3.0, 7.0, 9.0]:
+            await redis.xadd("test_stream", {"x": x})
+        await asyncio.sleep(0.1)
+
+        result = await moving_average.next_batch()
+
+    assert moving_average.queue.dropped == 2
+    assert [dict(value[2]) for value in result] == [{b"x": 7.0}, {b"x": 8.0}]
+
+
+@pytest.mark.parametrize("size", [1, 3, 10, 100])
+def test_ring_window_matches_nanmean(size: int) -> None:
+    rng = np.random.default_rng(size)
+    values = rng.normal(100.0, 20.0, 1000)
+    values[rng.random(1000) < 0.1] = np.nan
+
+    window = RingWindow(size)
+    for i, value in enumerate(values):
+        window.push(value)
+        last = values[max(0, i - size + 1):i + 1]
+        if np.isnan(last).all():
+            assert np.isnan(window.mean())
+        else:
+            assert window.mean() == pytest.approx(np.nanmean(last), rel=1e-12)
+
+
+def test_ring_window_with_inf() -> None:
+    window = RingWindow(2)
+    window.push(1.0)
+    window.push(float("inf"))
+    assert window.mean() == float("inf")
+    window.push(3.0)
+    assert window.mean() == float("inf")
+    window.push(5.0)
+    assert window.mean() == 4.0
+
+
+def test_movave_state_nan_warm_up() -> None:
+    ma_state = MovingAverageState({"x": 2})
+    res = ma_state.update((b"a", b"1-0", OrderedDict({b"x": b"nan"})))
+    assert res[2] == {}
+    res = ma_state.update((b"a", b"2-0", OrderedDict({b"x": b"4.0"})))
+    assert res[2] == {b"x": 4.0}
+    res = ma_state.update((b"a", b"3-0", OrderedDict({b"x": b"nan"})))
+    assert res[2] == {b"x": 4.0}
+    res = ma_state.update((b"a", b"4-0", OrderedDict({b"x": b"nan"})))
+    assert res[2] == {}
+
+
+@pytest.mark.parametrize("size", [1, 3, 50])
+@pytest.mark.parametrize("batch", [1, 7, 200])
+def test_movave_state_update_many_matches_update(size: int, batch: int) -> None:
+    rng = np.random.default_rng(size * batch)
+    records = []
+    for i in range(500):
+        value = OrderedDict()
+        if rng.random() < 0.9:
+            x = rng.normal(100.0, 5.0) if rng.random() < 0.95 else np.nan
+            value[b"x"] = str(x).encode()
+        if rng.random() < 0.7:
+            value[b"y"] = str(rng.normal()).encode()
+        value[b"z"] = b"1.5"
+        records.append((b"a", f"{i}-0".encode(), value))
+
+    single = MovingAverageState({"x": size, "y": size + 1})
+    many = MovingAverageState({"x": size, "y": size + 1})
+    expected = [single.update(record) for record in records]
+    result = []
+    for i in range(0, len(records), batch):
+        result.extend(many.update_many(records[i:i + batch]))
+
+    assert len(result) == len(expected)
+    for res, exp in zip(result, expected):
+        assert res[:2] == exp[:2]
+        assert list(res[2]) == list(exp[2])
+        assert res[2] == pytest.approx(exp[2], rel=1e-9)
+    assert many.new_output == pytest.approx(single.new_output, rel=1e-9)
+
+
+def test_movave_state_update_many_with_inf() -> None:
+    ma_state = MovingAverageState({"x": 2})
+    records = [
+        (b"a", f"{i}-0".encode(), OrderedDict({b"x": x}))
+        for i, x in enumerate([b"1.0", b"inf", b"3.0", b"5.0"])
+    ]
+    res = ma_state.update_many(records)
+    assert [r[2][b"x"] for r in res] == [1.0, float("inf"), float("inf"), 4.0]
+    assert ma_state.update_many([]) == []
@@ -0,0 +1,203 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+import aioredis
+
+import numpy as np
+import pytest
+
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools.filters import RLSFilter
+from stream_tools.filters.rls import RLSState
+from stream_tools.stream import StreamRecord
+
+
+def _records(
+    n: int, seed: int = 0, coefficients: Sequence[float] = (1.5, 2.0, -3.0)
+) -> List[StreamRecord]:
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, 2))
+    y = coefficients[0] + x @ coefficients[1:] + rng.normal(scale=0.01, size=n)
+    return [
+        (
+            b"a",
+            f"{i}-0".encode(),
+            OrderedDict(
+                {
+                    b"f1": str(x[i, 0]).encode(),
+                    b"f2": str(x[i, 1]).encode(),
+                    b"y": str(y[i]).encode(),
+                }
+            ),
+        )
+        for i in range(n)
+    ]
+
+
+def test_rls_state_fit() -> None:
+    rls_state = RLSState(["f1", "f2"], "y")
+    for record in _records(500):
+        name, idx, output = rls_state.update(record)
+
+    assert name == b"rls(a)"
+    assert idx == b"499-0"
+    assert list(output) == [b"intercept", b"f1", b"f2", b"prediction", b"error"]
+    assert output[b"intercept"] == pytest.approx(1.5, abs=1e-2)
+    assert output[b"f1"] == pytest.approx(2.0, abs=1e-2)
+    assert output[b"f2"] == pytest.approx(-3.0, abs=1e-2)
+
+
+def test_rls_state_matches_least_squares() -> None:
+    records = _records(50)
+    rls_state = RLSState(["f1", "f2"], "y", delta=1e8)
+    rls_state.update_many(records)
+
+    x = np.array([[1.0, float(r[2][b"f1"]), float(r[2][b"f2"])] for r in records])
+    y = np.array([float(r[2][b"y"]) for r in records])
+    expected = np.linalg.lstsq(x, y, rcond=None)[0]
+    assert rls_state.weights == pytest.approx(expected, rel=1e-5)
+
+
+def test_rls_state_forgetting() -> None:
+    records = _records(300)
+    changed = _records(300, seed=1, coefficients=(-1.5, -2.0, 3.0))
+
+    forgetting = RLSState(["f1", "f2"], "y", forgetting=0.9)
+    remembering = RLSState(["f1", "f2"], "y")
+    for rls_state in (forgetting, remembering):
+        rls_state.update_many(records + changed)
+
+    assert forgetting.weights == pytest.approx([-1.5, -2.0, 3.0], abs=1e-2)
+    assert remembering.weights[1] == pytest.approx(0.0, abs=0.5)
+
+
+def test_rls_state_missing_values() -> None:
+    rls_state = RLSState(["f1"], "y", intercept=False)
+    assert rls_state.update((b"a", b"1-0", OrderedDict({b"f1": b"1.0"}))) == (
+        b"rls(a)",
+        b"1-0",
+        {b"f1": 0.0},
+    )
+    output = rls_state.update(
+        (b"a", b"2-0", OrderedDict({b"f1": b"1.0", b"y": b"nan"}))
+    )[2]
+    assert output == {b"f1": 0.0}
+    output = rls_state.update(
+        (b"a", b"3-0", OrderedDict({b"f1": b"1.0", b"y": b"2.0"}))
+    )[2]
+    assert output[b"prediction"] == 0.0
+    assert output[b"error"] == 2.0
+    assert output[b"f1"] == pytest.approx(2.0 * 100.0 / 101.0)
+
+
+@pytest.mark.parametrize("forgetting", [1.0, 0.95])
+@pytest.mark.parametrize("batch", [1, 7, 200])
+def test_rls_state_update_many_matches_update(forgetting: float, batch: int) -> None:
+    records = _records(500)
+    del records[10][2][b"f1"]
+    records[20][2][b"y"] = b"nan"
+
+    single = RLSState(["f1", "f2"], "y", forgetting)
+    many = RLSState(["f1", "f2"], "y", forgetting)
+    expected = [single.update(record) for record in records]
+    result: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+    for i in range(0, len(records), batch):
+        result.extend(many.update_many(records[i:i + batch]))
+
+    assert len(result) == len(expected)
+    for res, exp in zip(result, expected):
+        assert res[:2] == exp[:2]
+        assert list(res[2]) == list(exp[2])
+        assert res[2] == pytest.approx(exp[2], rel=1e-9, abs=1e-12)
+
+
+def test_rls_state_joined_state() -> None:
+    rls_state = RLSState([("s1", "x")], ("s2", "y"))
+    state = {
+        b"s1": (b"1606081071444-0", OrderedDict({b"x": b"1.0"})),
+        b"s2": (b"1606081071587-0", OrderedDict({b"y": b"3.0"})),
+    }
+    name, idx, output = rls_state.update(state)
+    assert name == b"rls(s1,s2)"
+    assert idx == b"1606081071587-0"
+    assert list(output) == [b"intercept", b"s1:x", b"prediction", b"error"]
+
+
+def test_rls_state_wrong_args() -> None:
+    with pytest.raises(ValueError):
+        RLSState(["x"], "y", forgetting=0.0)
+    with pytest.raises(ValueError):
+        RLSState(["x"], "y", delta=-1.0)
+    with pytest.raises(TypeError):
+        RLSState([("s", "x", "z")], "y")  # type: ignore
+
+
+def test_rls_filter_init() -> None:
+    stream = Stream("test_stream")
+    rls = RLSFilter(stream, ["x", "z"], "y", forgetting=0.99)
+
+    assert rls.source_name == "test_stream"
+    assert rls.node_name == "rls(test_stream)[(intercept, x, z) -> y, 0.99]"
+    with pytest.raises(TypeError):
+        RLSFilter(stream, [("test_stream", "x")], "y")
+    with pytest.raises(TypeError):
+        RLSFilter("test_stream", "x", "y")  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_rls_filter_next_batch(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream", count=10) as stream:
+        rls = RLSFilter(stream, "x", "y", intercept=False)
+        await asyncio.sleep(0.1)
+        await redis.xadd("test_stream", {"x": 1.0, "y": 2.0})
+        await redis.xadd("test_stream", {"x": 2.0, "y": 4.0})
+        await asyncio.sleep(0.1)
+
+        result = await rls.next_batch()
+        await redis.xadd("test_stream", {"x": 3.0, "y": 6.0})
+        last = await rls.__anext__()
+
+    assert len(result) == 2
+    assert result[0][2][b"error"] == 2.0
+    assert last[2][b"x"] == pytest.approx(2.0, rel=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_rls_filter_join(redis: aioredis.Redis) -> None:
+    stream1 = Stream("test_stream_1")
+    stream2 = Stream("test_stream_2")
+    async with Streams([stream1, stream2]) as streams:
+        join = streams.join("update_state")
+        rls = RLSFilter(
+            join, ("test_stream_1", "x"), ("test_stream_2", "y"), intercept=False
+        )
+        await asyncio.sleep(0.1)
+        for x in [1.0, 2.0, 3.0]:
+            await redis.xadd("test_stream_1", {"x": x})
+            await redis.xadd("test_stream_2", {"y": 2 * x})
+        await asyncio.sleep(0.1)
+
+        result: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+        while len(result) < 6:
+            result.extend(await rls.next_batch())
+
+    assert result[0][0] == b"rls(test_stream_1,test_stream_2)"
+    # no target yet
+    assert result[0][2] == {b"test_stream_1:x": 0.0}
+
+    # (x, y) of the joined states
+    expected = RLSState([("s1", "x")], ("s2", "y"), intercept=False)
+    for x, y in [(1.0, 2.0), (2.0, 2.0), (2.0, 4.0), (3.0, 4.0), (3.0, 6.0)]:
+        expected.update(
+            {
+                b"s1": (b"1-0", OrderedDict({b"x": str(x).encode()})),
+                b"s2": (b"1-0", OrderedDict({b"y": str(y).encode()})),
+            }
+        )
+    assert result[-1][2][b"test_stream_1:x"] == pytest.approx(expected.weights[0])
@@ -0,0 +1,187 @@
+import asyncio
+
+from typing import List
+
+import aioredis
+import pytest  # type: ignore
+
+from stream_tools import ConsumerGroup
+from stream_tools import MemoryPool
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools.memory import MemoryPipeline
+
+
+async def _read_n(stream: Stream, n: int) -> List[bytes]:
+    result: List[bytes] = []
+    async for batch in stream.read_batch():
+        result.extend(row[1] for row in batch)
+        if len(result) >= n:
+            break
+    return result
+
+
+def test_consumer_group_init() -> None:
+    group = ConsumerGroup("group", "consumer", ack_count=10, claim_idle=500)
+    stream = Stream("test", group=group)
+
+    assert stream.group is group
+    assert group.group_name == "group"
+    assert group.consumer_name == "consumer"
+    assert group.ack_count == 10
+    assert group.claim_idle == 500
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_split_entries(redis: aioredis.Redis) -> None:
+    group_a = ConsumerGroup("group", "a")
+    group_b = ConsumerGroup("group", "b")
+
+    async with Stream("test_stream_group", count=2, group=group_a) as stream_a:
+        async with Stream("test_stream_group", count=2, group=group_b) as stream_b:
+            check = [
+                await redis.xadd("test_stream_group", {"x": i}) for i in range(8)
+            ]
+            res_a, res_b = await asyncio.gather(
+                _read_n(stream_a, 4), _read_n(stream_b, 4)
+            )
+
+    assert not set(res_a) & set(res_b)
+    assert sorted(res_a + res_b) == check
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_batched_ack(redis: aioredis.Redis) -> None:
+    group = ConsumerGroup("group", "a", ack_count=5, ack_interval=60)
+
+    async with Stream("test_stream_group", count=10, group=group) as stream:
+        for i in range(10):
+            await redis.xadd("test_stream_group", {"x": i})
+        async for batch in stream.read_batch():
+            for row in batch[:4]:
+                stream.ack(row)
+            await asyncio.sleep(0.05)
+            # below the count threshold nothing is sent
+            assert (await redis.xpending("test_stream_group", "group"))[0] == 10
+            stream.ack(batch[4])
+            await asyncio.sleep(0.05)
+            assert (await redis.xpending("test_stream_group", "group"))[0] == 5
+            break
+
+    # the waiting acknowledgements are sent when the context is closed
+    assert (await redis.xpending("test_stream_group", "group"))[0] == 5
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_claim_dead_consumer(redis: aioredis.Redis) -> None:
+    await redis.xgroup_create("test_stream_group", "group", mkstream=True)
+    check = [await redis.xadd("test_stream_group", {"x": i}) for i in range(3)]
+    # a consumer reads the entries and dies without acknowledging them
+    await redis.xread_group(
+        "group", "dead", ["test_stream_group"], latest_ids=[">"]
+    )
+    await asyncio.sleep(0.1)
+
+    group = ConsumerGroup("group", "alive", claim_idle=50)
+    async with Stream("test_stream_group", count=10, group=group) as stream:
+        res = await _read_n(stream, 3)
+
+    assert res == check
+    pending = await redis.xpending("test_stream_group", "group", "-", "+", 10)
+    assert [p[1] for p in pending] == [b"alive"] * 3
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_recover_own_pending(redis: aioredis.Redis) -> None:
+    check = [await redis.xadd("test_stream_group", {"x": i}) for i in range(3)]
+    await redis.xgroup_create("test_stream_group", "group", latest_id="0")
+    await redis.xread_group(
+        "group", "a", ["test_stream_group"], latest_ids=[">"]
+    )
+
+    async with Stream("test_stream_group", group=ConsumerGroup("group", "a")) as s:
+        res = await _read_n(s, 3)
+
+    assert res == check
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_merge(redis: aioredis.Redis) -> None:
+    group = ConsumerGroup("group", "a", ack_count=1)
+    stream1 = Stream("test_stream_group_1")
+    stream2 = Stream("test_stream_group_2")
+
+    async with Streams([stream1, stream2], group=group) as streams:
+        await asyncio.sleep(0.1)
+        check = [
+            await redis.xadd("test_stream_group_1", {"x": 1}),
+            await redis.xadd("test_stream_group_2", {"x": 2}),
+        ]
+        result = []
+        async for value in streams.merge():
+            result.append(value[1])
+            if len(result) == 2:
+                break
+        await asyncio.sleep(0.05)
+
+    assert sorted(result) == sorted(check)
+    assert (await redis.xpending("test_stream_group_1", "group"))[0] == 0
+    assert (await redis.xpending("test_stream_group_2", "group"))[0] == 0
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_failed_ack(
+    memory: MemoryPool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    redis = await memory.client()
+    group = ConsumerGroup("group", "a", ack_count=2, ack_interval=0.05)
+    await group.start(redis, ["s"])
+    for i in range(3):
+        await redis.xadd("s", {"x": i})
+    rows = await group.read(redis, count=10, timeout=0)
+
+    failures: List[MemoryPipeline] = []
+    execute = MemoryPipeline.execute
+
+    async def _execute(pipe: MemoryPipeline) -> List:
+        if len(failures) < 2:
+            failures.append(pipe)
+            raise aioredis.ConnectionClosedError("closed")
+        return await execute(pipe)
+
+    monkeypatch.setattr(MemoryPipeline, "execute", _execute)
+    # the XACKs triggered by the count fail, the acknowledgements are kept
+    for row in rows[:2]:
+        group.ack(row[0], row[1])
+    await asyncio.sleep(0.001)
+    assert (len(failures), group.acks_waiting) == (1, 2)
+    group.ack(rows[2][0], rows[2][1])
+    await asyncio.sleep(0.001)
+    assert (len(failures), group.acks_waiting) == (2, 3)
+    assert (await redis.xpending("s", "group"))[0] == 3
+
+    # the periodic XACK goes on after the failures, and sends them all
+    await asyncio.sleep(0.1)
+    assert group.acks_waiting == 0
+    assert (await redis.xpending("s", "group"))[0] == 0
+    await group.stop()
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_stop_waits_for_flush(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    group = ConsumerGroup("group", "a", ack_count=1, ack_interval=60)
+    await group.start(redis, ["s"])
+    for i in range(2):
+        await redis.xadd("s", {"x": i})
+    rows = await group.read(redis, count=10, timeout=0)
+
+    group.ack(rows[0][0], rows[0][1])
+    flushing = group.flushing
+    group.acks[rows[1][0]].append(rows[1][1])
+    group.acks_waiting += 1
+    await group.stop()
+
+    assert flushing is not None and flushing.done()
+    assert group.flushing is None
+    assert (await redis.xpending("s", "group"))[0] == 0
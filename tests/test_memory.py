@@ -0,0 +1,160 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import AsyncGenerator
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import aioredis
+import pytest
+
+from stream_tools import Backfill
+from stream_tools import Checkpoint
+from stream_tools import ConsumerGroup
+from stream_tools import MemoryPool
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools import StreamWriter
+from stream_tools.filters import MovingAverage
+from stream_tools.stream import StreamRecord
+from stream_tools.tools.join import State
+
+
+@pytest.mark.asyncio
+async def test_memory_stream_commands(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    ids = [await redis.xadd("s", {"x": i, b"y": 0.5}) for i in range(5)]
+
+    assert await redis.xlen("s") == 5
+    assert await redis.xrange("s", count=2) == [
+        (ids[0], OrderedDict({b"x": b"0", b"y": b"0.5"})),
+        (ids[1], OrderedDict({b"x": b"1", b"y": b"0.5"})),
+    ]
+    assert [row[0] for row in await redis.xrange("s", ids[1], ids[3])] == ids[1:4]
+    assert [row[0] for row in await redis.xrange("s", "(" + ids[1].decode())] == ids[2:]
+    assert [row[0] for row in await redis.xrevrange("s", count=2)] == ids[:-3:-1]
+    assert await redis.xread(["s"], timeout=None, latest_ids=[ids[3]]) == [
+        (b"s", ids[4], OrderedDict({b"x": b"4", b"y": b"0.5"}))
+    ]
+
+    await redis.xadd("s", {"x": 9}, message_id=b"99999999999999-3")
+    with pytest.raises(aioredis.ReplyError):
+        await redis.xadd("s", {"x": 9}, message_id=b"99999999999999-3")
+    assert await redis.xadd("s", {"x": 9}) == b"99999999999999-4"
+
+    for i in range(300):
+        await redis.xadd("t", {"x": i}, max_len=150)
+    assert await redis.xlen("t") == 200
+    await redis.xadd("t", {"x": 300}, max_len=150, exact_len=True)
+    assert await redis.xlen("t") == 150
+
+    await redis.set("k", b"v")
+    assert await redis.get("k") == b"v"
+    await redis.flushall()
+    assert await redis.xlen("s") == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_blocking_read(memory: MemoryPool) -> None:
+    reader = await memory.acquire()
+    writer = await memory.client()
+
+    assert await reader.xread(["s"], timeout=50, latest_ids=[b"$"]) == []
+    read = asyncio.ensure_future(reader.xread(["s", "t"], latest_ids=["$", "$"]))
+    await asyncio.sleep(0.01)
+    assert not read.done()
+    idx = await writer.xadd("t", {"x": 1})
+    assert await read == [(b"t", idx, OrderedDict({b"x": b"1"}))]
+
+    # closing the client interrupts the blocked reads
+    read = asyncio.ensure_future(reader.xread(["s"], latest_ids=["$"]))
+    await asyncio.sleep(0.01)
+    memory.release(reader)
+    with pytest.raises(asyncio.CancelledError):
+        await read
+
+
+@pytest.mark.asyncio
+async def test_memory_pipeline(memory: MemoryPool) -> None:
+    async with StreamWriter("out", flush_count=10, pool=memory) as writer:
+        async with Stream("in", count=100, pool=memory) as stream:
+            node = MovingAverage(stream, ("x", 2))
+            await asyncio.sleep(0)
+            redis = await memory.client()
+            for i in range(20):
+                await redis.xadd("in", {"x": i})
+            outputs: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+            while len(outputs) < 20:
+                batch = await node.next_batch()
+                outputs.extend(batch)
+                for output in batch:
+                    writer.write(output)
+
+    rows = await redis.xrange("out")
+    assert len(rows) == 20
+    assert rows[-1][1] == OrderedDict({b"x": b"18.5"})
+
+
+@pytest.mark.asyncio
+async def test_memory_consumer_group(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    group_a = ConsumerGroup("group", "a", ack_count=1)
+    group_b = ConsumerGroup("group", "b", ack_count=1)
+
+    async with Stream("s", count=1, group=group_a, pool=memory) as stream_a:
+        async with Stream("s", count=1, group=group_b, pool=memory) as stream_b:
+            check = [await redis.xadd("s", {"x": i}) for i in range(6)]
+            res_a = [row[1] async for row in _take(stream_a, 3)]
+            res_b = [row[1] async for row in _take(stream_b, 3)]
+            await asyncio.sleep(0.01)
+
+    assert sorted(res_a + res_b) == check
+    # the last entry of each consumer is acknowledged with the next read
+    assert (await redis.xpending("s", "group"))[:3] == [2, check[2], check[5]]
+
+    with pytest.raises(aioredis.ReplyError):
+        await redis.xgroup_create("s", "group")
+    await redis.xread_group("group", "dead", ["s"], latest_ids=[">"], timeout=None)
+    await redis.xadd("s", {"x": 6})
+    await redis.xread_group("group", "dead", ["s"], latest_ids=[">"])
+    pending = await redis.xpending("s", "group", "-", "+", 10)
+    assert [p[1] for p in pending] == [b"a", b"b", b"dead"]
+    assert await redis.xclaim("s", "group", "alive", 0, pending[2][0]) == [
+        (pending[2][0], OrderedDict({b"x": b"6"}))
+    ]
+    assert await redis.xread_group(
+        "group", "alive", ["s"], latest_ids=["0"]
+    ) == [(b"s", pending[2][0], OrderedDict({b"x": b"6"}))]
+
+
+async def _take(stream: Stream, n: int) -> AsyncGenerator[StreamRecord, None]:
+    async for row in stream.read():
+        yield row
+        n -= 1
+        if n == 0:
+            return
+
+
+@pytest.mark.asyncio
+async def test_memory_streams_backfill_checkpoint(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    for i in range(30):
+        await redis.xadd("a" if i % 2 else "b", {"x": i})
+
+    async with Streams(
+        [Backfill("a", page=4), Backfill("b", page=4)], pool=memory
+    ) as streams:
+        join = streams.join("update_state")
+        for _ in range(30):
+            state: State = await join.__anext__()  # type: ignore
+    assert {k: v[1][b"x"] for k, v in state.items()} == {b"a": b"29", b"b": b"28"}
+
+    checkpoint = Checkpoint("ckpt", interval=0.01)
+    async with Backfill("a", pool=memory) as stream:
+        node = MovingAverage(stream, ("x", 2), checkpoint=checkpoint)
+        while not (await node.next_batch())[-1][1] == (await redis.xrevrange("a"))[0][0]:
+            pass
+        await asyncio.sleep(0.05)
+        await checkpoint.stop()
+    assert await redis.get("ckpt")
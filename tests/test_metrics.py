@@ -0,0 +1,135 @@
+import asyncio
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import pytest
+
+from stream_tools import MemoryPool
+from stream_tools import MetricsRegistry
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools.bars import SumBar
+from stream_tools.filters import MovingAverage
+from stream_tools.metrics import Histogram
+from stream_tools.stream import StreamRecord
+
+
+def test_histogram_buckets() -> None:
+    histogram = Histogram([0.1, 1.0])
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.buckets() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+
+
+@pytest.mark.asyncio
+async def test_metrics_nodes(memory: MemoryPool) -> None:
+    metrics = MetricsRegistry()
+    redis = await memory.client()
+    async with Stream("a", count=100, pool=memory) as a:
+        async with Stream("b", count=100, pool=memory) as b:
+            average = MovingAverage(a, ("x", 2), metrics=metrics)
+            bar = SumBar(b, ("x", 10), metrics=metrics)
+            await asyncio.sleep(0)
+            for i in range(8):
+                await redis.xadd("a", {"x": i})
+                await redis.xadd("b", {"x": i})
+            await asyncio.sleep(0.01)
+
+            snapshot = metrics.snapshot()
+            assert snapshot[average.node_name]["queue_depth"] == 8
+            outputs: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+            while len(outputs) < 8:
+                outputs.extend(await average.next_batch())
+            bars = await bar.next_batch()
+
+    snapshot = metrics.snapshot()
+    assert set(snapshot) == {average.node_name, bar.node_name}
+
+    node = snapshot[average.node_name]
+    assert node["records_in"] == node["records_out"] == 8
+    assert node["queue_depth"] == 0
+    assert node["dropped"] == 0
+    assert node["processing_seconds"]["count"] >= 1
+    latency = node["latency_seconds"]
+    assert latency["count"] == node["processing_seconds"]["count"]
+    assert latency["buckets"]["+Inf"] == latency["count"]
+    assert 0 <= latency["sum"] < 10
+
+    node = snapshot[bar.node_name]
+    assert node["records_in"] == 8
+    assert node["records_out"] == len(bars) == 2
+
+
+@pytest.mark.asyncio
+async def test_metrics_join_merge(memory: MemoryPool) -> None:
+    metrics = MetricsRegistry()
+    redis = await memory.client()
+    pair = [Stream("a", count=100), Stream("b", count=100)]
+    async with Streams(pair, pool=memory) as streams:
+        join = streams.join("update_state", metrics=metrics)
+        await asyncio.sleep(0)
+        for i in range(4):
+            await redis.xadd("a" if i % 2 else "b", {"x": i})
+        for _ in range(4):
+            await join.__anext__()
+
+    pair = [Stream("a", count=100), Stream("b", count=100)]
+    async with Streams(pair, pool=memory) as streams:
+        merge = streams.merge(metrics=metrics)
+        await asyncio.sleep(0)
+        for i in range(3):
+            await redis.xadd("a", {"x": i})
+        records: List[StreamRecord] = []
+        while len(records) < 3:
+            records.extend(await merge.next_batch())
+
+    snapshot = metrics.snapshot()
+    assert join.node_name == "update_state_join(a,b)[]"
+    assert snapshot[join.node_name]["records_in"] == 4
+    assert snapshot[join.node_name]["records_out"] == 4
+    assert merge.node_name == "merge(a,b)"
+    assert snapshot[merge.node_name]["records_out"] == 3
+
+
+@pytest.mark.asyncio
+async def test_metrics_prometheus_endpoint(memory: MemoryPool) -> None:
+    metrics = MetricsRegistry()
+    redis = await memory.client()
+    async with Stream("a", count=100, pool=memory) as a:
+        average = MovingAverage(a, ("x", 2), metrics=metrics)
+        await asyncio.sleep(0)
+        await redis.xadd("a", {"x": 1})
+        await average.__anext__()
+
+    text = metrics.prometheus()
+    label = f'node="{average.node_name}"'
+    assert "# TYPE stream_tools_records_in_total counter" in text
+    assert f"stream_tools_records_in_total{{{label}}} 1" in text
+    assert f"stream_tools_queue_depth{{{label}}} 0" in text
+    assert f'stream_tools_latency_seconds_bucket{{{label},le="+Inf"}} 1' in text
+    assert f"stream_tools_processing_seconds_count{{{label}}} 1" in text
+
+    await metrics.serve(0)
+    assert metrics.server is not None
+    port = metrics.server.sockets[0].getsockname()[1]
+    responses = []
+    try:
+        for path in (b"/metrics", b"/other"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET " + path + b" HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            responses.append((await reader.read()).split(b"\r\n\r\n", 1))
+            writer.close()
+    finally:
+        await metrics.close()
+
+    head, body = responses[0]
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"text/plain; version=0.0.4" in head
+    assert body.decode() == metrics.prometheus()
+    head, body = responses[1]
+    assert head.startswith(b"HTTP/1.1 404")
@@ -0,0 +1,97 @@
+import asyncio
+
+from typing import Dict
+from typing import List
+
+import aioredis
+import pytest  # type: ignore
+
+from stream_tools import RedisPool
+from stream_tools import Stream
+from stream_tools import Streams
+from stream_tools.filters import MovingAverage
+
+
+def test_pool_init() -> None:
+    pool = RedisPool("unix:///tmp/redis.sock", minsize=2, maxsize=5, db=1)
+
+    assert pool.address == "unix:///tmp/redis.sock"
+    assert pool.minsize == 2
+    assert pool.maxsize == 5
+    assert pool.settings == {"db": 1}
+
+
+@pytest.mark.asyncio
+async def test_pool_shared_client(redis: aioredis.Redis) -> None:
+    async with RedisPool() as pool:
+        client_a, client_b = await asyncio.gather(pool.client(), pool.client())
+        assert client_a is client_b
+
+        dedicated = await pool.acquire()
+        assert dedicated is not client_a
+        pool.release(dedicated)
+        await asyncio.sleep(0.05)
+        assert pool.idle == [dedicated]
+
+    assert client_a.closed
+    assert dedicated.closed
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_blocked_connection(redis: aioredis.Redis) -> None:
+    async with RedisPool() as pool:
+        reader = await pool.acquire()
+        # a read blocked forever, abandoned by its reader
+        read = asyncio.ensure_future(
+            reader.xread(["test_stream_pool"], timeout=0, latest_ids=[b"$"])
+        )
+        await asyncio.sleep(0.05)
+        read.cancel()
+        pool.release(reader)
+        await asyncio.sleep(0.05)
+        assert pool.idle == [reader]
+        assert not reader.closed
+
+        # the connection is unblocked: the next reader gets the new entries
+        reused = await pool.acquire()
+        assert reused is reader
+        idx = await redis.xadd("test_stream_pool", {"x": 1.0})
+        res = await asyncio.wait_for(
+            reused.xread(["test_stream_pool"], timeout=1000, latest_ids=[b"0-0"]),
+            1,
+        )
+        assert res[-1][1] == idx
+        pool.release(reused)
+    assert reader.closed
+
+
+@pytest.mark.asyncio
+async def test_pool_shared_by_streams(redis: aioredis.Redis) -> None:
+    async with RedisPool() as pool:
+        stream1 = Stream("test_stream_1", pool=pool)
+        stream2 = Stream("test_stream_2", pool=pool)
+        async with stream1, stream2:
+            async with Streams([stream1, stream2], pool=pool) as streams:
+                assert stream1.client is stream2.client is streams.client
+                assert stream1.redis is not stream2.redis
+                assert len(pool.dedicated) == 3
+
+                async def _checker() -> None:
+                    await asyncio.sleep(0.1)
+                    await redis.xadd("test_stream_1", {"x": 1.0})
+                    await redis.xadd("test_stream_1", {"x": 3.0})
+
+                async def _main() -> List[Dict[bytes, float]]:
+                    result: List[Dict[bytes, float]] = []
+                    async for value in MovingAverage(stream1, ("x", 2)):
+                        result.append(value[2])
+                        if len(result) == 2:
+                            return result
+                    return result
+
+                _, res = await asyncio.gather(_checker(), _main())
+                assert res == [{b"x": 1.0}, {b"x": 2.0}]
+
+            assert len(pool.dedicated) == 2
+        # the pool is not closed by the streams sharing it
+        assert pool.shared is not None and not pool.shared.closed
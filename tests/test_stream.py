@@ -5,12 +5,19 @@ from collections import OrderedDict
 from typing import Tuple
 from typing import Dict
 from typing import List
+from typing import Optional
 from typing import TYPE_CHECKING
 
 import aioredis
 import pytest  # type: ignore
 
+from stream_tools import MemoryPool
 from stream_tools import Stream
+from stream_tools.filters import MovingAverage
+from stream_tools.stream import StreamQueue
+from stream_tools.stream import StreamRecord
+from stream_tools.utils.ids import Position
+from stream_tools.utils.channel import Channel
 
 if TYPE_CHECKING:
     StreamValue = OrderedDict[bytes, bytes]
@@ -76,3 +83,117 @@ async def test_read_multiple_records(redis: aioredis.Redis) -> None:
 
     for idx, row in enumerate(res):
         assert row[2] == {b"x": str(idx).encode()}
+
+
+def test_stream_init_batch_options() -> None:
+    stream = Stream("test", count=100, block=50)
+    assert stream.count == 100
+    assert stream.block == 50
+
+
+@pytest.mark.asyncio
+async def test_read_batch(redis: aioredis.Redis) -> None:
+    check = []
+    for i in range(5):
+        check.append(await redis.xadd("test_stream_1", {"x": i}))
+
+    async with Stream("test_stream_1", count=3) as stream:
+        result = []
+        async for batch in stream.read_batch():
+            result.append(batch)
+            if sum(len(b) for b in result) == 5:
+                break
+
+    assert [len(batch) for batch in result] == [3, 2]
+    assert [row[1] for batch in result for row in batch] == check
+    assert result[1][1][2] == {b"x": b"4"}
+
+
+@pytest.mark.asyncio
+async def test_read_keeps_cursor(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream_1", count=4) as stream:
+        queue: StreamQueue = Channel()
+        task = asyncio.ensure_future(stream._read(queue))
+        await asyncio.sleep(0.1)
+
+        check = [await redis.xadd("test_stream_1", {"x": i}) for i in range(20)]
+
+        result: List[StreamRecord] = []
+        while len(result) < 20:
+            result.extend(await queue.get_batch())
+        task.cancel()
+
+    assert [row[1] for row in result] == check
+    assert stream.last_id == check[-1]
+    assert stream.delivered == 20
+
+
+@pytest.mark.asyncio
+async def test_read_resume_from_cursor(redis: aioredis.Redis) -> None:
+    check = [await redis.xadd("test_stream_1", {"x": i}) for i in range(5)]
+
+    async with Stream("test_stream_1", count=10) as stream:
+        stream.last_id = check[2]
+        async for batch in stream.read_batch():
+            result = batch
+            break
+
+    assert [row[1] for row in result] == check[3:]
+
+
+@pytest.mark.asyncio
+async def test_read_start_positions(redis: aioredis.Redis) -> None:
+    check = []
+    for i in range(6):
+        check.append(await redis.xadd("test_stream_1", {"x": i}))
+        await asyncio.sleep(0.002)
+    seek = int(check[3].split(b"-")[0])
+
+    async def _first_batch(start: Optional[Position]) -> List[bytes]:
+        async with Stream("test_stream_1", count=10, start=start) as stream:
+            async for batch in stream.read_batch():
+                return [row[1] for row in batch]
+        return []
+
+    assert await _first_batch(None) == check
+    assert await _first_batch("-") == check
+    assert await _first_batch(check[2]) == check[2:]
+    assert await _first_batch(seek) == check[3:]
+
+
+@pytest.mark.asyncio
+async def test_read_queue_start_positions(redis: aioredis.Redis) -> None:
+    check = [await redis.xadd("test_stream_1", {"x": i}) for i in range(3)]
+
+    async with Stream("test_stream_1", count=10, start=b"-") as stream:
+        queue: StreamQueue = Channel()
+        task = asyncio.ensure_future(stream._read(queue))
+        assert [row[1] for row in await queue.get_batch()] == check
+        task.cancel()
+
+    async with Stream("test_stream_1", count=10, start="$") as stream:
+        queue = Channel()
+        task = asyncio.ensure_future(stream._read(queue))
+        await asyncio.sleep(0.05)
+        new = await redis.xadd("test_stream_1", {"x": 3})
+        assert [row[1] for row in await queue.get_batch()] == [new]
+        task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_stream_readers_cancelled_at_exit(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    stream = Stream("s", pool=memory)
+    # the reader of a node created before the context starts with it
+    ma = MovingAverage(stream, ("x", 2))
+    assert not stream.readers
+    async with stream:
+        assert len(stream.readers) == 1
+        await asyncio.sleep(0.01)
+        await redis.xadd("s", {"x": 1.0})
+        assert await asyncio.wait_for(ma.__anext__(), 1) == (
+            b"moving_average(s)", stream.last_id, {b"x": 1.0}
+        )
+        readers = list(stream.readers)
+    assert all(reader.done() for reader in readers)
+    assert not stream.readers
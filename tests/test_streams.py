@@ -1,5 +1,12 @@
+import asyncio
+
+import aioredis
+import pytest
+
 from stream_tools import Stream
 from stream_tools import Streams
+from stream_tools.stream import StreamQueue
+from stream_tools.utils.channel import Channel
 
 
 def test_streams_init() -> None:
@@ -9,3 +16,47 @@ def test_streams_init() -> None:
 
     assert streams.stream_list == [stream_a, stream_b]
     assert streams.stream_names == ['a', 'b']
+
+
+@pytest.mark.asyncio
+async def test_streams_reads_share(redis: aioredis.Redis) -> None:
+    for i in range(10):
+        await redis.xadd("test_stream_1", {"x": i})
+    for i in range(3):
+        await redis.xadd("test_stream_2", {"x": i})
+
+    stream1 = Stream("test_stream_1", count=2)
+    stream2 = Stream("test_stream_2")
+    async with Streams([stream1, stream2]) as streams:
+        streams.last_ids = {b"test_stream_1": b"0-0", b"test_stream_2": b"0-0"}
+        queue: StreamQueue = Channel()
+        reader = asyncio.ensure_future(streams._reads(queue))
+        await asyncio.sleep(0.1)
+        reader.cancel()
+
+    names = b"".join(row[0][-1:] for row in queue.items)
+    # up to two entries of stream 1 for each entry of stream 2
+    assert names == b"1121121121111"
+    assert streams.delivered == 13
+    assert streams.last_ids == {
+        b"test_stream_1": queue.items[-1][1],
+        b"test_stream_2": queue.items[8][1],
+    }
+
+
+@pytest.mark.asyncio
+async def test_streams_reads_start(redis: aioredis.Redis) -> None:
+    old = await redis.xadd("test_stream_1", {"x": 0})
+    await redis.xadd("test_stream_2", {"x": 0})
+
+    stream1 = Stream("test_stream_1", start=b"-")
+    stream2 = Stream("test_stream_2")
+    async with Streams([stream1, stream2]) as streams:
+        queue: StreamQueue = Channel()
+        reader = asyncio.ensure_future(streams._reads(queue))
+        await asyncio.sleep(0.05)
+        new = await redis.xadd("test_stream_2", {"x": 1})
+        await asyncio.sleep(0.05)
+        reader.cancel()
+
+    assert [row[1] for row in queue.items] == [old, new]
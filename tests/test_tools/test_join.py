@@ -1,12 +1,25 @@
 import asyncio
 
+from collections import OrderedDict
+from typing import Any
 from typing import List
 from typing import Dict
+from typing import Union
+from typing import cast
 
+import aioredis
 import pytest
 
+from stream_tools import MemoryPool
 from stream_tools import Stream
 from stream_tools import Streams
+from stream_tools.memory import MemoryRedis
+from stream_tools.memory import MemoryServer
+from stream_tools.stream import StreamQueue
+from stream_tools.tools.join import Join
+from stream_tools.tools.join import State
+from stream_tools.tools.state import PersistentState
+from stream_tools.tools.state import StateView
 
 
 @pytest.mark.asyncio
@@ -51,7 +64,8 @@ async def test_join_update_state(redis) -> None:
                     # value: {b'stream_name': (
                     #     b'id', OrderedDict(b'k': b'v')
                     # )}
-                    result.append({k: dict(v[1]) for k, v in value.items()})
+                    state = cast(State, value)
+                    result.append({k: dict(v[1]) for k, v in state.items()})
                     i += 1
                 else:
                     break
@@ -95,7 +109,8 @@ async def test_join_time_catch(redis) -> None:
                     # value: {b'stream_name': (
                     #     b'id', OrderedDict(b'k': b'v')
                     # )}
-                    result.append({k: dict(v[1]) for k, v in value.items()})
+                    state = cast(State, value)
+                    result.append({k: dict(v[1]) for k, v in state.items()})
                     i += 1
                 else:
                     break
@@ -133,3 +148,201 @@ async def test_join_time_catch(redis) -> None:
     ]
 
     assert [{k: v for k, v in val.items()} for val in res] == expected_res
+
+
+async def _no_reader(queue: StreamQueue) -> None:
+    pass
+
+
+def _join(join_method: str, *args: Union[int, float], **kwargs: Any) -> Join:
+    # a join with no reader, fed through its pending records
+    return Join(MemoryRedis(MemoryServer()), _no_reader, join_method, *args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe_with_no_timeframe() -> None:
+    with pytest.raises(TypeError):
+        _join("timeframe")
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe_lateness() -> None:
+    join = _join("timeframe", 0.01, 0.02)
+
+    def _store(stream: bytes, idx: bytes) -> None:
+        join._window_store_state(stream, idx, OrderedDict({b"x": idx}))
+
+    _store(b"s2", b"1000-0")
+    _store(b"s1", b"1001-0")
+    _store(b"s1", b"1015-0")
+    _store(b"s1", b"1025-0")
+    # the slow stream keeps the window open
+    _store(b"s2", b"1003-0")
+    assert not join.closed
+    # ... but no more than the lateness
+    _store(b"s1", b"1031-0")
+    assert list(join.closed) == [
+        {b"s2": (b"1003-0", {b"x": b"1003-0"}), b"s1": (b"1001-0", {b"x": b"1001-0"})}
+    ]
+    _store(b"s2", b"1004-0")
+    assert join.late == 1
+    # all the streams are past the window
+    _store(b"s2", b"1026-0")
+    assert len(join.closed) == 2
+    assert join.closed[1] == {b"s1": (b"1015-0", {b"x": b"1015-0"})}
+    assert list(join.windows) == [1020, 1030]
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe_waits_for_all_streams() -> None:
+    join = _join("timeframe", 0.01, streams=[b"s1", b"s2"])
+
+    def _store(stream: bytes, idx: bytes) -> None:
+        join._window_store_state(stream, idx, OrderedDict({b"x": idx}))
+
+    # a whole batch of a stream is joined before the other stream is seen
+    for i in range(1000, 1050, 3):
+        _store(b"s1", f"{i}-0".encode())
+    assert not join.closed
+    _store(b"s2", b"1001-0")
+    _store(b"s2", b"1012-0")
+    assert [set(window) for window in join.closed] == [{b"s1", b"s2"}]
+    assert join.late == 0
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe_interleaved_batches(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    for i in range(1, 201):
+        await redis.xadd("a", {"x": i}, message_id=f"{i}-0".encode())
+        await redis.xadd("b", {"x": i}, message_id=f"{i}-0".encode())
+
+    pair = [Stream("a", count=50, start="-"), Stream("b", count=50, start="-")]
+    async with Streams(pair, pool=memory) as streams:
+        join = streams.join("timeframe", 0.01)
+        windows: List[State] = []
+        # the window [200, 210) stays open
+        while len(windows) < 20:
+            windows.extend(cast(List[State], await join.next_batch()))
+
+    assert join.late == 0
+    assert all(set(window) == {b"a", b"b"} for window in windows)
+    assert [window[b"a"][0] for window in windows] == [
+        f"{i}-0".encode() for i in range(9, 200, 10)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_join_timeframe(redis: aioredis.Redis) -> None:
+    stream1 = Stream("test_stream_1")
+    stream2 = Stream("test_stream_2")
+
+    async with Streams([stream1, stream2]) as streams:
+        join = streams.join("timeframe", 0.01)
+        await asyncio.sleep(0.1)
+        await redis.xadd("test_stream_1", {"x": 1.0}, message_id=b"1001-0")
+        await redis.xadd("test_stream_2", {"x": 2.0}, message_id=b"1002-0")
+        await redis.xadd("test_stream_1", {"x": 3.0}, message_id=b"1005-0")
+        await redis.xadd("test_stream_2", {"x": 4.0}, message_id=b"1012-0")
+        await redis.xadd("test_stream_1", {"x": 5.0}, message_id=b"1031-0")
+        await redis.xadd("test_stream_2", {"x": 6.0}, message_id=b"1032-0")
+
+        first = cast(State, await join.__anext__())
+        second = cast(List[State], await join.next_batch())
+
+    assert {k: (v[0], dict(v[1])) for k, v in first.items()} == {
+        b"test_stream_1": (b"1005-0", {b"x": b"3.0"}),
+        b"test_stream_2": (b"1002-0", {b"x": b"2.0"}),
+    }
+    # the empty window [1020, 1030) is not emitted
+    assert [{k: v[0] for k, v in window.items()} for window in second] == [
+        {b"test_stream_2": b"1012-0"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_join_time_catch_eviction() -> None:
+    join = _join("time_catch", 0.01)
+    for i in range(1000):
+        # 100 streams, every stream is updated every 100ms
+        join._time_store_state(
+            f"s{i % 100}".encode(), f"{i}-0".encode(), OrderedDict()
+        )
+        assert sorted(join.state) == sorted(
+            f"s{j % 100}".encode() for j in range(max(0, i - 10), i + 1)
+        )
+        assert join.state_time.keys() == join.state.keys()
+    assert len(join.expiry) <= 2 * len(join.state) + 64
+
+
+def test_persistent_state_snapshot() -> None:
+    state = PersistentState(buckets=4)
+    for i in range(20):
+        state[i] = i
+    snapshot = state.snapshot()
+    state[0] = -1
+    del state[1]
+    state[20] = 20
+
+    assert dict(snapshot) == {i: i for i in range(20)}
+    assert len(snapshot) == 20
+    assert dict(state) == {0: -1, **{i: i for i in range(2, 21)}}
+    assert len(state) == 20
+    # only the updated buckets are copied
+    assert sum(a is b for a, b in zip(state.buckets, snapshot.buckets)) == 2
+    with pytest.raises(KeyError):
+        del state[1]
+    with pytest.raises(TypeError):
+        snapshot[0] = 0  # type: ignore
+
+
+def test_join_wrong_emit() -> None:
+    with pytest.raises(ValueError):
+        _join("update_state", emit="copy")
+
+
+@pytest.mark.asyncio
+async def test_join_emit_delta() -> None:
+    join = _join("time_catch", 0.01, emit="delta")
+    records = [
+        (b"s1", b"1-0", OrderedDict({b"x": b"1"})),
+        (b"s2", b"5-0", OrderedDict({b"x": b"2"})),
+        (b"s1", b"14-0", OrderedDict({b"x": b"3"})),
+        (b"s3", b"30-0", OrderedDict({b"x": b"4"})),
+    ]
+    join.pending.extend(records[:3])
+    assert await join.__anext__() == ({b"s1": (b"1-0", {b"x": b"1"})}, [])
+    assert await join.next_batch() == (
+        {b"s2": (b"5-0", {b"x": b"2"}), b"s1": (b"14-0", {b"x": b"3"})},
+        [],
+    )
+    join.pending.append(records[3])
+    assert await join.__anext__() == (
+        {b"s3": (b"30-0", {b"x": b"4"})},
+        [b"s2", b"s1"],
+    )
+
+
+@pytest.mark.asyncio
+async def test_join_emit_snapshot() -> None:
+    join = _join("update_state", emit="snapshot")
+    join.pending.extend(
+        [
+            (b"s1", b"1-0", OrderedDict({b"x": b"1"})),
+            (b"s2", b"2-0", OrderedDict({b"x": b"2"})),
+        ]
+    )
+    first = cast(StateView, await join.__anext__())
+    second = cast(StateView, await join.__anext__())
+    join.pending.append((b"s1", b"3-0", OrderedDict({b"x": b"3"})))
+    third = cast(StateView, await join.next_batch())
+
+    assert dict(first) == {b"s1": (b"1-0", {b"x": b"1"})}
+    assert dict(second) == {
+        b"s1": (b"1-0", {b"x": b"1"}),
+        b"s2": (b"2-0", {b"x": b"2"}),
+    }
+    assert dict(third) == {
+        b"s1": (b"3-0", {b"x": b"3"}),
+        b"s2": (b"2-0", {b"x": b"2"}),
+    }
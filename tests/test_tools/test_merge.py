@@ -1,13 +1,21 @@
 import asyncio
 
+import aioredis
 import pytest
 
+from collections import OrderedDict
+from typing import Any
 from typing import List
 from typing import Dict
 from typing import Tuple
 
 from stream_tools import Stream
 from stream_tools import Streams
+from stream_tools.memory import MemoryRedis
+from stream_tools.memory import MemoryServer
+from stream_tools.stream import StreamQueue
+from stream_tools.stream import StreamRecord
+from stream_tools.tools.merge import Merge
 
 
 @pytest.mark.asyncio
@@ -53,3 +61,94 @@ async def test_merge(redis) -> None:
     assert res[2][2] == {b"x": str(float(1)).encode()}
     assert res[3][2] == {b"x": str(float((1 + 1.0) * 2)).encode()}
     assert res[4][2] == {b"x": str(float(2)).encode()}
+
+
+@pytest.mark.asyncio
+async def test_merge_does_not_skip_records(redis: aioredis.Redis) -> None:
+    async def _main() -> List[StreamRecord]:
+        stream1 = Stream("test_stream_merge_1")
+        stream2 = Stream("test_stream_merge_2")
+        async with Streams([stream1, stream2]) as streams:
+            result: List[StreamRecord] = []
+            async for value in streams.merge():
+                result.append(value)
+                if len(result) == 20:
+                    break
+        return result
+
+    async def _checker() -> List[bytes]:
+        await asyncio.sleep(0.1)
+        result = []
+        for i in range(10):
+            result.append(await redis.xadd("test_stream_merge_1", {"x": i}))
+            result.append(await redis.xadd("test_stream_merge_2", {"x": i}))
+        return result
+
+    check, res = await asyncio.gather(_checker(), _main())
+
+    assert sorted(row[1] for row in res) == sorted(check)
+
+
+async def _no_reader(queue: StreamQueue) -> None:
+    pass
+
+
+def _merge(**kwargs: Any) -> Merge:
+    # a merge with no reader, fed through its queue
+    return Merge(MemoryRedis(MemoryServer()), _no_reader, **kwargs)
+
+
+def _record(stream: bytes, idx: bytes) -> StreamRecord:
+    return stream, idx, OrderedDict({b"x": b"1"})
+
+
+@pytest.mark.asyncio
+async def test_merge_ordered_watermark() -> None:
+    merge = _merge(ordered=True, streams=[b"a", b"b"], wait=None)
+    merge.queue.put_nowait(_record(b"a", b"1-0"))
+    merge.queue.put_nowait(_record(b"a", b"3-0"))
+    merge.queue.put_nowait(_record(b"b", b"2-0"))
+    assert await merge.next_batch() == [
+        _record(b"a", b"1-0"),
+        _record(b"b", b"2-0"),
+    ]
+    merge.queue.put_nowait(_record(b"b", b"3-0"))
+    assert await merge.__anext__() == _record(b"a", b"3-0")
+    assert await merge.__anext__() == _record(b"b", b"3-0")
+    with pytest.raises(TypeError):
+        _merge(ordered=True)
+
+
+@pytest.mark.asyncio
+async def test_merge_ordered_wait() -> None:
+    merge = _merge(ordered=True, streams=[b"a", b"b"], wait=0.05)
+    merge.queue.put_nowait(_record(b"a", b"5-0"))
+    merge.queue.put_nowait(_record(b"a", b"6-0"))
+    # b is silent
+    result = await asyncio.wait_for(merge.next_batch(), 1)
+    assert result == [_record(b"a", b"5-0"), _record(b"a", b"6-0")]
+    merge.queue.put_nowait(_record(b"b", b"4-0"))
+    assert await merge.__anext__() == _record(b"b", b"4-0")
+    assert merge.late == 1
+
+
+@pytest.mark.asyncio
+async def test_merge_ordered(redis: aioredis.Redis) -> None:
+    stream1 = Stream("test_stream_merge_1")
+    stream2 = Stream("test_stream_merge_2")
+    async with Streams([stream1, stream2]) as streams:
+        merge = streams.merge(ordered=True)
+        await asyncio.sleep(0.1)
+        ids = [b"1001-0", b"1002-0", b"1002-1", b"1005-0", b"1007-0"]
+        await redis.xadd("test_stream_merge_1", {"x": 1}, message_id=ids[0])
+        await redis.xadd("test_stream_merge_1", {"x": 1}, message_id=ids[2])
+        await redis.xadd("test_stream_merge_1", {"x": 1}, message_id=ids[3])
+        await redis.xadd("test_stream_merge_2", {"x": 2}, message_id=ids[1])
+        await redis.xadd("test_stream_merge_2", {"x": 2}, message_id=ids[4])
+
+        result: List[StreamRecord] = []
+        while len(result) < 4:
+            result.extend(await asyncio.wait_for(merge.next_batch(), 1))
+
+    # the last record of stream 2 waits for stream 1
+    assert [row[1] for row in result] == ids[:4]
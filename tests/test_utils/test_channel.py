@@ -0,0 +1,101 @@
+import asyncio
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import pytest
+
+from stream_tools.utils.channel import Channel
+
+
+@pytest.mark.asyncio
+async def test_channel_get_batch() -> None:
+    channel: Channel[int] = Channel()
+    for i in range(5):
+        channel.put_nowait(i)
+
+    assert await channel.get_batch(max_size=2) == [0, 1]
+    assert await channel.get_batch() == [2, 3, 4]
+    assert channel.empty()
+
+
+@pytest.mark.asyncio
+async def test_channel_get_batch_waits_for_items() -> None:
+    channel: Channel[str] = Channel()
+
+    async def _producer() -> None:
+        await asyncio.sleep(0.1)
+        channel.put_nowait("a")
+        channel.put_nowait("b")
+
+    res = await asyncio.gather(channel.get_batch(), _producer())
+
+    assert res[0] == ["a", "b"]
+
+
+def test_channel_wrong_overflow() -> None:
+    with pytest.raises(ValueError):
+        Channel(10, "drop_random")
+
+
+def test_channel_drop_newest() -> None:
+    channel: Channel[int] = Channel(2, "drop_newest")
+    for i in range(5):
+        channel.put_nowait(i)
+
+    assert channel.full()
+    assert channel.dropped == 3
+    assert [channel.get_nowait(), channel.get_nowait()] == [0, 1]
+
+
+def test_channel_drop_oldest() -> None:
+    channel: Channel[int] = Channel(2, "drop_oldest")
+    for i in range(5):
+        channel.put_nowait(i)
+
+    assert channel.dropped == 3
+    assert [channel.get_nowait(), channel.get_nowait()] == [3, 4]
+    assert channel.empty()
+
+
+def test_channel_coalesce() -> None:
+    channel: Channel[Tuple[bytes, bytes, Dict]] = Channel(2, "coalesce")
+    channel.put_nowait((b"a", b"1-0", {}))
+    channel.put_nowait((b"b", b"2-0", {}))
+    channel.put_nowait((b"a", b"3-0", {}))
+    channel.put_nowait((b"a", b"4-0", {}))
+
+    assert channel.coalesced == 2
+    assert channel.dropped == 0
+    assert channel.get_nowait() == (b"a", b"4-0", {})
+
+    channel.put_nowait((b"a", b"5-0", {}))
+    channel.put_nowait((b"b", b"6-0", {}))
+    assert channel.coalesced == 3
+    assert channel.get_nowait() == (b"b", b"6-0", {})
+    assert channel.get_nowait() == (b"a", b"5-0", {})
+
+    with pytest.raises(asyncio.QueueEmpty):
+        channel.get_nowait()
+
+
+@pytest.mark.asyncio
+async def test_channel_block() -> None:
+    channel: Channel[int] = Channel(2)
+
+    async def _producer() -> None:
+        await channel.put_many(range(6))
+
+    async def _consumer() -> List[int]:
+        result: List[int] = []
+        await asyncio.sleep(0.1)
+        assert channel.qsize() == 2
+        while len(result) < 6:
+            result.extend(await channel.get_batch())
+        return result
+
+    res = await asyncio.gather(_producer(), _consumer())
+
+    assert res[1] == list(range(6))
+    assert channel.dropped == 0
@@ -0,0 +1,84 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import aioredis
+import pytest  # type: ignore
+
+from stream_tools import Float64Codec
+from stream_tools import Stream
+from stream_tools import StreamWriter
+from stream_tools import TextCodec
+from stream_tools.utils.codec import Codec
+from stream_tools.filters import MovingAverage
+
+
+def test_float64_codec() -> None:
+    codec = Float64Codec()
+    fields = codec.encode({b"x": 1.5, "y": b"-2", b"z": 3})
+    assert fields[b"fields"] == b"x,y,z"
+    assert len(fields[b"float64"]) == 24
+
+    value = codec.decode(OrderedDict(fields))
+    assert value == OrderedDict({b"x": 1.5, b"y": -2.0, b"z": 3.0})
+    assert list(value) == [b"x", b"y", b"z"]
+    # text entries are not decoded
+    text = OrderedDict({b"x": b"1.5"})
+    assert codec.decode(text) is text
+    with pytest.raises(ValueError):
+        codec.encode({b"x": b"bid"})
+    # the names are separated by commas
+    with pytest.raises(ValueError):
+        codec.encode({b"x,y": 1.0, b"z": 2.0})
+    with pytest.raises(ValueError):
+        codec.encode({"a,b": 1.0})
+
+
+def test_float64_codec_compress() -> None:
+    codec = Float64Codec(compress=64)
+    small = codec.encode({b"x": 1.0})
+    large = codec.encode({f"x{i}".encode(): 0.0 for i in range(100)})
+    assert b"float64" in small
+    assert b"float64z" in large
+    assert len(large[b"float64z"]) < 800
+    assert codec.decode(OrderedDict(large))[b"x99"] == 0.0
+
+
+def test_float64_codec_bounded_caches() -> None:
+    codec = Float64Codec()
+    codec.CACHE_SIZE = 4
+    for i in range(10):
+        fields = {f"x{j}".encode(): float(j) for j in range(i + 1)}
+        assert codec.decode(OrderedDict(codec.encode(fields))) == fields
+    assert list(codec.structs) == [7, 8, 9, 10]
+    assert len(codec.names) == 4
+    assert codec.decode(OrderedDict(codec.encode({b"x0": 1.0}))) == {b"x0": 1.0}
+
+
+def test_text_codec() -> None:
+    codec = TextCodec()
+    records = [(b"a", b"1-0", OrderedDict({b"x": b"1"}))]
+    assert codec.decode_many(records) is records
+    assert codec.encode({b"x": 1}) == {b"x": 1}
+    with pytest.raises(TypeError):
+        Codec()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_float64_codec_stream(redis: aioredis.Redis) -> None:
+    codec = Float64Codec()
+    async with Stream("test_stream", count=10, codec=codec) as stream:
+        average = MovingAverage(stream, ("x", 2))
+        await asyncio.sleep(0.1)
+        async with StreamWriter("test_stream", codec=codec) as writer:
+            for x in [1.0, 3.0, 5.0]:
+                writer.write({b"x": x, b"y": 0.5})
+        result: List[Tuple[bytes, bytes, Dict[bytes, float]]] = []
+        while len(result) < 3:
+            result.extend(await average.next_batch())
+
+    assert [row[2][b"x"] for row in result] == [1.0, 2.0, 4.0]
+    assert result[0][2][b"y"] == 0.5
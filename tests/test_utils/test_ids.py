@@ -0,0 +1,41 @@
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from stream_tools import MemoryPool
+from stream_tools.utils.ids import id_key
+from stream_tools.utils.ids import latest_id
+from stream_tools.utils.ids import next_id
+from stream_tools.utils.ids import previous_id
+from stream_tools.utils.ids import to_id
+
+
+def test_to_id() -> None:
+    assert to_id(b"1-2") == b"1-2"
+    assert to_id("-") == b"-"
+    assert to_id(1606081071444) == b"1606081071444"
+    assert to_id(datetime(1970, 1, 1, 0, 0, 1, tzinfo=timezone.utc)) == b"1000"
+    with pytest.raises(TypeError):
+        to_id(True)
+
+
+def test_next_previous_id() -> None:
+    assert id_key(b"12-3") == (12, 3)
+    assert id_key(b"12") == (12, 0)
+    assert next_id(b"12-3") == b"12-4"
+    assert next_id(b"12-18446744073709551615") == b"13-0"
+    assert previous_id(b"12-3") == b"12-2"
+    assert previous_id(b"12-0") == b"11-18446744073709551615"
+    assert previous_id(b"12") == b"11-18446744073709551615"
+    assert previous_id(b"0") == b"0-0"
+    assert previous_id(b"-") == b"0-0"
+
+
+@pytest.mark.asyncio
+async def test_latest_id(memory: MemoryPool) -> None:
+    redis = await memory.client()
+    assert await latest_id(redis, "s") == b"0-0"
+    await redis.xadd("s", {"x": 1}, message_id=b"5-1")
+    last = await redis.xadd("s", {"x": 2})
+    assert await latest_id(redis, "s") == last
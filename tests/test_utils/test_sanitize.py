@@ -1,9 +1,20 @@
 from collections import namedtuple
 from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
 
+import numpy as np
 import pytest
 
+from stream_tools import BatchSanitizer
+from stream_tools import compile_decoder
 from stream_tools import sanitize
+from stream_tools import sanitize_batch
 
 
 
@@ -120,3 +131,113 @@ def test_namedtuple_sanitize(test_input, expected):
 def test_dataclass_sanitize():
     pass
 """
+
+
+class Quote(NamedTuple):
+    price: float
+    size: int
+    side: str
+    venue: bytes = b"x"
+
+
+@dataclass
+class Trade:
+    price: float
+    size: Optional[int]
+    tags: List[str] = field(default_factory=list)
+
+
+def test_compile_decoder_namedtuple() -> None:
+    decoder = compile_decoder(Quote)
+    data = {b"price": b"1.5", b"size": b"3", b"side": b"bid", b"other": b"1"}
+    assert decoder(data) == Quote(1.5, 3, "bid")
+    assert decoder({**data, b"venue": b"y"}).venue == b"y"
+    assert compile_decoder(datapoint)({b"x": b"1.2", b"y": b"3", b"z": b"bid"}) == (
+        datapoint(1.2, 3, "bid")
+    )
+    with pytest.raises(KeyError):
+        decoder({b"price": b"1.5"})
+    with pytest.raises(ValueError):
+        decoder({b"price": b"1.5", b"size": b"3.5", b"side": b"bid"})
+
+
+timed = namedtuple("timed", "timestamp x z")
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {b"timestamp": b"1607350062.554", b"x": b"1.2", b"z": b"bid"},
+        {b"timestamp": b"1607350062554", b"x": b"3", b"z": b"1e3"},
+        {b"timestamp": b"now", b"x": b"a", b"z": b"-2"},
+    ],
+)
+def test_compile_decoder_matches_sanitize(record: Dict[bytes, bytes]) -> None:
+    assert compile_decoder(timed)(record) == sanitize(record, timed)
+
+
+def test_compile_decoder_timestamp() -> None:
+    record = {b"timestamp": b"1607350062.554", b"x": b"1.2", b"z": b"bid"}
+    assert compile_decoder(timed)(record) == timed(1607350062554, 1.2, "bid")
+    assert compile_decoder({"timestamp": Any})(record) == {
+        "timestamp": 1607350062554
+    }
+    # a typed field is converted as its type
+    assert compile_decoder({"timestamp": float})(record) == {
+        "timestamp": 1607350062.554
+    }
+
+
+def test_compile_decoder_dataclass() -> None:
+    decoder = compile_decoder(Trade)
+    first = decoder({b"price": b"1.5", b"size": b"3"})
+    second = decoder({b"price": b"2", b"size": b"4"})
+    assert first == Trade(1.5, 3)
+    assert first.tags is not second.tags
+    assert sanitize({b"price": b"2", b"size": b"4"}, Trade) == second
+
+
+def test_compile_decoder_mapping() -> None:
+    decoder = compile_decoder(
+        {"x": float, "n": int, "raw": bytes, "ms": lambda v: int(float(v) * 1000)}
+    )
+    data = {b"x": b"1.5", b"n": b"2", b"raw": b"a", b"ms": b"1607350062.554"}
+    assert decoder(data) == {"x": 1.5, "n": 2, "raw": b"a", "ms": 1607350062554}
+    with pytest.raises(TypeError):
+        compile_decoder({"x": complex})
+    with pytest.raises(TypeError):
+        compile_decoder(1.0)
+
+
+RECORDS = [
+    (b"a", b"1607350062554-0", OrderedDict({b"x": b"1.5", b"y": b"3"})),
+    (b"b", b"1607350062555-1", OrderedDict({b"y": b"4"})),
+    (b"a", b"1607350062556-0", OrderedDict({b"x": b"nan", b"z": b"-2e3"})),
+]
+
+
+def test_sanitize_batch() -> None:
+    columns = sanitize_batch(RECORDS, masks=True)
+
+    assert list(columns.streams) == [b"a", b"b", b"a"]
+    assert list(columns.ids) == [r[1] for r in RECORDS]
+    assert columns.timestamps.tolist() == [
+        1607350062554, 1607350062555, 1607350062556
+    ]
+    assert list(columns.values) == ["x", "y", "z"]
+    np.testing.assert_array_equal(columns.values["x"], [1.5, np.nan, np.nan])
+    np.testing.assert_array_equal(columns.values["y"], [3.0, 4.0, np.nan])
+    np.testing.assert_array_equal(columns.values["z"], [np.nan, np.nan, -2000.0])
+    assert columns.masks["x"].tolist() == [True, False, True]
+
+
+def test_batch_sanitizer_reuses_buffers() -> None:
+    sanitizer = BatchSanitizer(["y"], capacity=2)
+    first = sanitizer(RECORDS)
+    second = sanitizer(RECORDS[1:])
+    assert second.values["y"].base is first.values["y"].base
+    np.testing.assert_array_equal(second.values["y"], [4.0, np.nan])
+    assert list(second.values) == ["y"]
+    assert sanitizer(RECORDS).masks == {}
+    with pytest.raises(ValueError):
+        sanitizer([(b"a", b"1-0", {b"y": b"bid"})])
@@ -0,0 +1,111 @@
+import asyncio
+
+from collections import OrderedDict
+
+import aioredis
+import pytest  # type: ignore
+
+from stream_tools import Stream
+from stream_tools import StreamWriter
+from stream_tools.filters import MovingAverage
+
+
+def test_stream_writer_init() -> None:
+    writer = StreamWriter("test", flush_count=10, maxlen=1000)
+
+    assert writer.name == "test"
+    assert writer.flush_count == 10
+    assert writer.maxlen == 1000
+    assert writer.exact_len is False
+
+
+@pytest.mark.asyncio
+async def test_stream_writer_batches(redis: aioredis.Redis) -> None:
+    async with StreamWriter(
+        "test_stream_out", flush_count=5, flush_interval=60
+    ) as writer:
+        for i in range(4):
+            writer.write({"x": i})
+        await asyncio.sleep(0.05)
+        assert await redis.xlen("test_stream_out") == 0
+
+        writer.write((b"ma(a)", b"1-0", {b"x": 4.5}))
+        await asyncio.sleep(0.05)
+        assert await redis.xlen("test_stream_out") == 5
+
+        # join states are written with the "stream:field" names
+        writer.write(
+            {
+                b"a": (b"1-0", OrderedDict({b"x": b"1"})),
+                b"b": (b"2-0", OrderedDict({b"y": b"2"})),
+            }
+        )
+        writer.write({})
+
+    rows = await redis.xrange("test_stream_out")
+    assert [row[1] for row in rows] == [
+        OrderedDict({b"x": b"0"}),
+        OrderedDict({b"x": b"1"}),
+        OrderedDict({b"x": b"2"}),
+        OrderedDict({b"x": b"3"}),
+        OrderedDict({b"x": b"4.5"}),
+        OrderedDict({b"a:x": b"1", b"b:y": b"2"}),
+    ]
+    assert writer.written == 6
+    assert writer.last_id == rows[-1][0]
+
+
+@pytest.mark.asyncio
+async def test_stream_writer_interval_and_maxlen(redis: aioredis.Redis) -> None:
+    async with StreamWriter(
+        "test_stream_out", flush_interval=0.05, maxlen=10, exact_len=True
+    ) as writer:
+        for i in range(20):
+            writer.write({"x": i})
+        await asyncio.sleep(0.1)
+        assert await redis.xlen("test_stream_out") == 10
+        with pytest.raises(TypeError):
+            writer.write(1.0)
+
+
+@pytest.mark.asyncio
+async def test_stream_writer_publish(redis: aioredis.Redis) -> None:
+    async with Stream("test_stream", count=10) as stream:
+        average = MovingAverage(stream, ("x", 2))
+        async with StreamWriter("test_stream_out", flush_count=2) as writer:
+            task = asyncio.ensure_future(writer.publish(average))
+            await asyncio.sleep(0.1)
+            for x in [1.0, 3.0, 5.0]:
+                await redis.xadd("test_stream", {"x": x})
+            await asyncio.sleep(0.2)
+            task.cancel()
+
+    rows = await redis.xrange("test_stream_out")
+    assert [float(row[1][b"x"]) for row in rows] == [1.0, 2.0, 4.0]
+
+
+@pytest.mark.asyncio
+async def test_stream_writer_failed_flush(redis: aioredis.Redis) -> None:
+    # XADD fails with WRONGTYPE while the key is not a stream
+    await redis.set("test_stream_out", "x")
+    async with StreamWriter(
+        "test_stream_out", flush_count=2, flush_interval=0.05
+    ) as writer:
+        writer.write({"x": 1})
+        writer.write({"x": 2})
+        await asyncio.sleep(0.1)
+        assert writer.records == [{b"x": 1}, {b"x": 2}]
+        writer.write({"x": 3})
+        with pytest.raises(aioredis.RedisError):
+            await writer.flush()
+        assert len(writer.records) == 3
+
+        # the periodic flushes go on after the failures
+        await redis.delete("test_stream_out")
+        await asyncio.sleep(0.1)
+        assert writer.flusher is not None and not writer.flusher.done()
+        assert writer.records == []
+
+    rows = await redis.xrange("test_stream_out")
+    assert [row[1][b"x"] for row in rows] == [b"1", b"2", b"3"]
+    assert writer.written == 3